@@ -0,0 +1,42 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+
+Packs `aoc_tests` into a compressed archive bundled in the wheel. See `esb.lib.sack.SantaSack`.
+"""
+
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+
+from hatchling.builders.hooks.plugin.interface import BuildHookInterface
+
+
+class AocTestsBuildHook(BuildHookInterface):
+    PLUGIN_NAME = "custom"
+    corpus_dir = "aoc_tests"
+    archive = "aoc_tests.zip"
+
+    def initialize(self, _version: str, build_data: dict):
+        if self.target_name != "wheel":
+            return
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        dst = self.tmp_dir / self.archive
+        src = Path(self.root) / self.corpus_dir
+        with zipfile.ZipFile(dst, "w") as zf:
+            for path in sorted(src.rglob("tests_*.toml")):
+                # Fixed timestamps keep the archive reproducible
+                info = zipfile.ZipInfo(path.relative_to(src).as_posix(), date_time=(1980, 1, 1, 0, 0, 0))
+                zf.writestr(info, path.read_bytes(), compress_type=zipfile.ZIP_DEFLATED, compresslevel=9)
+        build_data["force_include"][str(dst)] = f"esb/{self.archive}"
+
+    def finalize(self, _version: str, _build_data: dict, _artifact_path: str):
+        if hasattr(self, "tmp_dir"):
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
@@ -3,10 +3,14 @@ defmodule Aoc.MixProject do
 
   def project do
     [
-      app: :aoc,
+      app: :aoc_{year}_{day},
       version: "0.1.0",
       elixir: "~> 1.15",
       start_permanent: Mix.env() == :prod,
+      # Dependencies are shared by every day, just like an umbrella child
+      build_path: "../../_build",
+      deps_path: "../../deps",
+      lockfile: "../../mix.lock",
       deps: deps()
     ]
   end
@@ -12,12 +12,14 @@ ESB - Script your way to rescue Christmas as part of the ElfScript Brigade team.
 import argparse
 from datetime import datetime
 from enum import Enum, auto
+from pathlib import Path
 from zoneinfo import ZoneInfo
 
 from esb import __version__
 from esb import commands as esb_commands
 from esb.config import ESBConfig
 from esb.lib.langs import LangMap
+from esb.lib.paths import find_esb_root
 
 
 ###########################################################
@@ -102,6 +104,8 @@ class Command(Enum):
     test = auto()
     run = auto()
     dashboard = auto()
+    watch = auto()
+    archive = auto()
 
 
 def set_arguments(parser, args, kwargs):
@@ -125,7 +129,7 @@ def esb_parser() -> argparse.ArgumentParser:
         required=True,
         dest="command",
     )
-    lmap = LangMap.load()
+    lmap = LangMap.load(find_esb_root(Path.cwd()))
 
     cmd_descriptions = {
         Command.init: "Initializes the ESB repo tool",
@@ -136,6 +140,8 @@ def esb_parser() -> argparse.ArgumentParser:
         Command.test: "Runs test cases",
         Command.run: "Runs with real input",
         Command.dashboard: "Rebuilds the dashboard",
+        Command.watch: "Reruns test cases whenever the solution or the tests change",
+        Command.archive: "Maintains the archive database",
     }
 
     parsers = {cmd: subparsers.add_parser(cmd.name, description=cmd_descriptions[cmd]) for cmd in Command}
@@ -187,10 +193,58 @@ def esb_parser() -> argparse.ArgumentParser:
         ["--show-test"],
         {"action": "store_true", "help": "Shows puzzle tests"},
     )
+    refresh_tests_arg = (
+        ["--refresh-tests"],
+        {"action": "store_true", "help": "Downloads the latest tests for every day in a single request"},
+    )
+    at_unlock_arg = (
+        ["--at-unlock"],
+        {
+            "action": "store_true",
+            "help": "Waits for the puzzle to unlock at midnight EST, then starts it and watches both parts for changes. "
+            "Defaults to the next puzzle to unlock",
+        },
+    )
     reset_arg = (
         ["--reset"],
         {"action": "store_true", "help": "Resets the dashboard"},
     )
+    archive_action_arg = (
+        ["action"],
+        {
+            "type": esb_commands.ArchiveAction,
+            "choices": list(esb_commands.ArchiveAction),
+            "metavar": "{" + ",".join(action.value for action in esb_commands.ArchiveAction) + "}",
+            "help": "rebuild: recomputes the running time statistics from the recorded runs. "
+            "percentiles: shows running time percentiles by year and language. "
+            "compact: rolls up old runs and reclaims their space",
+        },
+    )
+    merge_arg = (
+        ["-m", "--merge"],
+        {
+            "nargs": "+",
+            "type": Path,
+            "metavar": "REPO",
+            "help": "Merges the archives of other esb repos into the percentiles",
+        },
+    )
+    keep_days_arg = (
+        ["--keep-days"],
+        {
+            "type": int,
+            "default": ESBConfig.run_retention_days,
+            "help": "compact: keeps every run of the last days. Default: %(default)s",
+        },
+    )
+    keep_runs_arg = (
+        ["--keep-runs"],
+        {
+            "type": int,
+            "default": ESBConfig.run_retention_runs,
+            "help": "compact: keeps the last runs of each puzzle part and language. Default: %(default)s",
+        },
+    )
     full_arg = (
         ["-f", "--full"],
         {
@@ -204,6 +258,9 @@ def esb_parser() -> argparse.ArgumentParser:
     set_arguments(parsers[Command.fetch], *year_arg)
     set_arguments(parsers[Command.fetch], *day_arg)
     set_arguments(parsers[Command.fetch], *force_arg)
+    set_arguments(parsers[Command.fetch], *refresh_tests_arg)
+    set_arguments(parsers[Command.fetch], *at_unlock_arg)
+    set_arguments(parsers[Command.fetch], *lang_arg)
 
     # Start
     set_arguments(parsers[Command.start], *year_arg)
@@ -236,6 +293,19 @@ def esb_parser() -> argparse.ArgumentParser:
     # Dashboard
     set_arguments(parsers[Command.dashboard], *reset_arg)
 
+    # Watch
+    set_arguments(parsers[Command.watch], *year_arg)
+    set_arguments(parsers[Command.watch], *day_arg)
+    set_arguments(parsers[Command.watch], *lang_arg)
+    set_arguments(parsers[Command.watch], *part_arg)
+    set_arguments(parsers[Command.watch], *filter_arg)
+
+    # Archive
+    set_arguments(parsers[Command.archive], *archive_action_arg)
+    set_arguments(parsers[Command.archive], *merge_arg)
+    set_arguments(parsers[Command.archive], *keep_days_arg)
+    set_arguments(parsers[Command.archive], *keep_runs_arg)
+
     return parser
 
 
@@ -264,8 +334,10 @@ def main():
     match command:
         case Command.init:
             cmd = esb_commands.Init()
+        case Command.fetch if args.at_unlock:
+            cmd = esb_commands.Unlock(args.language, args.year, args.day)
         case Command.fetch:
-            cmd = esb_commands.Fetch(args.year, args.day, force=args.force)
+            cmd = esb_commands.Fetch(args.year, args.day, force=args.force, refresh_tests=args.refresh_tests)
         case Command.start:
             cmd = esb_commands.Start(args.language, args.year, args.day, force=args.force)
         case Command.show:
@@ -278,6 +350,10 @@ def main():
             cmd = esb_commands.Test(args.language, args.year, args.day, args.part, args.filter)
         case Command.dashboard:
             cmd = esb_commands.Dashboard(reset=args.reset)
+        case Command.watch:
+            cmd = esb_commands.Watch(args.language, args.year, args.day, args.part, args.filter)
+        case Command.archive:
+            cmd = esb_commands.Archive(args.action, args.merge, args.keep_days, args.keep_runs)
         case _:  # pragma: no cover
             message = "Should never reach here :thinking_face:"
             raise ValueError(message)
@@ -9,13 +9,61 @@ Script your way to rescue Christmas as part of the ElfScript Brigade team.
 (Thank you [Eric 😉!](https://twitter.com/ericwastl)).
 """
 
-from esb.commands.dashboard import Dashboard
-from esb.commands.fetch import Fetch
-from esb.commands.init import Init
-from esb.commands.run import Run
-from esb.commands.show import Show
-from esb.commands.start import Start
-from esb.commands.status import Status
-from esb.commands.test import Test
-
-__all__ = ["Dashboard", "Fetch", "Init", "Run", "Show", "Start", "Status", "Test"]
+from __future__ import annotations
+
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from esb.commands.archive import Archive, ArchiveAction
+    from esb.commands.dashboard import Dashboard
+    from esb.commands.fetch import Fetch
+    from esb.commands.init import Init
+    from esb.commands.run import Run
+    from esb.commands.show import Show
+    from esb.commands.start import Start
+    from esb.commands.status import Status
+    from esb.commands.test import Test
+    from esb.commands.unlock import Unlock
+    from esb.commands.watch import Watch
+
+# Module of each command. Commands are imported on first access, so running one does not import the others
+COMMAND_MODULES = {
+    "Archive": "esb.commands.archive",
+    "ArchiveAction": "esb.commands.archive",
+    "Dashboard": "esb.commands.dashboard",
+    "Fetch": "esb.commands.fetch",
+    "Init": "esb.commands.init",
+    "Run": "esb.commands.run",
+    "Show": "esb.commands.show",
+    "Start": "esb.commands.start",
+    "Status": "esb.commands.status",
+    "Test": "esb.commands.test",
+    "Unlock": "esb.commands.unlock",
+    "Watch": "esb.commands.watch",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in COMMAND_MODULES:
+        message = f"module {__name__!r} has no attribute {name!r}"
+        raise AttributeError(message)
+    value = getattr(import_module(COMMAND_MODULES[name]), name)
+    globals()[name] = value
+    return value
+
+
+__all__ = [
+    "Archive",
+    "ArchiveAction",
+    "Dashboard",
+    "Fetch",
+    "Init",
+    "Run",
+    "Show",
+    "Start",
+    "Status",
+    "Test",
+    "Unlock",
+    "Watch",
+]
@@ -0,0 +1,123 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+from __future__ import annotations
+
+import sys
+from enum import Enum
+from typing import TYPE_CHECKING
+
+from esb.commands.base import Command, eprint_error, oprint_info, oprint_none
+from esb.config import ESBConfig
+from esb.protocol.metric_prefix import MetricPrefix
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from esb.lib.dash import BaseDash
+    from esb.lib.db import Query
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class ArchiveAction(Enum):
+    rebuild = "rebuild"
+    percentiles = "percentiles"
+    compact = "compact"
+
+
+class Archive(Command):
+    """Maintenance of the ElvenCrisisArchive database"""
+
+    esb_repo: bool = True
+
+    action: ArchiveAction
+    merge: list[Path]
+    keep_days: int
+    keep_runs: int
+
+    def __init__(
+        self,
+        action: ArchiveAction,
+        merge: list[Path] | None = None,
+        keep_days: int | None = None,
+        keep_runs: int | None = None,
+    ):
+        super().__init__()
+        self.action = action
+        self.merge = merge or []
+        self.keep_days = ESBConfig.run_retention_days if keep_days is None else keep_days
+        self.keep_runs = ESBConfig.run_retention_runs if keep_runs is None else keep_runs
+
+    def execute(self):
+        match self.action:
+            case ArchiveAction.rebuild:
+                self.rebuild()
+            case ArchiveAction.percentiles:
+                self.percentiles()
+            case ArchiveAction.compact:
+                self.compact()
+
+    def rebuild(self):
+        """Recomputes tables derived from the raw runs"""
+        self.db.rebuild_stats()
+        (keys,) = self.db.ECAStats.query().select("COUNT(*)").one() or (0,)
+        oprint_info(f"Rebuilt running time statistics for {keys} answers")
+
+    def compact(self):
+        """Applies the retention policy to every run, then rebuilds the file without the free space"""
+        size = self.db.sql.size()
+        pruned = self.db.prune_runs(self.keep_days, self.keep_runs)
+        self.db.sql.vacuum()
+        compacted = self.db.sql.size()
+        oprint_info(
+            f"Rolled up {pruned} runs older than {self.keep_days} days. "
+            f"Archive: {self.format_bytes(size)} -> {self.format_bytes(compacted)}, "
+            f"{self.format_bytes(size - compacted)} reclaimed"
+        )
+
+    @staticmethod
+    def format_bytes(size: int) -> str:
+        return MetricPrefix.format_float(size, "B", short=True) if size > 0 else "0 B"
+
+    def percentiles(self):
+        """
+        Running time percentiles by year and language, by year and overall. Merged from the stored
+        sketches, so no run is read. Archives of the repos in `merge` are merged in as well
+        """
+        schemas = ["main"]
+        for repo_root in self.merge:
+            try:
+                schemas.append(self.db.attach(repo_root))
+            except (FileNotFoundError, ValueError) as exc:
+                eprint_error(str(exc))
+                sys.exit(1)
+
+        from esb.lib.dash import BaseDash  # noqa: PLC0415
+
+        dash = BaseDash(self.db, self.lang_map)
+        oprint_info(f"{'year':>6} {'language':<12} {'n':>6} " + " ".join(f"{f'p{q * 100:g}':>10}" for q in QUANTILES))
+        self.print_percentiles(dash, dash.time_stats("year", "language", schemas=schemas))
+        self.print_percentiles(dash, dash.time_stats("year", schemas=schemas), language="all")
+        self.print_percentiles(dash, dash.time_stats(schemas=schemas), year="all", language="all")
+
+    @staticmethod
+    def print_percentiles(dash: BaseDash, stats: Query, year: str = "", language: str = ""):
+        for row in stats:
+            if row["n"] is None:
+                continue
+            quantiles = " ".join(
+                f"{MetricPrefix.format_float(value, 's', precision=3, short=True):>10}"
+                for value in dash.quantiles(row["sketch"], *QUANTILES)
+            )
+            row_year = year or row["year"]
+            row_language = language or row["language"]
+            oprint_none(f"{row_year:>6} {row_language:<12} {row['n']:>6} {quantiles}")
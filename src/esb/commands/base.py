@@ -12,34 +12,54 @@ Script your way to rescue Christmas as part of the ElfScript Brigade team.
 from __future__ import annotations
 
 import sys
-import tomllib
 from abc import ABC, abstractmethod
+from functools import cached_property
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
-from rich.console import Console
-from rich.theme import Theme
-
-from esb.lib.db import ElvenCrisisArchive
 from esb.lib.langs import LangMap
 from esb.lib.paths import CacheInputSled, CacheTestSled, find_esb_root, pad_day
 
 if TYPE_CHECKING:
-    from esb.lib.db import ECALanguage, ECAPuzzle
+    from rich.console import Console
+
+    from esb.lib.db import ECALanguage, ECAPuzzle, ElvenCrisisArchive
     from esb.lib.langs import LangSpec
     from esb.protocol.fireplace import FPPart
 
 COLOR_INFO = "bold green"
 COLOR_ERROR = "bold red"
 COLOR_WARN = "bold yellow"
-eprint_info = Console(stderr=True, style=COLOR_INFO).print
-eprint_error = Console(stderr=True, style=COLOR_ERROR).print
-eprint_none = Console(stderr=True, theme=Theme(inherit=False)).print
-eprint_warn = Console(stderr=True, style=COLOR_WARN).print
-oprint_info = Console(style=COLOR_INFO).print
-oprint_error = Console(style=COLOR_ERROR).print
-oprint_none = Console(theme=Theme(inherit=False)).print
-oprint_warn = Console(style=COLOR_WARN).print
+
+
+class Printer:
+    """`Console.print` of a console created on first use. Importing rich takes longer than most commands"""
+
+    def __init__(self, *, stderr: bool = False, style: str | None = None):
+        self.stderr = stderr
+        self.style = style
+
+    @cached_property
+    def console(self) -> Console:
+        from rich.console import Console  # noqa: PLC0415
+        from rich.theme import Theme  # noqa: PLC0415
+
+        if self.style is None:
+            return Console(stderr=self.stderr, theme=Theme(inherit=False))
+        return Console(stderr=self.stderr, style=self.style)
+
+    def __call__(self, *objects: Any, **kwargs: Any):
+        self.console.print(*objects, **kwargs)
+
+
+eprint_info = Printer(stderr=True, style=COLOR_INFO)
+eprint_error = Printer(stderr=True, style=COLOR_ERROR)
+eprint_none = Printer(stderr=True)
+eprint_warn = Printer(stderr=True, style=COLOR_WARN)
+oprint_info = Printer(style=COLOR_INFO)
+oprint_error = Printer(style=COLOR_ERROR)
+oprint_none = Printer()
+oprint_warn = Printer(style=COLOR_WARN)
 
 
 class Command(ABC):
@@ -52,13 +72,15 @@ class Command(ABC):
 
     def __init__(self):
         if self.esb_repo:
+            from esb.lib.db import ElvenCrisisArchive  # noqa: PLC0415
+
             repo_root = find_esb_root(Path.cwd())
             if repo_root is None:
                 eprint_error("Fatal: this is not an ElfScript Brigade repo.")
                 sys.exit(2)
             self.repo_root = repo_root
             self.db = ElvenCrisisArchive(self.repo_root)
-            self.lang_map = LangMap.load()
+            self.lang_map = LangMap.load(self.repo_root)
             self.cache_sled = CacheInputSled(self.repo_root)
             self.test_sled = CacheTestSled(self.repo_root)
 
@@ -90,14 +112,17 @@ class Command(ABC):
 
     def update_arg_cache(self):
         ac = self.db.ECAArgCache.fetch_single()
+        values = {}
         if hasattr(self, "years"):
-            ac.update({"year": self.years[-1]}, where="id")
+            values["year"] = self.years[-1]
         if hasattr(self, "days"):
-            ac.update({"day": self.days[-1]}, where="id")
+            values["day"] = self.days[-1]
         if hasattr(self, "parts"):
-            ac.update({"part": self.parts[-1]}, where="id")
+            values["part"] = self.parts[-1]
         if hasattr(self, "lang"):
-            ac.update({"language": self.lang.name}, where="id")
+            values["language"] = self.lang.name
+        if values:
+            ac.update(values, where=["id"])
 
     def find_test_files(self, year: int, day: int) -> list[Path]:
         ts = CacheTestSled(self.repo_root)
@@ -142,6 +167,8 @@ class Command(ABC):
 
     @staticmethod
     def load_tests(filename: Path, part: FPPart) -> list[tuple[str, dict]]:
+        import tomllib  # noqa: PLC0415
+
         cases_str = filename.read_text(encoding="utf-8")
         try:
             cases = tomllib.loads(cases_str).get("test", {})
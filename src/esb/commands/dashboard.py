@@ -24,12 +24,13 @@ class Dashboard(Command):
         self.reset = reset
 
     def execute(self):
-        md_dash = MdDash(self.db, self.lang_map, self.repo_root)
-        md_dash.build_dash(reset=self.reset)
-        md_dash.build_report(reset=self.reset)
+        self.rebuild(MdDash(self.db, self.lang_map, self.repo_root), reset=self.reset)
+
+    @staticmethod
+    def rebuild(md_dash: MdDash, *, reset: bool = False):
+        """Rebuilds the dashboards. Other commands call it with their own archive and languages"""
         try:
-            md_dash.build_dash(reset=self.reset)
-            md_dash.build_report(reset=self.reset)
+            md_dash.build(reset=reset)
             oprint_info("Dashboard rebuilt successfully!")
         except ValueError:
             oprint_error("Error building dashboard. Check if you have all the needed tags in the template")
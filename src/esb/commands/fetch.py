@@ -12,11 +12,42 @@ Script your way to rescue Christmas as part of the ElfScript Brigade team.
 from __future__ import annotations
 
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from enum import Enum, auto
+from functools import cached_property
+from http.client import HTTPException
 from itertools import product
+from typing import TYPE_CHECKING
 
 from esb.commands.base import Command, eprint_error, eprint_info
-from esb.lib.fetch import RudolphFetcher
+from esb.config import ESBConfig
+from esb.lib.fetch import RudolphCache, RudolphFetcher
+from esb.lib.lock import FileLock, TokenBucket
 from esb.lib.paths import pad_day
+from esb.lib.sack import SantaSack
+
+if TYPE_CHECKING:
+    from esb.lib.db import ECAPuzzle
+
+
+class FetchStatus(Enum):
+    FETCHED = auto()
+    CACHED = auto()
+    COLLAPSED = auto()
+
+
+@dataclass
+class FetchedDay:
+    year: int
+    day: int
+    status: FetchStatus
+    url: str | None = None
+    title: str | None = None
+    answer_pt1: str | None = None
+    answer_pt2: str | None = None
+    warnings: list[str] = field(default_factory=list)
 
 
 class Fetch(Command):
@@ -25,80 +56,251 @@ class Fetch(Command):
     years: list[int]
     days: list[int]
     force: bool
+    refresh_tests: bool
 
-    def __init__(self, years: list[int], days: list[int], *, force: bool = False):
+    def __init__(self, years: list[int], days: list[int], *, force: bool = False, refresh_tests: bool = False):
         super().__init__()
         self.years = years
         self.days = days
         self.force = force
+        self.refresh_tests = refresh_tests
         self.load_from_arg_cache()
 
     def execute(self):
-        for year, day in product(self.years, self.days):
-            self.fetch_day(year, day, force=self.force)
+        jobs = list(product(self.years, self.days))
+        try:
+            if self.refresh_tests:
+                self.refresh_test_corpus()
+            if len(jobs) == 1:
+                [(year, day)] = jobs
+                self.fetch_day(year, day, force=self.force)
+            else:
+                self.fetch_many(jobs, force=self.force)
+        finally:
+            self.close()
 
-    def fetch_statement(self, rudolph: RudolphFetcher, year: int, day: int) -> tuple[str, str | None, str | None, str]:
-        url, statement, answer_pt1, answer_pt2 = rudolph.fetch_statement(year, day)
+    @cached_property
+    def rudolph(self) -> RudolphFetcher:
+        """Fetcher shared by all requests of this command, so they reuse the same connections. Retries transient errors"""
+        try:
+            return RudolphFetcher(
+                self.repo_root,
+                retries=ESBConfig.fetch_retries,
+                backoff=ESBConfig.fetch_backoff,
+                cache=self.http_cache,
+            )
+        except ValueError:
+            eprint_error(f"Could not load {RudolphFetcher.sess_env} environment variable.")
+            sys.exit(2)
 
+    @cached_property
+    def sack(self) -> SantaSack:
+        return SantaSack.load(self.cache_sled.subdir)
+
+    @property
+    def http_cache(self) -> RudolphCache:
+        return RudolphCache(self.cache_sled.subdir / ESBConfig.http_cache_dir)
+
+    def close(self):
+        if "rudolph" in self.__dict__:
+            self.rudolph.close()
+            del self.rudolph
+
+    def save_statement(self, year: int, day: int, statement: str):
+        """Writes the statement file. Skips the write if nothing changed"""
         st_file = self.cache_sled.path("statement", year, day)
+        if st_file.is_file() and st_file.read_text() == statement:
+            return
         st_file.parent.mkdir(parents=True, exist_ok=True)
         st_file.write_text(statement)
 
+    def fetch_statement(self, rudolph: RudolphFetcher, year: int, day: int) -> tuple[str, str | None, str | None, str]:
+        url, statement, answer_pt1, answer_pt2 = rudolph.fetch_statement(year, day)
+        self.save_statement(year, day, statement)
+
         [_, title, *_] = statement.split("---")
         return url, answer_pt1, answer_pt2, title
 
-    def fetch_day(self, year: int, day: int, *, force: bool = False):
+    def refresh_answers(self, rudolph: RudolphFetcher, year: int, day: int, *, statement: bool = False):
+        """
+        Updates the answers of an already fetched puzzle. The statement is only parsed and saved when
+        `statement` is set, eg: part 2 was just unlocked.
+        """
+        dp = self.db.ECAPuzzle.find_single({"year": year, "day": day})
+        if dp is None:
+            self.fetch_statement(rudolph, year, day)
+            return
+        _, page = rudolph.fetch_page(year, day)
+        if statement:
+            self.save_statement(year, day, page.statement)
+        answer_pt1, answer_pt2 = page.answer_pair
+        if (answer_pt1, answer_pt2) != (dp.answer_pt1, dp.answer_pt2):
+            dp.update({"answer_pt1": answer_pt1, "answer_pt2": answer_pt2}, ["year", "day"])
+
+    def is_complete(self, year: int, day: int, *, force: bool) -> bool:
         dp = self.db.ECAPuzzle.find_single({"year": year, "day": day})
         if not force and dp is not None and dp.answer_pt2 is not None:
             eprint_error(f"Fetch for year {year} day {pad_day(day)} is already complete!")
+            return True
+        return False
+
+    def fetch_day(self, year: int, day: int, *, force: bool = False):
+        if self.is_complete(year, day, force=force):
             return
 
         try:
-            RudolphFetcher.load_cookie(self.repo_root)
-        except ValueError:
-            eprint_error(f"Could not load {RudolphFetcher.sess_env} environment variable.")
+            dp = self.db.ECAPuzzle.find_single({"year": year, "day": day})
+            if not force and dp is not None and self.cache_sled.path("input", year, day).is_file():
+                # Only the answers may be missing. Part 2 text shows up after solving part 1
+                self.refresh_answers(self.rudolph, year, day, statement=dp.answer_pt1 is None)
+                eprint_info(f"Refreshed answers for year {year} day {pad_day(day)}")
+                return
+            fetched = self.download_day(self.rudolph, year, day, force=force)
+        except ValueError as err:
+            eprint_error(str(err))
+            eprint_error("Visit https://github.com/luxedo/esb/blob/main/doc/SESSION_COOKIE.md for more information")
             sys.exit(2)
+        self.save_day(fetched)
 
-        rudolph = RudolphFetcher(self.repo_root)
-
-        url, answer_pt1, answer_pt2, title = self.fetch_statement(rudolph, year, day)
+    def fetch_many(self, jobs: list[tuple[int, int]], *, force: bool = False):
+        """
+        Fetches many days concurrently with a few workers. Requests to AoC are rate limited and
+        transient errors are retried with exponential backoff. Failures are reported at the end.
+        """
+        jobs = [(year, day) for year, day in jobs if not self.is_complete(year, day, force=force)]
+        if len(jobs) == 0:
+            return
+        self.rudolph  # noqa: B018 Fails early without a cookie
+        self.sack  # noqa: B018 Loaded once before the workers share it
 
-        input_file = self.cache_sled.path("input", year, day)
+        limiter = TokenBucket(rate=ESBConfig.fetch_rate, capacity=ESBConfig.fetch_burst)
+        local = threading.local()
+        fetchers: list[RudolphFetcher] = []
 
-        if not force and input_file.is_file():
-            eprint_info(f"Input for year {year} day {pad_day(day)} already cached")
-            return
+        def worker(year: int, day: int) -> FetchedDay:
+            # HTTP connections can't be shared between threads
+            if not hasattr(local, "rudolph"):
+                local.rudolph = RudolphFetcher(
+                    self.repo_root,
+                    limiter=limiter,
+                    retries=ESBConfig.fetch_retries,
+                    backoff=ESBConfig.fetch_backoff,
+                    cache=self.http_cache,
+                )
+                fetchers.append(local.rudolph)
+            return self.download_day(local.rudolph, year, day, force=force)
 
+        failures: list[tuple[int, int, str]] = []
+        puzzles: list[ECAPuzzle] = []
         try:
-            puzzle_input = rudolph.fetch_input(year, day)
-        except ValueError as err:
-            eprint_error(str(err))
-            eprint_error("Visit https://github.com/luxedo/esb/blob/main/doc/SESSION_COOKIE.md for more information")
+            with ThreadPoolExecutor(max_workers=ESBConfig.fetch_workers) as executor:
+                futures = {executor.submit(worker, year, day): (year, day) for year, day in jobs}
+                for count, future in enumerate(as_completed(futures), start=1):
+                    year, day = futures[future]
+                    progress = f"[{count}/{len(futures)}]"
+                    try:
+                        fetched = future.result()
+                    except (ValueError, OSError, HTTPException) as err:
+                        eprint_error(f"{progress} Could not fetch year {year} day {pad_day(day)}: {err}")
+                        failures.append((year, day, str(err)))
+                        continue
+                    if (puzzle := self.report_day(fetched, progress=progress)) is not None:
+                        puzzles.append(puzzle)
+        finally:
+            for fetcher in fetchers:
+                fetcher.close()
+            # Saved all at once: a single commit for the whole batch
+            self.db.ECAPuzzle.upsert_many(puzzles)
+
+        if failures:
+            eprint_error(f"Could not fetch {len(failures)} of {len(jobs)} days:")
+            for year, day, reason in sorted(failures):
+                eprint_error(f"  year {year} day {pad_day(day)}: {reason}")
+            eprint_error("Run the command again to retry. Days already fetched are skipped.")
             sys.exit(2)
 
-        input_file.parent.mkdir(parents=True, exist_ok=True)
-        input_file.write_text(puzzle_input)
+    def download_day(self, rudolph: RudolphFetcher, year: int, day: int, *, force: bool = False) -> FetchedDay:
+        """
+        Downloads statement, input and tests into the cache. Does not touch the database, so it's
+        safe to call from worker threads. Holds a lock on the day, collapsing fetches of the same
+        day made by concurrent esb invocations.
+        """
+        input_file = self.cache_sled.path("input", year, day)
+        lock = FileLock(self.cache_sled.day_dir(year, day) / ".fetch.lock")
+        with lock as waited:
+            if waited and not force and input_file.is_file():
+                return FetchedDay(year, day, FetchStatus.COLLAPSED)
+
+            url, answer_pt1, answer_pt2, title = self.fetch_statement(rudolph, year, day)
+            fetched = FetchedDay(year, day, FetchStatus.FETCHED, url, title.strip(), answer_pt1, answer_pt2)
+
+            if not force and input_file.is_file():
+                fetched.status = FetchStatus.CACHED
+                return fetched
+
+            rudolph.download_input(year, day, input_file)
+
+            if (warning := self.materialize_tests(rudolph, year, day, force=force)) is not None:
+                fetched.warnings.append(warning)
+        return fetched
 
+    def materialize_tests(self, rudolph: RudolphFetcher, year: int, day: int, *, force: bool = False) -> str | None:
+        """
+        Copies the tests of the day from the bundled corpus. Only days missing from the corpus are
+        downloaded. Returns a warning message, if any.
+        """
         tests_file = self.test_sled.path("tests", year, day)
         if not force and tests_file.is_file():
-            eprint_info(f"Tests for year {year} day {pad_day(day)} already cached")
-        else:
+            return f"Tests for year {year} day {pad_day(day)} already cached"
+        if (tests_input := self.sack.read(year, day)) is None:
             try:
                 tests_input = rudolph.fetch_tests(year, day)
-            except ValueError:
-                eprint_error("Could not fetch tests. Perhaps they're not available yet.")
-            else:
-                tests_file.parent.mkdir(parents=True, exist_ok=True)
-                tests_file.write_text(tests_input)
+            except (ValueError, OSError, HTTPException):
+                return "Could not fetch tests. Perhaps they're not available yet."
+        tests_file.parent.mkdir(parents=True, exist_ok=True)
+        tests_file.write_text(tests_input)
+        return None
+
+    def refresh_test_corpus(self):
+        """Downloads the latest test corpus in a single request"""
+        dst = self.cache_sled.subdir / ESBConfig.tests_archive
+        try:
+            self.rudolph.download_tests_archive(dst)
+        except (ValueError, OSError, HTTPException) as err:
+            eprint_error(f"Could not refresh tests: {err}")
+            sys.exit(2)
+        self.__dict__.pop("sack", None)
+        eprint_info(f"Refreshed tests for {len(self.sack.index)} days")
+
+    def save_day(self, fetched: FetchedDay, progress: str = ""):
+        if (puzzle := self.report_day(fetched, progress)) is not None:
+            puzzle.insert(replace=True)
+
+    def report_day(self, fetched: FetchedDay, progress: str = "") -> ECAPuzzle | None:
+        """Prints the outcome of a fetch. Returns the puzzle row to be saved, if any"""
+        year, day = fetched.year, fetched.day
+        prefix = f"{progress} " if progress else ""
+        match fetched.status:
+            case FetchStatus.COLLAPSED:
+                eprint_info(f"{prefix}Year {year} day {pad_day(day)} was fetched by another esb process")
+                return None
+            case FetchStatus.CACHED:
+                eprint_info(f"{prefix}Input for year {year} day {pad_day(day)} already cached")
+                return None
+        if not fetched.title or fetched.url is None:
+            eprint_error(f"{prefix}Could not parse the title of year {year} day {pad_day(day)}. Not saved")
+            return None
+        for warning in fetched.warnings:
+            eprint_info(f"{prefix}{warning}")
 
-        eprint_info(f"Fetched year {year} day {pad_day(day)}!")
-        self.db.ECAPuzzle(
+        eprint_info(f"{prefix}Fetched year {year} day {pad_day(day)}!")
+        return self.db.ECAPuzzle(
             year=year,
             day=day,
-            title=title.strip(),
-            url=url,
-            answer_pt1=answer_pt1,
-            answer_pt2=answer_pt2,
+            title=fetched.title,
+            url=fetched.url,
+            answer_pt1=fetched.answer_pt1,
+            answer_pt2=fetched.answer_pt2,
             solved_pt1=None,
             solved_pt2=None,
-        ).insert(replace=True)
+        )
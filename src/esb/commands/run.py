@@ -12,18 +12,25 @@ Script your way to rescue Christmas as part of the ElfScript Brigade team.
 from __future__ import annotations
 
 import sys
+import time
 from datetime import datetime
 from itertools import product
+from typing import TYPE_CHECKING
 
 from esb.commands.base import Command, eprint_error, eprint_info, eprint_warn
 from esb.commands.dashboard import Dashboard
 from esb.commands.fetch import Fetch
 from esb.config import ESBConfig
-from esb.lib.fetch import RudolphFetcher, RudolphSubmitStatus
+from esb.lib.dash import MdDash
+from esb.lib.fetch import RudolphSubmitStatus
+from esb.lib.guard import NaughtyList
 from esb.lib.langs import LangRunner, LangSpec
 from esb.lib.paths import LangSled, pad_day
 from esb.protocol import fireplace
 
+if TYPE_CHECKING:
+    from esb.lib.db import ECALanguage, ECAPuzzle
+
 
 class Run(Command):
     esb_repo: bool = True
@@ -33,6 +40,7 @@ class Run(Command):
     days: list[int]
     parts: list[fireplace.FPPart]
     submit: bool
+    dashboard_outdated: bool
 
     def __init__(
         self, lang: LangSpec, years: list[int], days: list[int], parts: list[fireplace.FPPart], *, submit: bool = False
@@ -45,10 +53,17 @@ class Run(Command):
         self.submit = submit
         self.load_from_arg_cache()
         self.fetch_cmd = Fetch(years, days)
+        self.dashboard_outdated = False
 
     def execute(self):
-        for year, day, part in product(self.years, self.days, self.parts):
-            self.run_day(self.lang, year, day, part, submit=self.submit)
+        try:
+            for year, day, part in product(self.years, self.days, self.parts):
+                self.run_day(self.lang, year, day, part, submit=self.submit)
+        finally:
+            self.fetch_cmd.close()
+            # Once for the whole batch, however many answers were accepted
+            if self.dashboard_outdated:
+                Dashboard.rebuild(MdDash(self.db, self.lang_map, self.repo_root))
 
     def run_day(
         self,
@@ -102,53 +117,33 @@ class Run(Command):
         answer = dp.get_answer(part)
 
         now = datetime.now().astimezone()
-        self.db.ECARun(
-            id=None,
-            datetime=now,
-            year=year,
-            day=day,
-            language=lang.name,
-            part=part,
-            answer=attempt,
-            time=result.running_time,
-            unit=result.unit,
-        ).insert()
+        time_ns = (
+            None if result.unit is None or result.running_time is None else result.unit.to_nanos(result.running_time)
+        )
+
+        def record_run():
+            run = self.db.ECARun(
+                id=None,
+                timestamp=int(now.timestamp()),
+                year=year,
+                day=day,
+                language_id=self.db.ECALanguageName.id_of(lang.name),
+                part=part,
+                answer=attempt,
+                time_ns=time_ns,
+            ).insert()
+            self.db.ECAStats.record(run)
+            self.db.prune_runs(year=year, day=day, language_id=run.language_id, part=part)
+
+        self.db.sql.atomic(record_run)
+        self.db.sql.incremental_vacuum(ESBConfig.vacuum_free_pages)
 
         if attempt is not None and submit:
-            rudolph = RudolphFetcher(self.repo_root)
-            match rudolph.fetch_submit(year, day, part, attempt):
-                case RudolphSubmitStatus.SUCCESS:
-                    eprint_info("Hooray! Found the answer!")
-                    eprint_info(f"✔ Answer pt{part}: {attempt}")
-                    now = datetime.now().astimezone()
-                    dl.set_solved(part, now)
-                    dp.set_solved(part, attempt, now)
-                    cmd = Dashboard()
-                    cmd.execute()
-                    self.fetch_cmd.fetch_statement(rudolph, year, day)
-                case RudolphSubmitStatus.FAIL:
-                    eprint_info("That's not the correct answer :'(")
-                    eprint_error(f"✘ Answer pt{part}: {attempt}")
-                case RudolphSubmitStatus.TIMEOUT:
-                    eprint_warn("Cannot submit yet. Please wait before trying again")
-                    eprint_warn(f"Answer pt{part}: {attempt}")
-                case RudolphSubmitStatus.ALREADY_COMPLETE:
-                    eprint_info(
-                        "Puzzle already solved but solution not fetched yet. Please fetch again to compare solutions.",
-                    )
-                    eprint_warn(f"Answer pt{part}: {attempt}")
-                    now = datetime.now().astimezone()
-                    dl.set_solved(part, now)
-                    dp.set_solved(part, attempt, now)
-                case RudolphSubmitStatus.ERROR:
-                    eprint_warn("Unexpected error submitting")
-                    eprint_warn(f"Answer pt{part}: {attempt}")
+            self.submit_answer(dl, dp, year, day, part, attempt)
         elif answer is not None:
-            if attempt == answer:
+            if attempt is not None and attempt == answer:
                 eprint_info(f"✔ Answer pt{part}: {attempt}")
-                now = datetime.now().astimezone()
-                dl.set_solved(part, now)
-                dp.set_solved(part, attempt, now)
+                self.set_solved(dl, dp, part, attempt)
             else:
                 eprint_error(f"✘ Answer pt{part}: {attempt}. Expected: {answer}")
         else:
@@ -156,3 +151,58 @@ class Run(Command):
 
         if result.unit is not None:
             eprint_warn(f"Running time: {result.running_time} {result.unit.name}seconds")
+
+    def set_solved(self, dl: ECALanguage, dp: ECAPuzzle, part: fireplace.FPPart, attempt: str):
+        now = datetime.now().astimezone()
+
+        def mark_solved():
+            dl.set_solved(part, now)
+            dp.set_solved(part, attempt, now)
+
+        self.db.sql.atomic(mark_solved)
+
+    def submit_answer(self, dl: ECALanguage, dp: ECAPuzzle, year: int, day: int, part: fireplace.FPPart, attempt: str):
+        naughty = NaughtyList.load(self.db, year, day, part)
+        if (reason := naughty.reject_reason(attempt)) is not None:
+            eprint_error(f"Not submitting. {reason}")
+            eprint_error(f"✘ Answer pt{part}: {attempt}")
+            return
+
+        rudolph = self.fetch_cmd.rudolph
+        while True:
+            if (wait := naughty.remaining_wait(datetime.now().astimezone())) > ESBConfig.submit_max_wait:
+                eprint_warn(f"Cannot submit yet. Please wait {wait:.0f}s before trying again")
+                eprint_warn(f"Answer pt{part}: {attempt}")
+                return
+            if wait > 0:
+                eprint_info(f"Waiting {wait:.0f}s before submitting. Press Ctrl+C to cancel")
+                time.sleep(wait)
+            page = rudolph.fetch_submit_page(year, day, part, attempt)
+            naughty.record(attempt, page, datetime.now().astimezone())
+            # Submitted too soon. Try again once the lockout is over
+            if page.submit_status != RudolphSubmitStatus.TIMEOUT or page.wait is None:
+                break
+
+        match page.submit_status:
+            case RudolphSubmitStatus.SUCCESS:
+                eprint_info("Hooray! Found the answer!")
+                eprint_info(f"✔ Answer pt{part}: {attempt}")
+                self.set_solved(dl, dp, part, attempt)
+                self.dashboard_outdated = True
+                self.fetch_cmd.refresh_answers(rudolph, year, day, statement=part == ESBConfig.part_1)
+            case RudolphSubmitStatus.FAIL:
+                eprint_info("That's not the correct answer :'(")
+                hint = "" if page.hint is None else f" (too {page.hint.value})"
+                eprint_error(f"✘ Answer pt{part}: {attempt}{hint}")
+            case RudolphSubmitStatus.TIMEOUT:
+                eprint_warn("Cannot submit yet. Please wait before trying again")
+                eprint_warn(f"Answer pt{part}: {attempt}")
+            case RudolphSubmitStatus.ALREADY_COMPLETE:
+                eprint_info(
+                    "Puzzle already solved but solution not fetched yet. Please fetch again to compare solutions.",
+                )
+                eprint_warn(f"Answer pt{part}: {attempt}")
+                self.set_solved(dl, dp, part, attempt)
+            case RudolphSubmitStatus.ERROR:
+                eprint_warn("Unexpected error submitting")
+                eprint_warn(f"Answer pt{part}: {attempt}")
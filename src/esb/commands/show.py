@@ -13,8 +13,6 @@ from __future__ import annotations
 
 from itertools import product
 
-from rich.syntax import Syntax
-
 from esb.commands.base import Command, eprint_error, oprint_error, oprint_info, oprint_none
 from esb.config import ESBConfig
 from esb.lib.paths import pad_day
@@ -59,6 +57,8 @@ class Show(Command):
                 oprint_none(input_file.read_text())
 
         if show_test:
+            from rich.syntax import Syntax  # noqa: PLC0415
+
             for test_file in self.find_test_files(year, day):
                 oprint_none()
                 oprint_none(Syntax(test_file.read_text(), "toml"))
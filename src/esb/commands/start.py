@@ -68,11 +68,17 @@ class Start(Command):
                 )
                 return
 
+        self.scaffold(lang, year, day, day_problem.title, day_problem.url)
+
+    def scaffold(self, lang: LangSpec, year: int, day: int, title: str, url: str) -> CodeFurnace:
+        """Copies the boilerplate code and installs dependencies"""
         lang_sled = LangSled.from_spec(self.repo_root, lang)
         cf = CodeFurnace(lang, lang_sled)
-        cf.start(year, day, day_problem.title, day_problem.url)
+        cf.start(year, day, title, url)
 
-        if lang.install is not None:
+        if cf.shared_warm():
+            eprint_info(f"Reusing shared dependencies at {lang_sled.shared_dir}")
+        elif lang.install is not None:
             runner = LangRunner(lang, lang_sled)
             p = runner.exec_command(lang.install, year, day)
             if p.returncode != 0:
@@ -88,3 +94,4 @@ class Start(Command):
         ).insert(replace=True)
         eprint_info(f"Started code for {lang.name}, year {year} day {pad_day(day)}")
         eprint_info(f"Open files at {lang_sled.day_dir(year, day)} and happy coding!")
+        return cf
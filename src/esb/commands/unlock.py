@@ -0,0 +1,121 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from contextlib import suppress
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+from zoneinfo import ZoneInfo
+
+from esb.commands.base import Command, eprint_error, eprint_info
+from esb.commands.fetch import Fetch
+from esb.commands.start import Start
+from esb.commands.watch import Watch
+from esb.config import ESBConfig
+from esb.lib.paths import pad_day
+
+if TYPE_CHECKING:
+    from esb.commands.fetch import FetchedDay
+    from esb.lib.langs import LangSpec
+
+
+class Unlock(Command):
+    """
+    Waits for a puzzle to unlock and starts it as fast as possible. Everything that does not depend
+    on the puzzle is done beforehand: the boilerplate is created with a placeholder title and the
+    connection to AoC is opened a few seconds before midnight EST.
+    """
+
+    esb_repo: bool = True
+
+    lang: LangSpec
+    years: list[int]
+    days: list[int]
+
+    def __init__(self, lang: LangSpec, years: list[int], days: list[int]):
+        super().__init__()
+        self.lang = lang
+        if len(years) == 0 and len(days) == 0:
+            year, day = self.next_unlock(self.now())
+            years, days = [year], [day]
+        self.years = years
+        self.days = days
+        self.load_from_arg_cache()
+
+    @staticmethod
+    def now() -> datetime:
+        return datetime.now(tz=ZoneInfo("EST"))
+
+    @staticmethod
+    def unlock_time(year: int, day: int) -> datetime:
+        return datetime(year, 12, day, tzinfo=ZoneInfo("EST"))
+
+    @classmethod
+    def next_unlock(cls, now: datetime) -> tuple[int, int]:
+        """Next puzzle to unlock. Today's puzzle if it was unlocked just now"""
+        for day in ESBConfig.all_days:
+            if cls.unlock_time(now.year, day) + timedelta(seconds=ESBConfig.unlock_grace) > now:
+                return now.year, day
+        return now.year + 1, ESBConfig.first_day
+
+    @classmethod
+    def sleep_until(cls, deadline: datetime):
+        """Sleeps in shrinking steps, so a long wait still wakes up right at `deadline`"""
+        while (remaining := (deadline - cls.now()).total_seconds()) > 0:
+            time.sleep(remaining / 2 if remaining > 1 else remaining)
+
+    def execute(self):
+        year, day = self.years[-1], self.days[-1]
+        unlock = self.unlock_time(year, day)
+        fetch_cmd = Fetch([year], [day])
+        start_cmd = Start(self.lang, [year], [day])
+        rudolph = fetch_cmd.rudolph
+        try:
+            url = rudolph.host + rudolph.st_route.format(year=year, day=day)
+            placeholder = ESBConfig.unlock_title.format(day=day)
+            if self.db.ECALanguage.find_single({"year": year, "day": day, "language": self.lang.name}) is None:
+                cf = start_cmd.scaffold(self.lang, year, day, placeholder, url)
+            else:
+                cf = None
+
+            if self.now() < unlock:
+                eprint_info(f"Year {year} day {pad_day(day)} unlocks at {unlock:%Y-%m-%d %H:%M %Z}. Waiting...")
+                self.sleep_until(unlock - timedelta(seconds=ESBConfig.unlock_warmup))
+                with suppress(OSError):  # A failed warm up is retried by the first request
+                    rudolph.connection(rudolph.host).connect()
+                self.sleep_until(unlock)
+
+            fetched = self.fetch_unlocked(fetch_cmd, year, day)
+            fetch_cmd.save_day(fetched)
+            if cf is not None and fetched.title is not None:
+                cf.retitle(year, day, placeholder, fetched.title)
+        finally:
+            fetch_cmd.close()
+
+        # Both parts: part 2 tests fail until it is written, then turn green without restarting the watch
+        Watch(self.lang, [year], [day], list(ESBConfig.parts)).execute()
+
+    @staticmethod
+    def fetch_unlocked(fetch_cmd: Fetch, year: int, day: int) -> FetchedDay:
+        """The puzzle may take a moment to show up. Tries again for a few seconds"""
+        for attempt in range(ESBConfig.unlock_retries + 1):
+            try:
+                return fetch_cmd.download_day(fetch_cmd.rudolph, year, day)
+            except ValueError as err:
+                if attempt == ESBConfig.unlock_retries:
+                    eprint_error(str(err))
+                    sys.exit(2)
+                time.sleep(ESBConfig.unlock_retry_delay)
+        message = "Should never reach here :thinking_face:"  # pragma: no cover
+        raise RuntimeError(message)  # pragma: no cover
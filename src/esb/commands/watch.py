@@ -0,0 +1,258 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import suppress
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from rich.live import Live
+from rich.table import Table
+
+from esb.commands.base import Command, eprint_info
+from esb.config import ESBConfig
+from esb.lib.langs import LangMap, LangRunner
+from esb.lib.paths import LangSled, pad_day
+from esb.protocol import fireplace
+from esb.protocol.metric_prefix import MetricPrefix
+
+if TYPE_CHECKING:
+    from esb.lib.langs import LangSpec
+
+Snapshot = dict[Path, int]
+TestKey = tuple[str, fireplace.FPPart]
+TestCases = dict[TestKey, dict]
+
+
+class WatchStatus(Enum):
+    QUEUED = "[dim]queued[/dim]"
+    RUNNING = "[yellow]running[/yellow]"
+    OK = "[green]✔[/green]"
+    FAIL = "[red]✘[/red]"
+    ERROR = "[red]error[/red]"
+    CANCELLED = "[dim]cancelled[/dim]"
+
+
+@dataclass
+class WatchRow:
+    name: str
+    part: fireplace.FPPart
+    expected: str
+    status: WatchStatus = WatchStatus.QUEUED
+    answer: str = ""
+    running_time: str = ""
+
+
+@dataclass
+class WatchBoard:
+    title: str
+    message: str = ""
+    rows: dict[TestKey, WatchRow] = field(default_factory=dict)
+
+    def queue(self, tests: TestCases, selected: TestCases):
+        self.rows = {
+            key: WatchRow(name=key[0], part=key[1], expected=str(test["answer"]))
+            if key in selected or key not in self.rows
+            else self.rows[key]
+            for key, test in tests.items()
+        }
+
+    def cancel(self):
+        for row in self.rows.values():
+            if row.status in {WatchStatus.QUEUED, WatchStatus.RUNNING}:
+                row.status = WatchStatus.CANCELLED
+
+    def render(self) -> Table:
+        table = Table(title=self.title, caption=self.message, expand=True)
+        for column in ["Test", "Part", "Status", "Answer", "Expected", "Running time"]:
+            table.add_column(column)
+        for row in self.rows.values():
+            table.add_row(row.name, str(row.part), row.status.value, row.answer, row.expected, row.running_time)
+        return table
+
+
+class Watch(Command):
+    esb_repo: bool = True
+
+    lang: LangSpec
+    years: list[int]
+    days: list[int]
+    parts: list[fireplace.FPPart]
+    filter_test: str | None
+
+    def __init__(
+        self,
+        lang: LangSpec,
+        years: list[int],
+        days: list[int],
+        parts: list[fireplace.FPPart],
+        filter_test: str | None = None,
+    ):
+        super().__init__()
+        self.lang = lang
+        self.years = years
+        self.days = days
+        self.parts = parts
+        self.filter_test = filter_test
+        self.load_from_arg_cache()
+
+    def execute(self):
+        year, day = self.years[-1], self.days[-1]
+        if self.find_solution(self.lang, year, day) is None:
+            return
+        try:
+            asyncio.run(self.watch(self.lang, year, day))
+        except KeyboardInterrupt:
+            eprint_info("Stopped watching. Happy coding!")
+
+    async def watch(self, lang: LangSpec, year: int, day: int):
+        lang_sled = LangSled.from_spec(self.repo_root, lang)
+        runner = LangRunner(lang, lang_sled)
+        test_dir = self.test_sled.day_dir(year, day)
+        # The repo may override the language spec, eg: its run command. Edits apply on the next cycle
+        dirs = [lang_sled.day_dir(year, day), test_dir, self.repo_root / ESBConfig.boiler_dir / lang.name]
+
+        board = WatchBoard(f"Watching {lang.name}, year {year} day {pad_day(day)}. Press Ctrl+C to stop")
+        snapshot = self.snapshot(*dirs)
+        tests = self.load_watch_tests(year, day)
+        board.queue(tests, tests)
+        task = asyncio.create_task(self.cycle(board, runner, year, day, tests, build=True))
+
+        with Live(get_renderable=board.render, refresh_per_second=10):
+            while True:
+                new_snapshot = await self.wait_changes(dirs, snapshot)
+                changed = {
+                    path
+                    for path in snapshot.keys() | new_snapshot.keys()
+                    if snapshot.get(path) != new_snapshot.get(path)
+                }
+                snapshot = new_snapshot
+
+                source_changed = any(not path.is_relative_to(test_dir) for path in changed)
+                new_tests = self.load_watch_tests(year, day)
+                selected = self.affected_tests(tests, new_tests, source_changed=source_changed)
+                tests = new_tests
+                if not selected and not source_changed:
+                    board.queue(tests, selected)
+                    board.message = "No affected tests"
+                    continue
+
+                if not task.done():
+                    task.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await task
+                if source_changed and (spec := LangMap.load(self.repo_root).get(lang.name)) != runner.spec:
+                    runner = LangRunner(spec, LangSled.from_spec(self.repo_root, spec))
+                board.queue(tests, selected)
+                task = asyncio.create_task(self.cycle(board, runner, year, day, selected, build=source_changed))
+
+    @staticmethod
+    def snapshot(*dirs: Path) -> Snapshot:
+        """Modification times of all watched files. Build artifacts and hidden directories are ignored"""
+        ret = {}
+        for directory in dirs:
+            if not directory.is_dir():
+                continue
+            for path in directory.rglob("*"):
+                relative_parts = path.relative_to(directory).parts
+                if any(part in ESBConfig.watch_ignore or part.startswith(".") for part in relative_parts):
+                    continue
+                if path.is_file():
+                    ret[path] = path.stat().st_mtime_ns
+        return ret
+
+    async def wait_changes(self, dirs: list[Path], snapshot: Snapshot) -> Snapshot:
+        while (new_snapshot := self.snapshot(*dirs)) == snapshot:
+            await asyncio.sleep(ESBConfig.watch_interval)
+        # Editors usually write in bursts. Wait for the files to settle before rerunning
+        while True:
+            await asyncio.sleep(ESBConfig.watch_debounce)
+            settled = self.snapshot(*dirs)
+            if settled == new_snapshot:
+                return settled
+            new_snapshot = settled
+
+    def load_watch_tests(self, year: int, day: int) -> TestCases:
+        return {
+            (name, part): test
+            for test_file in self.find_test_files(year, day)
+            for part in self.parts
+            for name, test in self.load_tests(test_file, part)
+            if self.filter_test is None or self.filter_test in name
+        }
+
+    @staticmethod
+    def affected_tests(old_tests: TestCases, new_tests: TestCases, *, source_changed: bool) -> TestCases:
+        if source_changed:
+            return new_tests
+        return {key: test for key, test in new_tests.items() if old_tests.get(key) != test}
+
+    async def cycle(self, board: WatchBoard, runner: LangRunner, year: int, day: int, tests: TestCases, *, build: bool):
+        t0 = perf_counter()
+        day_wd = runner.sled.working_dir(year=year, day=day)
+        try:
+            if build and runner.spec.build_command is not None:
+                board.message = "Building..."
+                if not await self.build(runner, year, day):
+                    board.cancel()
+                    board.message = "[red]Build failed[/red]"
+                    return
+
+            run_command = runner.prepare_run_command(year=year, day=day)
+            for (name, part), test in tests.items():
+                row = board.rows[name, part]
+                row.status = WatchStatus.RUNNING
+                board.message = f"Running {name}"
+                args = [str(arg) for arg in test["args"]] if "args" in test else None
+                # One process per test: FIREPLACEv1 solutions read a single input and exit, so there is
+                # no runner that could be kept warm between cycles without changing the protocol
+                result = await fireplace.exec_protocol_async(run_command, part, args, day_wd, test["input"], echo=False)
+                row.answer = result.answer or ""
+                if result.unit is not None and result.running_time is not None:
+                    row.running_time = MetricPrefix.format_float(
+                        result.unit.to_float(result.running_time), "s", precision=3, short=True
+                    )
+                match (result.status, result.answer == str(test["answer"])):
+                    case (fireplace.FPStatus.Ok, True):
+                        row.status = WatchStatus.OK
+                    case (fireplace.FPStatus.Ok, False):
+                        row.status = WatchStatus.FAIL
+                    case _:
+                        row.status = WatchStatus.ERROR
+                        row.answer = result.stderr.strip().split("\n")[-1]
+            board.message = f"Finished in {perf_counter() - t0:.2f}s. Waiting for changes..."
+        except asyncio.CancelledError:
+            board.cancel()
+            raise
+
+    @staticmethod
+    async def build(runner: LangRunner, year: int, day: int) -> bool:
+        if runner.spec.build_command is None:
+            return True
+        command = runner.prepare_build_command(year, day)
+        proc = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=runner.sled.working_dir(year=year, day=day),
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            return await proc.wait() == 0
+        except asyncio.CancelledError:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            raise
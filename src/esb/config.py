@@ -25,9 +25,24 @@ class ESBConfig:
     tests_dir = "tests"
     boiler_template = "template"
     boiler_template_base = "base"
+    boiler_template_shared = "shared"
     blank_root = package_root / blank_dir
     boiler_root = package_root / boiler_dir
     spec_filename = "spec.json"
+    lang_cache = "langs.json"  # compiled language specs, in `cache_dir`
+    tests_corpus_dir = "aoc_tests"
+    tests_archive = "aoc_tests.zip"
+
+    # Database. Many esb processes may share it. See `SqlConnection`
+    db_busy_timeout = 5.0  # seconds waiting for another writer
+    db_retries = 5
+    db_retry_backoff = 0.05  # seconds. Doubles on each retry
+    db_fetch_size = 512  # rows per batch when streaming query results
+    sketch_accuracy = 0.01  # relative error of the running time quantiles
+    stats_numpy_min = 2048  # values aggregated with NumPy instead of Python, when installed
+    run_retention_days = 90  # older runs are rolled up into statistics and deleted...
+    run_retention_runs = 100  # ...except for the last ones of each puzzle part and language
+    vacuum_free_pages = 256  # free pages returned to the file system after pruning
 
     # AoC
     first_year = 2015
@@ -39,7 +54,30 @@ class ESBConfig:
     part_2 = 2
     max_parts = max(parts)
 
+    # Fetch. Be nice to the AoC servers: few workers and at most `fetch_rate` requests per second
+    fetch_workers = 3
+    fetch_rate = 1.0
+    fetch_burst = 3
+    fetch_retries = 4
+    fetch_backoff = 2.0  # seconds. Doubles on each retry
+    http_cache_dir = "http"
+    submit_max_wait = 300  # seconds. Longer lockouts are not waited for
+
+    # Unlock. Puzzles unlock at midnight EST
+    unlock_title = "Day {day}: (unlocks at midnight EST)"
+    unlock_warmup = 10  # seconds before unlock to open the connection
+    unlock_grace = 3600  # seconds after unlock in which the day is still the "next" one
+    unlock_retries = 5
+    unlock_retry_delay = 0.5  # seconds
+
     # Report
     blank_dash = package_root / blank_dir / "README.md"
     blank_report = package_root / blank_dir / "REPORT.md"
     truncate_answer = 512
+    render_cache_size = 64  # rendered plots and status sections kept in the archive
+    charts = "text"  # "text", built in, or "plotext" if installed
+
+    # Watch
+    watch_interval = 0.1  # seconds between file system polls
+    watch_debounce = 0.25  # seconds without changes before rerunning
+    watch_ignore = frozenset({".git", "__pycache__", "_build", "deps", "target", "node_modules"})
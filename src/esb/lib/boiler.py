@@ -44,6 +44,32 @@ class CodeFurnace:
     def copy_base(self, dst_dir: Path):
         base_dir = self.lang_sled.boiler_base_subdir
         shutil.copytree(base_dir, dst_dir)
+        if self.lang_spec.shared is not None:
+            self.copy_shared()
+
+    def copy_shared(self):
+        """
+        Copies the `shared` boiler directory to the language root. Existing files are kept
+        since they belong to every day of the language (eg: dependency caches and lockfiles).
+        """
+        src_dir = self.lang_sled.boiler_shared_subdir
+        dst_dir = self.lang_sled.shared_dir
+        dst_dir.mkdir(parents=True, exist_ok=True)
+        if not src_dir.is_dir():
+            return
+        for src in src_dir.rglob("*"):
+            dst = dst_dir / src.relative_to(src_dir)
+            if src.is_dir():
+                dst.mkdir(parents=True, exist_ok=True)
+            elif not dst.exists():
+                shutil.copy(src, dst)
+
+    def shared_warm(self) -> bool:
+        """Whether all the shared paths of the language were already created by a previous install"""
+        if self.lang_spec.shared is None:
+            return False
+        shared_dir = self.lang_sled.shared_dir
+        return all((shared_dir / path).exists() for path in self.lang_spec.shared)
 
     def copy_template(self, year: int, day: int, title: str, url: str):
         src_dir = self.lang_sled.boiler_subdir
@@ -62,6 +88,12 @@ class CodeFurnace:
             )
             dst.write_text(content)
 
+    def retitle(self, year: int, day: int, old_title: str, title: str):
+        """Replaces a placeholder title in the copied template files"""
+        for dst in self.lang_sled.copied_map(year, day).values():
+            if dst.is_file() and old_title in (content := dst.read_text()):
+                dst.write_text(content.replace(old_title, title))
+
     def make_test_dir(self, year: int, day: int):
         ts = CacheTestSled(self.lang_sled.repo_root)
         day_dir = ts.day_dir(year, day)
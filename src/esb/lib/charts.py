@@ -0,0 +1,275 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from functools import cache
+from typing import TYPE_CHECKING, Protocol
+
+from esb.config import ESBConfig
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+BLOCKS = " ▁▂▃▄▅▆▇█"  # Eighths of a cell, from empty to full
+BAR = "▇"
+POINT = "•"
+VLINE = "│"
+
+
+class Charts(Protocol):
+    """Plain text charts of the dashboards. Widths and heights are characters, axes included"""
+
+    def bars(self, labels: Sequence[str], values: Sequence[float], *, title: str, width: int) -> str:
+        """Horizontal bars, one per label"""
+        ...
+
+    def histogram(
+        self,
+        counts: Sequence[int],
+        edges: Sequence[float],
+        *,
+        title: str,
+        width: int,
+        height: int,
+        xlim: tuple[float, float],
+        xticks: Sequence[float],
+        xlabels: Sequence[str],
+        vlines: Sequence[float] = (),
+    ) -> str:
+        """Vertical bars of `counts` between consecutive `edges`, with vertical lines at `vlines`"""
+        ...
+
+    def scatter(
+        self,
+        xs: Sequence[float],
+        ys: Sequence[float],
+        *,
+        title: str,
+        width: int,
+        height: int,
+        xlim: tuple[float, float],
+        ylim: tuple[float, float],
+        xticks: Sequence[float],
+        yticks: Sequence[float],
+        ylabels: Sequence[str],
+    ) -> str: ...
+
+
+@dataclass
+class Canvas:
+    """Plot area of `width` x `height` cells mapping `xlim` and `ylim`. Row 0 is the bottom"""
+
+    width: int
+    height: int
+    xlim: tuple[float, float]
+    ylim: tuple[float, float]
+    cells: list[list[str]] = field(init=False)
+
+    def __post_init__(self):
+        self.cells = [[" "] * self.width for _ in range(self.height)]
+
+    @staticmethod
+    def scale(value: float, lim: tuple[float, float], size: int) -> int:
+        low, high = lim
+        return round((value - low) / (high - low) * (size - 1)) if high > low else 0
+
+    def col(self, x: float) -> int:
+        return self.scale(x, self.xlim, self.width)
+
+    def row(self, y: float) -> int:
+        return self.scale(y, self.ylim, self.height)
+
+    def put(self, col: int, row: int, char: str, *, over: bool = True):
+        if 0 <= col < self.width and 0 <= row < self.height and (over or self.cells[row][col] == " "):
+            self.cells[row][col] = char
+
+    def render(
+        self,
+        title: str,
+        xticks: Sequence[float],
+        xlabels: Sequence[str],
+        yticks: Sequence[float],
+        ylabels: Sequence[str],
+    ) -> str:
+        label_width = max(map(len, ylabels), default=0)
+        ylabel_rows = {self.row(y): label for y, label in zip(yticks, ylabels, strict=True)}
+        lines = [title.center(label_width + 1 + self.width).rstrip()] if title else []
+        for row in reversed(range(self.height)):
+            axis = "┤" if row in ylabel_rows else "│"
+            lines.append(f"{ylabel_rows.get(row, ''):>{label_width}}{axis}{''.join(self.cells[row])}".rstrip())
+
+        xlabel_cols = {self.col(x): label for x, label in zip(xticks, xlabels, strict=True)}
+        axis = "".join("┬" if col in xlabel_cols else "─" for col in range(self.width))
+        lines.append(f"{' ' * label_width}└{axis}")
+        # Labels centered under their ticks, kept inside the chart, skipping the ones that would overlap
+        labels = ""
+        for col, label in sorted(xlabel_cols.items()):
+            start = min(label_width + 1 + col - len(label) // 2, label_width + 1 + self.width - len(label))
+            if start > len(labels):
+                labels = f"{labels:<{start}}{label}"
+        lines.append(labels)
+        return "\n".join(lines)
+
+
+class TextCharts:
+    """Built in renderer. Writes plain text directly, so the output is the same on every terminal"""
+
+    @staticmethod
+    def bars(labels: Sequence[str], values: Sequence[float], *, title: str, width: int) -> str:
+        label_width = max(map(len, labels), default=0)
+        value_strs = [f"{value:g}" for value in values]
+        room = width - label_width - max(map(len, value_strs), default=0) - 3
+        top = max(values, default=0) or 1
+        lines = [title.center(width).rstrip()] if title else []
+        for label, value, value_str in zip(labels, values, value_strs, strict=True):
+            lines.append(f"{label:>{label_width}} {BAR * round(value / top * room)} {value_str}")
+        return "\n".join(lines)
+
+    def histogram(
+        self,
+        counts: Sequence[int],
+        edges: Sequence[float],
+        *,
+        title: str,
+        width: int,
+        height: int,
+        xlim: tuple[float, float],
+        xticks: Sequence[float],
+        xlabels: Sequence[str],
+        vlines: Sequence[float] = (),
+    ) -> str:
+        top = max(counts, default=0) or 1
+        yticks = [0, top / 2, top]
+        ylabels = [f"{y:g}" for y in yticks]
+        canvas = self.canvas(width, height, xlim, (0, top), ylabels, title=title)
+        for count, low, high in zip(counts, edges, edges[1:], strict=False):
+            eighths = round(count / top * canvas.height * 8)
+            first = canvas.col(low)
+            for col in range(first, max(canvas.col(high), first + 1)):
+                for row in range(canvas.height):
+                    if (fill := min(eighths - row * 8, 8)) > 0:
+                        canvas.put(col, row, BLOCKS[fill])
+        for x in vlines:
+            for row in range(canvas.height):
+                canvas.put(canvas.col(x), row, VLINE, over=False)
+        return canvas.render(title, xticks, xlabels, yticks, ylabels)
+
+    def scatter(
+        self,
+        xs: Sequence[float],
+        ys: Sequence[float],
+        *,
+        title: str,
+        width: int,
+        height: int,
+        xlim: tuple[float, float],
+        ylim: tuple[float, float],
+        xticks: Sequence[float],
+        yticks: Sequence[float],
+        ylabels: Sequence[str],
+    ) -> str:
+        canvas = self.canvas(width, height, xlim, ylim, ylabels, title=title)
+        for x, y in zip(xs, ys, strict=True):
+            canvas.put(canvas.col(x), canvas.row(y), POINT)
+        return canvas.render(title, xticks, [f"{x:g}" for x in xticks], yticks, ylabels)
+
+    @staticmethod
+    def canvas(
+        width: int,
+        height: int,
+        xlim: tuple[float, float],
+        ylim: tuple[float, float],
+        ylabels: Sequence[str],
+        *,
+        title: str,
+    ) -> Canvas:
+        """Plot area left once the title, the axes and their labels take their share"""
+        label_width = max(map(len, ylabels), default=0)
+        return Canvas(width - label_width - 1, height - 2 - bool(title), xlim, ylim)
+
+
+class PlotextCharts:
+    """plotext renderer. Optional: `pip install esb[plotext]`"""
+
+    def __init__(self):
+        import plotext  # noqa: PLC0415
+
+        self.plt = plotext
+
+    def bars(self, labels: Sequence[str], values: Sequence[float], *, title: str, width: int) -> str:
+        self.plt.clear_figure()
+        self.plt.simple_bar(labels, values, width=width, title=title)
+        return re.sub(r"\.0$", "", self.build(), flags=re.MULTILINE)
+
+    def histogram(
+        self,
+        counts: Sequence[int],
+        edges: Sequence[float],
+        *,
+        title: str,
+        width: int,
+        height: int,
+        xlim: tuple[float, float],
+        xticks: Sequence[float],
+        xlabels: Sequence[str],
+        vlines: Sequence[float] = (),
+    ) -> str:
+        self.plt.clear_figure()
+        self.plt.bar(edges, counts)
+        self.plt.plot_size(width, height)
+        self.plt.xlim(*xlim)
+        self.plt.xticks(xticks, xlabels)
+        for x in vlines:
+            self.plt.vline(x)
+        self.plt.title(title)
+        return self.build()
+
+    def scatter(
+        self,
+        xs: Sequence[float],
+        ys: Sequence[float],
+        *,
+        title: str,
+        width: int,
+        height: int,
+        xlim: tuple[float, float],
+        ylim: tuple[float, float],
+        xticks: Sequence[float],
+        yticks: Sequence[float],
+        ylabels: Sequence[str],
+    ) -> str:
+        self.plt.clear_figure()
+        self.plt.plot_size(width, height)
+        self.plt.title(title)
+        self.plt.xlim(*xlim)
+        self.plt.xticks(xticks)
+        self.plt.ylim(*ylim)
+        self.plt.yticks(yticks, ylabels)
+        self.plt.scatter(xs, ys)
+        return self.build()
+
+    def build(self) -> str:
+        ansi_escape = re.compile(r"(\x9B|\x8F|\x9A|\x8D|\x90|(?:\x1B\[|\x1B\])[0-9;]*m)")
+        return ansi_escape.sub("", self.plt.build())
+
+
+@cache
+def charts() -> Charts:
+    """Renderer chosen by `ESBConfig.charts`. Falls back to the built in one if plotext is missing"""
+    if ESBConfig.charts == "plotext":
+        try:
+            return PlotextCharts()
+        except ImportError:
+            pass
+    return TextCharts()
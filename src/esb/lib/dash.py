@@ -11,78 +11,76 @@ Script your way to rescue Christmas as part of the ElfScript Brigade team.
 
 from __future__ import annotations
 
-import re
-from collections import defaultdict
+import hashlib
+import shutil
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+from functools import cache, partial
+from io import StringIO
 from math import log10
-from statistics import mean, median, stdev
 from typing import TYPE_CHECKING
 
-import plotext as plt  # type: ignore
-
 from esb.config import ESBConfig
+from esb.lib.charts import charts
 from esb.lib.paths import pad_day
+from esb.lib.sketch import LogSketch
 from esb.protocol.metric_prefix import MetricPrefix
 
 if TYPE_CHECKING:
-    from collections.abc import Callable, Iterable, Sequence
+    from collections.abc import Callable, Collection, Iterable, Sequence
     from pathlib import Path
-    from typing import Any, Self
+    from typing import Any, Self, TextIO
 
-    from esb.lib.db import ECAPuzzle, ECARun, ElvenCrisisArchive, Table
+    from esb.lib.db import ElvenCrisisArchive, Query
     from esb.lib.langs import LangMap
 
 DayStars = dict[int, int]
 YearStars = dict[int, DayStars]
 LangStars = dict[str, YearStars]
+NANOS_PER_SECOND = 1e9
+NO_DATA = "\n-- No data --\n"
+NOT_ENOUGH_DATA = "\n-- Not enough data. Run more solutions --\n"
+MIN_STATS_POINTS = 3
+TIME_TICKS = [-7.5, -6, -4.5, -3, -1.5, 0, 1.5, 3, 4.5]
+TIME_LABELS = [MetricPrefix.format_float(10**i, "s", precision=0, short=True) for i in TIME_TICKS]
+# Tables each cached section reads. See `BaseDash.cached`
+STARS_TABLES = ("ECAPuzzle", "ECALanguage")
+PLOTS_TABLES = ("ECAPuzzle", "ECALanguage", "ECAStats")
+
+
+class HTMLTable:
+    """
+    HTML table streamed into `out` row by row, indented by two spaces per level. Rows of the same
+    shape are written from one `str.format` template, see `row_template`
+    """
+
+    def __init__(self, out: TextIO):
+        self.out = out
+
+    def __enter__(self) -> Self:
+        self.out.write("<table>\n")
+        return self
 
+    def __exit__(self, *_):
+        self.out.write("</table>")
 
-@dataclass
-class CorrectRun:
-    year: int
-    day: int
-    part: int
-    language: str
-    time: float
-
-
-@dataclass
-class HTML:
-    tag: str
-    content: str = ""
-    attributes: dict = field(default_factory=dict)
-    children: list[Self] = field(default_factory=list)
-
-    def add_child(self, child_element: Self) -> Self:
-        self.children.append(child_element)
-        return self
+    def row(self, tag: str, cells: Sequence[str], attributes: dict[str, Any] | None = None):
+        """A row of `tag` cells. Empty cells are self-closing"""
+        attrs = "".join(f' {key}="{value}"' for key, value in (attributes or {}).items())
+        if all(cells):
+            self.out.write(row_template(tag, len(cells), attrs).format(*cells))
+            return
+        self.out.write("  <tr>\n")
+        for cell in cells:
+            self.out.write(f"    <{tag}{attrs}>{cell}</{tag}>\n" if cell else f"    <{tag}{attrs} />\n")
+        self.out.write("  </tr>\n")
 
-    def add_children(self, childrens: Iterable[Self]) -> Self:
-        for child_element in childrens:
-            self.add_child(child_element)
-        return self
 
-    def __str__(self) -> str:
-        return self.render()
-
-    def render(self, indent=0) -> str:
-        indent_str = " " * indent
-        attrs = " ".join(f'{key}="{value}"' for key, value in self.attributes.items())
-        attrs_str = f" {attrs}" if attrs else ""
-        if self.children or self.content:
-            result = f"{indent_str}<{self.tag}{attrs_str}>"
-            if self.content:
-                result += f"{self.content}"
-                result += "\n".join(child.render(indent=indent + 2) for child in self.children)
-                result += f"</{self.tag}>"
-            else:
-                result += "\n"
-                result += "\n".join(child.render(indent=indent + 2) for child in self.children)
-                result += f"\n{indent_str}</{self.tag}>"
-        else:
-            result = f"{indent_str}<{self.tag}{attrs_str} />"
-        return result
+@cache
+def row_template(tag: str, size: int, attrs: str) -> str:
+    """Template of a table row of `size` non-empty `tag` cells"""
+    cell = f"    <{tag}{attrs.replace('{', '{{').replace('}', '}}')}>{{}}</{tag}>\n"
+    return f"  <tr>\n{cell * size}  </tr>\n"
 
 
 @dataclass
@@ -93,50 +91,32 @@ class BaseDash:
     SOLVED_PT1: int = field(init=False, default=1)
     SOLVED_PT2: int = field(init=False, default=2)
 
-    @staticmethod
-    def groupby(rows: Iterable, key: str) -> dict[Any, Any]:
-        ret: dict[Any, Any] = {}
-        for row in rows:
-            ret.setdefault(getattr(row, key), []).append(row)
-        return ret
-
-    @staticmethod
-    def groupby_fn(rows: Iterable, fn: Callable) -> dict[Any, Any]:
-        grouped_dates = defaultdict(list)
-        for row in rows:
-            month_name = fn(row)
-            grouped_dates[month_name].append(row)
-        return grouped_dates
-
-    def count_stars(self, rows: Iterable, cmp: Callable[[Table], int]) -> YearStars:
-        return {
-            year: {day: cmp(s) for day, [s] in self.groupby(rows, "day").items()}
-            for year, rows in self.groupby(rows, "year").items()
-        }
-
-    def fetch_year_stars(self) -> YearStars:
-        stats = self.db.ECAPuzzle.fetch_all()
-
-        def cmp_year(s):
-            if s.day == ESBConfig.last_day and s.answer_pt1 is not None:  # Day 25 has only one star
-                return self.SOLVED_PT2
-            return (
-                self.SOLVED_NONE
-                if s.answer_pt1 is None
-                else self.SOLVED_PT1
-                if s.answer_pt2 is None
-                else self.SOLVED_PT2
+    def fetch_year_stars(self, years: Collection[int] | None = None) -> YearStars:
+        stars = (
+            self.db.ECAPuzzle
+            .query()
+            .select(
+                "year",
+                "day",
+                "CASE WHEN answer_pt1 IS NULL THEN :none "
+                "WHEN answer_pt2 IS NOT NULL OR day = :last_day THEN :pt2 "  # Day 25 has only one star
+                "ELSE :pt1 END",
             )
-
-        return self.count_stars(stats, cmp_year)
-
-    def fetch_lang_stars(self) -> LangStars:
-        langs = self.db.ECALanguage.fetch_all()
-
-        def cmp_lang(s):
-            return int(s.solved_pt1 is not None) + int(s.solved_pt2 is not None)
-
-        return {lang: self.count_stars(rows, cmp_lang) for lang, rows in self.groupby(langs, "language").items()}
+            .bind(none=self.SOLVED_NONE, pt1=self.SOLVED_PT1, pt2=self.SOLVED_PT2, last_day=ESBConfig.last_day)
+        )
+        year_stars: YearStars = {}
+        for year, day, solved in self.only_years(stars, years):
+            year_stars.setdefault(year, {})[day] = solved
+        return year_stars
+
+    def fetch_lang_stars(self, years: Collection[int] | None = None) -> LangStars:
+        stars = self.db.ECALanguage.query().select(
+            "language", "year", "day", "(solved_pt1 IS NOT NULL) + (solved_pt2 IS NOT NULL)"
+        )
+        lang_stars: LangStars = {}
+        for language, year, day, solved in self.only_years(stars, years):
+            lang_stars.setdefault(language, {}).setdefault(year, {})[day] = solved
+        return lang_stars
 
     @staticmethod
     def build_year_str(year: int, days: DayStars) -> str:
@@ -164,15 +144,39 @@ class BaseDash:
                     ret += self.build_stars_str(stars, self.lmap.get(lang).symbol)
         return ret
 
+    def cached(self, section: str, tables: Iterable[str], render: Callable[[], str], *, langs: bool = False) -> str:
+        """
+        Output of `render`, reused while `tables` are unchanged. The key hashes the section name,
+        the change counters of the tables it reads and the terminal width, so changes from any
+        process invalidate it. Sections that read the language specs pass `langs`, adding the specs
+        to the key, since a repo can edit them. The last `ESBConfig.render_cache_size` outputs are kept
+        """
+        tables = tuple(tables)
+        width = shutil.get_terminal_size().columns
+        data = f"{section}\0{width}\0{tables}\0{self.db.changes(*tables)}"
+        if langs:
+            data += f"\0{self.lmap!r}"
+        key = hashlib.sha256(data.encode()).hexdigest()
+        if (hit := self.db.ECARenderCache.find_one({"key": key})) is not None:
+            return hit.content
+
+        content = render()
+
+        def store():
+            self.db.ECARenderCache(key, content).insert(replace=True)
+            self.db.sql.cur.execute(
+                "DELETE FROM ECARenderCache WHERE rowid NOT IN "
+                "(SELECT rowid FROM ECARenderCache ORDER BY rowid DESC LIMIT ?)",
+                (ESBConfig.render_cache_size,),
+            )
+
+        self.db.sql.atomic(store)
+        return content
+
     def brigadista(self) -> str:
         b = self.db.ECABrigadista.fetch_single()
         return f"* Brigadista ID: {b.brigadista_id}\n* In Duty Since: {b.creation_date}"
 
-    @staticmethod
-    def strip_ansi(text: str) -> str:
-        ansi_escape = re.compile(r"(\x9B|\x8F|\x9A|\x8D|\x90|(?:\x1B\[|\x1B\])[0-9;]*m)")
-        return ansi_escape.sub("", text)
-
     @staticmethod
     def sort_dict_by_value(d: dict, *, ascending=True) -> dict:
         s = 1 if ascending else -1
@@ -200,147 +204,191 @@ class BaseDash:
             current_date = (current_date + timedelta(days=32)).replace(day=1)
         return self.sort_dict_by_key(month_dict)
 
+    def correct_stats(self, schema: str = "main") -> Query:
+        """ECAStats rows of the right answers, with the language name. `schema` of an attached archive"""
+        return (
+            self.db.sql
+            .query(f"{schema}.ECAStats s")
+            .select(
+                "s.year",
+                "s.day",
+                "s.part",
+                "l.name AS language",
+                "s.count",
+                "s.mean",
+                "s.m2",
+                "s.min_ns",
+                "s.max_ns",
+                "s.sketch",
+            )
+            .join(f"{schema}.ECAPuzzle p", "p.year = s.year AND p.day = s.day")
+            .join(f"{schema}.ECALanguageName l", "l.id = s.language_id")
+            .where(
+                "(s.part = :part_1 AND s.answer = p.answer_pt1) OR (s.part = :part_2 AND s.answer = p.answer_pt2)",
+                part_1=ESBConfig.part_1,
+                part_2=ESBConfig.part_2,
+            )
+        )
+
+    def time_stats(self, *keys: str, schemas: Sequence[str] = ("main",)) -> Query:
+        """
+        Count, mean, sample standard deviation, min and max in seconds and the merged sketch of
+        correct run times grouped by `keys`. Any of year, day, part and language. Statistics of
+        all the archives in `schemas` are merged, so the same language in two repos is one group.
+        Read from ECAStats: one row per answer, not per run
+        """
+        correct = self.correct_stats(schemas[0])
+        for schema in schemas[1:]:
+            correct.union_all(self.correct_stats(schema))
+        grouped = (
+            self.db.sql
+            .query("correct")
+            .select("*", "SUM(count * mean) OVER w / SUM(count) OVER w AS group_mean")
+            .window("w", f"PARTITION BY {', '.join(keys)}" if keys else "")
+        )
+        # Chan et al. parallel variance: merges the per answer Welford accumulators
+        return (
+            self.db.sql
+            .query("grouped")
+            .with_query("correct", correct)
+            .with_query("grouped", grouped)
+            .select(
+                *keys,
+                "SUM(count) AS n",
+                "SUM(count * mean) / SUM(count) / :nanos AS mean",
+                "sqrt(SUM(m2 + count * (mean - group_mean) * (mean - group_mean)) / (SUM(count) - 1)) / :nanos AS stdev",
+                "MIN(min_ns) / :nanos AS min",
+                "MAX(max_ns) / :nanos AS max",
+                "sketch_merge(sketch) AS sketch",
+            )
+            .bind(nanos=NANOS_PER_SECOND)
+            .group_by(*keys)
+            .order_by(*(f"{key} DESC" for key in keys))
+        )
+
     @staticmethod
-    def plt_remove_trailing_zeros(plt_str: str) -> str:
-        return re.sub(r"\.0$", "", plt_str, flags=re.MULTILINE)
+    def quantiles(sketch: bytes, *qs: float) -> list[float]:
+        """Quantiles in seconds of a serialized sketch of running times in nanoseconds"""
+        decoded = LogSketch.from_bytes(sketch)
+        return [(decoded.quantile(q) or 0.0) / NANOS_PER_SECOND for q in qs]
 
     @staticmethod
-    def histogram(data, bins=10):
-        min_value = min(data)
-        max_value = max(data)
-        bin_width = (max_value - min_value) / bins
-
-        bins_edges = [min_value + bin_width * i for i in range(bins + 1)]
-        counts = [0] * bins
-
-        for value in data:
-            bin_index = int((value - min_value) // bin_width)
-            if bin_index >= 0 and bin_index < len(counts):
-                counts[bin_index] += 1
-
-        return counts, bins_edges
-
-    def log_histogram(self, data, bins=10):
-        data = [log10(d) for d in data]
-        counts, bins_edges = self.histogram(data, bins)
-        return counts, bins_edges
-
-    def correct_runs(self, runs: Sequence[ECARun], puzzles: Sequence[ECAPuzzle]) -> Sequence[CorrectRun]:
-        puzzles_group = {
-            year: {day: puzzle for day, [puzzle] in self.groupby(puzzles_year, "day").items()}
-            for year, puzzles_year in self.groupby(puzzles, "year").items()
-        }
-        runs_group = {year: self.groupby(runs_year, "day") for year, runs_year in self.groupby(runs, "year").items()}
-        return [
-            CorrectRun(year, day, run.part, run.language, run.unit.to_float(run.time))
-            for year, runs_year in runs_group.items()
-            for day, runs_day in runs_year.items()
-            for run in runs_day
-            if (run.time is not None)
-            and (
-                ((run.part == ESBConfig.part_1) and run.answer == puzzles_group[year][day].answer_pt1)
-                or ((run.part == ESBConfig.part_2) and run.answer == puzzles_group[year][day].answer_pt2)
-            )
-        ]
+    def only_years(query: Query, years: Collection[int] | None) -> Query:
+        """Restricts `query` to rows of `years`. Every year when None"""
+        if years is None:
+            return query
+        params = {f"year_{i}": year for i, year in enumerate(years)}
+        return query.where(f"year IN ({', '.join(f':{name}' for name in params)})", **params)
 
     def plots(self, *, times_tables: bool = False) -> str:
-        no_data = "\n-- No data --\n"
-        not_enough_data = "\n-- Not enough data. Run more solutions --\n"
-        summary_msg = ""
+        return self.assemble_plots(
+            self.general_plots(), self.timing_plots(), self.detailed_plots(times_tables=times_tables)
+        )
+
+    @staticmethod
+    def assemble_plots(general_plots: str, timing_plots: dict[int, str], detailed_plots: dict[int, str]) -> str:
+        year_plots = "".join(timing_plots[year] for year in sorted(timing_plots, reverse=True)) or NO_DATA
+        return (
+            "## General Statistics\n"
+            f"```\n"
+            f"{general_plots}"
+            f"```\n"
+            "\n## Solutions timing\n"
+            f"```\n"
+            f"{year_plots.rstrip()}\n"
+            "```\n"
+            "\n## Detailed Running times\n"
+            f"{''.join(detailed_plots[year] for year in sorted(detailed_plots, reverse=True))}\n"
+        )
 
+    def general_plots(self) -> str:
         # AoC Solves
-        puzzles = list(self.db.ECAPuzzle.fetch_all())
-        puzzles_group = self.groupby(puzzles, "year")
-        solves_per_year = {
-            year: len([puzzle for puzzle in puzzles if puzzle.solved_pt2 is not None])
-            for year, puzzles in puzzles_group.items()
-        }
+        solves_per_year = dict(self.db.ECAPuzzle.query().select("year", "COUNT(solved_pt2)").group_by("year"))
         if len(solves_per_year) != 0:
             solves_per_year = self.fill_years(solves_per_year)
-            plt.simple_bar(solves_per_year.keys(), solves_per_year.values(), width=80, title="AoC Solves")
-            solves_per_year_plot = self.strip_ansi(plt.build())
-            solves_per_year_plot = self.plt_remove_trailing_zeros(solves_per_year_plot)
+            solves_per_year_plot = charts().bars(
+                [str(year) for year in solves_per_year], list(solves_per_year.values()), title="AoC Solves", width=80
+            )
         else:
-            solves_per_year_plot = no_data
+            solves_per_year_plot = NO_DATA
 
         # Favorite language
-        languages = list(self.db.ECALanguage.fetch_all())
-        languages_group = self.groupby(languages, "language")
-        solves_per_language = {
-            lang: len([puzzle for puzzle in puzzles if puzzle.solved_pt2 is not None])
-            for lang, puzzles in languages_group.items()
-        }
+        solves_per_language = dict(
+            self.db.ECALanguage.query().select("language", "COUNT(solved_pt2)").group_by("language")
+        )
         if len(solves_per_language) != 0:
             solves_per_language = self.sort_dict_by_value(solves_per_language, ascending=False)
-            plt.simple_bar(
-                solves_per_language.keys(), solves_per_language.values(), width=80, title="Favorite languages"
+            solves_per_language_plot = charts().bars(
+                list(solves_per_language), list(solves_per_language.values()), title="Favorite languages", width=80
             )
-            solves_per_language_plot = self.strip_ansi(plt.build())
-            solves_per_language_plot = self.plt_remove_trailing_zeros(solves_per_language_plot)
         else:
-            solves_per_language_plot = no_data
-
-        # Solve time per year
-        year_plots = ""
-        runs = list(self.db.ECARun.fetch_all())
-        correct = self.correct_runs(runs, puzzles)
-        year_times = self.sort_dict_by_key(
-            {year: [r.time for r in runs] for year, runs in self.groupby(correct, "year").items()}, ascending=False
-        )
-        time_ticks = [-7.5, -6, -4.5, -3, -1.5, 0, 1.5, 3, 4.5]
-        time_labels = [MetricPrefix.format_float(10**i, "s", precision=0, short=True) for i in time_ticks]
-        base_width = len(time_ticks)
-        min_stats_points = 3
-        for year, times in year_times.items():
-            plt.clear_figure()
-            if len(times) < min_stats_points:
-                year_plots += f"{not_enough_data}\n\n"
+            solves_per_language_plot = NO_DATA
+
+        return f"{solves_per_year_plot}\n{solves_per_language_plot}\n"
+
+    def timing_plots(self, years: Collection[int] | None = None) -> dict[int, str]:
+        """Solve time histogram of each year in `years`"""
+        year_plots = {}
+        for year_stats in self.only_years(self.time_stats("year"), years):
+            year = year_stats["year"]
+            if year_stats["n"] < MIN_STATS_POINTS:
+                year_plots[year] = f"{NOT_ENOUGH_DATA}\n\n"
                 continue
-            hist, edges = self.log_histogram(times, bins=base_width)
-            plt.bar(edges, hist)
-            plt.plot_size(base_width * 9, 20)
-            plt.xlim(min(time_ticks), max(time_ticks))
-            plt.xticks(time_ticks, time_labels)
-            times_mean = mean(times)
-            times_stdev = stdev(times)
-            times_median = median(times)
+            times_mean, times_stdev = year_stats["mean"], year_stats["stdev"]
+            times_median, times_p99 = self.quantiles(year_stats["sketch"], 0.5, 0.99)
+            hist, edges = LogSketch.from_bytes(year_stats["sketch"]).log_histogram(
+                len(TIME_TICKS), 1 / NANOS_PER_SECOND
+            )
             times_mean_str = MetricPrefix.format_float(times_mean, "s", precision=3, short=True)
             times_stdev_str = MetricPrefix.format_float(times_stdev, "s", precision=3, short=True)
             times_median_str = MetricPrefix.format_float(times_median, "s", precision=3, short=True)
-            plt.vline(log10(times_mean))
-            plt.vline(log10(times_median))
-            plt.title(f"Year {year} - mean: {times_mean_str}; stdev: {times_stdev_str}; median: {times_median_str}")
-            year_time_plot = self.strip_ansi(plt.build())
-            year_plots += f"{year_time_plot}\n\n"
-
-        if not year_plots:
-            year_plots = no_data
-
-        detailed_times = self.sort_dict_by_key(
-            {
-                year: {day: [r.time for r in runs] for day, runs in self.groupby(year_runs, "day").items()}
-                for year, year_runs in self.groupby(correct, "year").items()
-            },
-            ascending=False,
-        )
-        detailed_plots = ""
+            times_p99_str = MetricPrefix.format_float(times_p99, "s", precision=3, short=True)
+            year_plot = charts().histogram(
+                hist,
+                edges,
+                title=(
+                    f"Year {year} - mean: {times_mean_str}; stdev: {times_stdev_str}; "
+                    f"median: {times_median_str}; p99: {times_p99_str}"
+                ),
+                width=len(TIME_TICKS) * 9,
+                height=20,
+                xlim=(min(TIME_TICKS), max(TIME_TICKS)),
+                xticks=TIME_TICKS,
+                xlabels=TIME_LABELS,
+                vlines=[log10(times_mean), log10(times_median)],
+            )
+            year_plots[year] = f"{year_plot}\n\n"
+        return year_plots
+
+    def detailed_plots(self, years: Collection[int] | None = None, *, times_tables: bool = False) -> dict[int, str]:
+        """Mean running time of each day of the years in `years`, and optionally a table with more statistics"""
+        detailed_times: dict[int, dict[int, tuple[float, ...]]] = {}
+        for day_stats in self.only_years(self.time_stats("year", "day"), years):
+            if day_stats["n"] >= MIN_STATS_POINTS:
+                detailed_times.setdefault(day_stats["year"], {})[day_stats["day"]] = (
+                    day_stats["mean"],
+                    day_stats["stdev"],
+                    *self.quantiles(day_stats["sketch"], 0.5, 0.9, 0.99),
+                )
+        detailed_plots = {}
         for year, year_runs in detailed_times.items():
-            plt.clear_figure()
-            plt.plot_size(base_width * 9.3, 20)
-            plt.title(f"Year {year}")
-            plt.xlim(0, ESBConfig.last_day)
-            plt.xticks(range(1, 26))
-            plt.ylim(min(time_ticks), max(time_ticks))
-            plt.yticks(time_ticks, time_labels)
-
-            run_data = [
-                (day, mean(times), stdev(times)) for day, times in year_runs.items() if len(times) >= min_stats_points
-            ]
+            run_data = [(day, day_mean, day_std) for day, (day_mean, day_std, *_) in sorted(year_runs.items())]
             days, day_means, day_means_log, day_std = list(
                 zip(*[(d, ts, log10(ts), std) for d, ts, std in run_data], strict=False)
             )
-            plt.scatter(days, day_means_log)
-            detailed_plots += f"\n```\n{self.strip_ansi(plt.build())}\n```\n"
+            day_plot = charts().scatter(
+                days,
+                day_means_log,
+                title=f"Year {year}",
+                width=round(len(TIME_TICKS) * 9.3),
+                height=20,
+                xlim=(0, ESBConfig.last_day),
+                ylim=(min(TIME_TICKS), max(TIME_TICKS)),
+                xticks=ESBConfig.all_days,
+                yticks=TIME_TICKS,
+                ylabels=TIME_LABELS,
+            )
+            detailed_plots[year] = f"\n```\n{day_plot}\n```\n"
 
             if times_tables:
                 mean_map = dict(
@@ -358,38 +406,25 @@ class BaseDash:
                     )
                 )
 
-                rows = []
-                columns = [range(i, i + 5) for i in range(1, 26, 5)]
-                for s in columns:
-                    rows.extend([
-                        HTML("tr")
-                        .add_child(HTML("th", content="day"))
-                        .add_children([HTML("th", content=pad_day(i)) for i in s]),
-                        HTML("tr")
-                        .add_child(HTML("td", content="mean"))
-                        .add_children([HTML("td", content=mean_map.get(i, "--")) for i in s]),
-                        HTML("tr")
-                        .add_child(HTML("td", content="std"))
-                        .add_children([HTML("td", content=std_map.get(i, "--")) for i in s]),
-                        HTML("tr").add_child(HTML("td", attributes={"colspan": 7})),
-                    ])
-                table = HTML("table").add_children(rows)
-                detailed_plots += f"\n{table!s}\n"
-        summary_msg += (
-            "## General Statistics\n"
-            f"```\n"
-            f"{solves_per_year_plot}\n"
-            f"{solves_per_language_plot}\n"
-            f"```\n"
-            "\n## Solutions timing\n"
-            f"```\n"
-            f"{year_plots.rstrip()}\n"
-            "```\n"
-            "\n## Detailed Running times\n"
-            f"{detailed_plots}\n"
-        )
-
-        return summary_msg
+                percentile_maps = {
+                    name: {
+                        day: MetricPrefix.format_float(stats[index], "s", precision=3, short=True)
+                        for day, stats in year_runs.items()
+                    }
+                    for index, name in enumerate(["p50", "p90", "p99"], start=2)
+                }
+
+                out = StringIO()
+                with HTMLTable(out) as table:
+                    for s in (range(i, i + 5) for i in range(1, 26, 5)):
+                        table.row("th", ["day", *(pad_day(i) for i in s)])
+                        table.row("td", ["mean", *(mean_map.get(i, "--") for i in s)])
+                        table.row("td", ["std", *(std_map.get(i, "--") for i in s)])
+                        for name, percentile_map in percentile_maps.items():
+                            table.row("td", [name, *(percentile_map.get(i, "--") for i in s)])
+                        table.row("td", [""], {"colspan": 7})
+                detailed_plots[year] += f"\n{out.getvalue()}\n"
+        return detailed_plots
 
 
 @dataclass
@@ -410,6 +445,10 @@ class CliDash(BaseDash):
             ret[year] = f"{year_title}\n{langs_str}\n{stars_str}\n{days_str}\n{sep_str}\n"
         return ret
 
+    def years_summary_str(self) -> str:
+        ys = self.years_summary()
+        return "".join(f"\n{ys[year]}" for year in sorted(ys.keys(), reverse=True))
+
     def working_on(self) -> str:
         ac = self.db.ECAArgCache.fetch_single()
         return f"= Working on: {ac.language}, {ac.year} day {ac.day} part {ac.part} ="
@@ -423,13 +462,11 @@ class CliDash(BaseDash):
         report += f"{brigadista}\n\n"
         report += "SERVICE STARS\n"
 
-        ys = self.years_summary()
-        for year in sorted(ys.keys(), reverse=True):
-            report += f"\n{ys[year]}"
+        report += self.cached("status stars", STARS_TABLES, self.years_summary_str, langs=True)
 
         if self.full:
             report += "\n\n[bold red]ELFSCRIPT BRIGADE TECHNICAL REPORT[/bold red]\n\n"
-            report += self.plots().replace("```\n", "")
+            report += self.cached("status plots", PLOTS_TABLES, self.plots).replace("```\n", "")
 
         return report
 
@@ -446,34 +483,89 @@ class MdDash(BaseDash):
         self.readme = self.repo_root / "README.md"
         self.report = self.repo_root / "REPORT.md"
 
-    def build_dash(self, *, reset: bool) -> str:
+    def build(self, *, reset: bool = False) -> list[Path]:
+        """
+        Builds README.md and REPORT.md. Only the years changed since the last build are rendered
+        again, unless `reset`. Returns the files written: unchanged files are not touched
+        """
+        years = self.db.claim_dirty_years()
+        try:
+            texts = {
+                self.readme: self.build_dash(reset=reset, years=None if reset else years),
+                self.report: self.build_report(reset=reset, years=None if reset else years),
+            }
+        except BaseException:
+            self.db.mark_dirty(years)
+            raise
+        return [path for path, text in texts.items() if self.write(path, text)]
+
+    def build_dash(self, *, reset: bool, years: Collection[int] | None = None) -> str:
+        """README.md text. `years` to render again, reusing the other sections of the last build"""
         template = ESBConfig.blank_dash.read_text() if reset else self.readme.read_text()
         self.validate_tags(template)
 
-        years_summary_str = ""
-        ys = self.years_summary()
-        for year in sorted(ys.keys(), reverse=True):
-            years_summary_str += f"\n{ys[year]}"
+        ys = self.sections("README", self.years_summary, years)
+        years_summary_str = "".join(f"\n{ys[year]}" for year in sorted(ys.keys(), reverse=True))
 
         brigadista = self.brigadista()
         summary_msg = f"{brigadista}\n\n## SERVICE STARS\n{years_summary_str}\n"
 
-        final_text = self.paste_text(template, summary_msg)
-        self.readme.write_text(final_text)
-        return final_text
+        return self.paste_text(template, summary_msg)
 
-    def build_report(self, *, reset: bool) -> str:
+    def build_report(self, *, reset: bool, years: Collection[int] | None = None) -> str:
+        """REPORT.md text. `years` to render again, reusing the other sections of the last build"""
         template = ESBConfig.blank_report.read_text() if reset else self.report.read_text()
         self.validate_tags(template)
 
         brigadista = self.brigadista()
-        plots_str = self.plots(times_tables=True)
+        # Solves per year and language span every year: rendered again when any year changed
+        general_plots = self.sections(
+            "REPORT general", lambda _: {0: self.general_plots()}, () if years == set() else None
+        )
+        plots_str = self.assemble_plots(
+            general_plots.get(0, ""),
+            self.sections("REPORT timing", self.timing_plots, years),
+            self.sections("REPORT detailed", partial(self.detailed_plots, times_tables=True), years),
+        )
 
         report_msg = f"{brigadista}\n\n{plots_str}"
 
-        final_text = self.paste_text(template, report_msg)
-        self.report.write_text(final_text)
-        return final_text
+        return self.paste_text(template, report_msg)
+
+    def sections(
+        self, document: str, render: Callable[[Collection[int] | None], dict[int, str]], years: Collection[int] | None
+    ) -> dict[int, str]:
+        """
+        Sections of `document` by year. `render` builds the sections of the given years, or of every
+        year when None. Sections of the other years are read from the last build, stored in
+        ECADashSection. Everything is rendered if there is no last build
+        """
+        cached = {section.year: section.content for section in self.db.ECADashSection.find({"document": document})}
+        if years is None or not cached:
+            years = None
+            sections = render(None)
+        else:
+            sections = {year: content for year, content in cached.items() if year not in years}
+            sections |= render(years) if years else {}
+
+        if sections != cached:
+
+            def store():
+                self.db.sql.cur.execute("DELETE FROM ECADashSection WHERE document = ?", (document,))
+                self.db.ECADashSection.insert_many(
+                    self.db.ECADashSection(document, year, content) for year, content in sections.items()
+                )
+
+            self.db.sql.atomic(store)
+        return sections
+
+    @staticmethod
+    def write(path: Path, text: str) -> bool:
+        """Writes `text` unless `path` already has it. Whether it was written"""
+        if path.is_file() and path.read_text(encoding="utf-8") == text:
+            return False
+        path.write_text(text, encoding="utf-8")
+        return True
 
     def validate_tags(self, template: str):
         if self.start_tag not in template:
@@ -490,69 +582,63 @@ class MdDash(BaseDash):
 
         return template[: start_idx + len(self.start_tag) + 1] + msg + template[end_idx:]
 
-    def years_summary(self) -> dict[int, str]:
-        year_stars = self.fetch_year_stars()
-        lang_stars = self.fetch_lang_stars()
+    def years_summary(self, years: Collection[int] | None = None) -> dict[int, str]:
+        year_stars = self.fetch_year_stars(years)
+        lang_stars = self.fetch_lang_stars(years)
 
         ret = {}
         for year, days in year_stars.items():
-            columns = [range(i, i + 6) for i in range(1, 25, 6)]
-            rows = [row for s in columns for row in self.build_stars_row(year, days, lang_stars, s)]
-            last_day_rows = list(
-                self.build_stars_row(
-                    year, days, lang_stars, [ESBConfig.last_day], td_attributes={"colspan": 6, "align": "center"}
-                )
-            )
-            last_day_rows.pop()
-            table = HTML("table").add_children(rows).add_children(last_day_rows)
-
             solved = [v == ESBConfig.max_parts for v in days.values()]
             year_title = f"### {year} ({sum(solved)}/{ESBConfig.last_day})"
             if all(solved) and len(set(days.keys())) == ESBConfig.last_day:
                 year_title += " ⭐"
 
-            ret[year] = f"\n{year_title}\n\n{table!s}"
+            out = StringIO()
+            out.write(f"\n{year_title}\n\n")
+            lang_star_maps = self.lang_star_maps(year, lang_stars)
+            with HTMLTable(out) as table:
+                for subset in (range(i, i + 6) for i in range(1, 25, 6)):
+                    self.write_stars_rows(table, days, lang_star_maps, subset)
+                last_day_attributes = {"colspan": 6, "align": "center"}
+                self.write_stars_rows(table, days, lang_star_maps, [ESBConfig.last_day], last_day_attributes, gap=False)
+            ret[year] = out.getvalue()
         return ret
 
-    def build_stars_row(
+    def write_stars_rows(
         self,
-        year: int,
-        days: dict[int, int],
-        lang_stars: LangStars,
-        subset: Iterable[int],
-        td_attributes: dict[str, Any] | None = None,
-    ) -> Iterable[HTML]:
-        td_attributes = {} if td_attributes is None else td_attributes
-        lang_stars_str = [
+        table: HTMLTable,
+        days: DayStars,
+        lang_star_maps: Iterable[dict[int, str]],
+        subset: Sequence[int],
+        attributes: dict[str, Any] | None = None,
+        *,
+        gap: bool = True,
+    ):
+        """Rows of the days in `subset`: one per language, the stars, the days and an empty `gap` row"""
+        for lang_star_map in lang_star_maps:
+            table.row("td", [lang_star_map.get(day, "☐ ☐") for day in subset], attributes)
+        stars = [
             "⭐⭐" if days.get(day) == self.SOLVED_PT2 else "⭐☆" if days.get(day) == self.SOLVED_PT1 else "☆ ☆"
             for day in subset
         ]
-        return [
-            *self.build_lang_rows(year, lang_stars, subset, td_attributes),
-            HTML("tr").add_children([HTML("td", content=stars, attributes=td_attributes) for stars in lang_stars_str]),
-            HTML("tr").add_children([
-                HTML("th", content=f"{pad_day(day)}", attributes=td_attributes) for day in subset
-            ]),
-            HTML("tr").add_child(HTML("td", attributes={"colspan": len(list(subset)), **td_attributes})),
-        ]
-
-    def build_lang_rows(
-        self, year: int, lang_stars: LangStars, subset: Iterable[int], td_attributes: dict[str, Any] | None = None
-    ) -> Iterable[HTML]:
-        td_attributes = {} if td_attributes is None else td_attributes
-        langs = []
+        table.row("td", stars, attributes)
+        table.row("th", [pad_day(day) for day in subset], attributes)
+        if gap:
+            table.row("td", [""], {"colspan": len(subset), **(attributes or {})})
+
+    def lang_star_maps(self, year: int, lang_stars: LangStars) -> list[dict[int, str]]:
+        """Stars of each language with stars in `year`, by day"""
+        maps = []
         for lang, years in lang_stars.items():
             if year not in years or sum(years[year].values()) == 0:
                 continue
             emoji = self.lmap.get(lang).emoji
-            lang_star_map = {
+            maps.append({
                 day: f"{emoji}{emoji}"
                 if stars == self.SOLVED_PT2
                 else f"{emoji} ☐"
                 if stars == self.SOLVED_PT1
                 else "☐ ☐"
                 for day, stars in years[year].items()
-            }
-            lang_row = [HTML("td", content=lang_star_map.get(day, "☐ ☐"), attributes=td_attributes) for day in subset]
-            langs.append(HTML("tr").add_children(lang_row))
-        return langs
+            })
+        return maps
@@ -11,22 +11,35 @@ Script your way to rescue Christmas as part of the ElfScript Brigade team.
 
 from __future__ import annotations
 
+import inspect
+import math
 import sqlite3
+import time
 import uuid
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import TYPE_CHECKING
+from itertools import groupby
+from operator import itemgetter
+from typing import TYPE_CHECKING, ClassVar, TypeVar
 
 from esb.config import ESBConfig
+from esb.lib.sketch import LogSketch, SketchMerge
+from esb.lib.stats import stats_backend
 from esb.protocol.metric_prefix import MetricPrefix
 
 if TYPE_CHECKING:
-    from collections.abc import Iterator
+    from collections.abc import Callable, Iterable, Iterator
     from pathlib import Path
-    from typing import Any, ClassVar, Self
+    from typing import Any, Self
 
     from esb.protocol.fireplace import FPPart
 
+    # SQL statements and functions for data conversions that SQL can't express
+    Migration = tuple[str | Callable[[sqlite3.Cursor], None], ...]
+
+T = TypeVar("T")
+
 
 @dataclass
 class SqlConnection:
@@ -34,11 +47,19 @@ class SqlConnection:
     Sql Connection singleton
 
     Initializes once with an optional
+
+    Concurrency contract: many esb processes may share the same database. The database runs in
+    WAL mode, so readers never block writers and see the last committed state. Writers are
+    serialized by SQLite: a writer waits up to `ESBConfig.db_busy_timeout` for the lock and
+    `write`/`atomic` retry with backoff after that. Write transactions take the lock up front
+    (`BEGIN IMMEDIATE`) and should be short: never wait on the network or a subprocess inside one.
+    A connection belongs to the thread that created it.
     """
 
     db_path: Path
     con: sqlite3.Connection = field(init=False, hash=False, repr=False)
     cur: sqlite3.Cursor = field(init=False, hash=False, repr=False)
+    depth: int = field(init=False, default=0, hash=False, repr=False)
 
     def __enter__(self):
         return self
@@ -47,8 +68,68 @@ class SqlConnection:
         self.close()
 
     def __post_init__(self):
-        self.con = sqlite3.connect(self.db_path)
+        self.con = sqlite3.connect(self.db_path, timeout=ESBConfig.db_busy_timeout)
         self.cur = self.con.cursor()
+        # Only applies to a file without tables yet, and switching to WAL already writes the header.
+        # Older repos switch on `esb archive compact`
+        if self.cur.execute("PRAGMA page_count").fetchone() == (0,):
+            self.cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.cur.execute("PRAGMA journal_mode=WAL")
+        # Durable on commit in WAL mode up to the last checkpoint. Much fewer fsyncs
+        self.cur.execute("PRAGMA synchronous=NORMAL")
+        self.create_math_functions()
+        self.con.create_aggregate("sketch_merge", 1, SketchMerge)  # type: ignore[arg-type]
+
+    def create_math_functions(self):
+        """SQLite may be built without math functions. Aggregation queries rely on them"""
+        try:
+            self.cur.execute("SELECT log10(1), sqrt(1)")
+        except sqlite3.OperationalError:
+            self.con.create_function("log10", 1, lambda x: math.log10(x) if x is not None and x > 0 else None)
+            self.con.create_function("sqrt", 1, lambda x: math.sqrt(x) if x is not None and x >= 0 else None)
+
+    @staticmethod
+    def is_busy(err: sqlite3.OperationalError) -> bool:
+        message = str(err)
+        return "database is locked" in message or "database is busy" in message
+
+    def retrying(self, fn: Callable[[], T]) -> T:
+        """
+        Calls the write unit `fn`, retrying with exponential backoff while another process holds
+        the lock. Inside a transaction errors are raised, so the whole unit is retried instead.
+        """
+        for attempt in range(ESBConfig.db_retries + 1):
+            try:
+                return fn()
+            except sqlite3.OperationalError as err:
+                if self.depth > 0 or not self.is_busy(err) or attempt == ESBConfig.db_retries:
+                    raise
+                if self.con.in_transaction:
+                    self.con.rollback()
+                time.sleep(ESBConfig.db_retry_backoff * 2**attempt)
+        message = "Should never reach here :thinking_face:"  # pragma: no cover
+        raise RuntimeError(message)  # pragma: no cover
+
+    def write(self, query: str, params: Any = (), *, many: bool = False):
+        """Executes a write statement. Commits unless inside a transaction"""
+
+        def execute():
+            if many:
+                self.cur.executemany(query, params)
+            else:
+                self.cur.execute(query, params)
+            self.commit()
+
+        self.retrying(execute)
+
+    def atomic(self, fn: Callable[[], T]) -> T:
+        """Runs `fn` in a transaction. The whole transaction is retried if the database is busy"""
+
+        def run() -> T:
+            with self.transaction():
+                return fn()
+
+        return self.retrying(run)
 
     def close(self):
         self.con.commit()
@@ -56,24 +137,224 @@ class SqlConnection:
         if hasattr(self, "db_path"):
             delattr(self, "db_path")
 
+    @contextmanager
+    def transaction(self) -> Iterator[Self]:
+        """
+        Unit of work. Writes inside the block are committed once at the end of the outermost block
+        and rolled back if it raises. Nested blocks are savepoints, so they can fail on their own.
+        """
+        savepoint = f"esb_{self.depth}"
+        if self.depth == 0:
+            if self.con.in_transaction:
+                self.con.commit()
+            self.cur.execute("BEGIN IMMEDIATE")
+        else:
+            self.cur.execute(f"SAVEPOINT {savepoint}")
+        self.depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.depth -= 1
+            if self.depth == 0:
+                self.con.rollback()
+            else:
+                self.cur.execute(f"ROLLBACK TO {savepoint}")
+                self.cur.execute(f"RELEASE {savepoint}")
+            raise
+        self.depth -= 1
+        if self.depth == 0:
+            self.con.commit()
+        else:
+            self.cur.execute(f"RELEASE {savepoint}")
+
+    def commit(self):
+        """Commits, unless inside a `transaction` which commits at its end"""
+        if self.depth == 0:
+            self.con.commit()
+
     def list_all_tables(self) -> list[tuple[str, ...]]:
         return [table for (table,) in self.cur.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()]
 
+    def stream(self, query: str, params: Any = (), row_factory: Callable | None = None) -> Iterator[Any]:
+        """
+        Streams rows in batches of `ESBConfig.db_fetch_size` from a dedicated cursor, so rows are
+        built as they are consumed and other queries may run meanwhile
+        """
+        cur = self.con.cursor()
+        cur.row_factory = row_factory
+        cur.arraysize = ESBConfig.db_fetch_size
+        try:
+            cur.execute(query, params)
+            while rows := cur.fetchmany():
+                yield from rows
+        finally:
+            cur.close()
+
+    def query(self, source: str) -> Query:
+        return Query(self, source)
+
+    def attach(self, db_path: Path, schema: str):
+        """Attaches another database, so queries can read its tables as `schema.table`"""
+        self.cur.execute("ATTACH DATABASE ? AS ?", (str(db_path), schema))
+
+    def schema_version(self, schema: str = "main") -> int:
+        return self.cur.execute(f"PRAGMA {schema}.user_version").fetchone()[0]
+
+    def size(self) -> int:
+        """Bytes of the database file, free pages included"""
+        (page_count,) = self.cur.execute("PRAGMA page_count").fetchone()
+        (page_size,) = self.cur.execute("PRAGMA page_size").fetchone()
+        return page_count * page_size
+
+    def incremental_vacuum(self, min_free_pages: int = 0):
+        """
+        Returns free pages to the file system once there are more than `min_free_pages`.
+        A no-op unless the database was created or vacuumed with `auto_vacuum = INCREMENTAL`
+        """
+        (free_pages,) = self.cur.execute("PRAGMA freelist_count").fetchone()
+        if free_pages > min_free_pages:
+            self.cur.execute("PRAGMA incremental_vacuum").fetchall()
+            self.commit()
+
+    def vacuum(self):
+        """
+        Rebuilds the database file without free pages and switches it to incremental vacuum.
+        Cannot run inside a transaction and holds the write lock meanwhile
+        """
+        self.con.commit()
+        self.cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.retrying(lambda: self.cur.execute("VACUUM"))
+        self.cur.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+@dataclass
+class Query:
+    """
+    Small SELECT builder, so grouping and aggregation run inside SQLite instead of Python.
+
+    Clauses are SQL expressions. Values are bound as named parameters and parameters of
+    common table expressions added with `with_query` are bound along with the main query.
+    Iterating a query streams `sqlite3.Row`s, which can be indexed by position or column name.
+
+        sql.query("ECARun r")
+        .select("r.year", "COUNT(*) AS runs", "AVG(r.time_ns) AS mean")
+        .join("ECAPuzzle p", "p.year = r.year AND p.day = r.day")
+        .where("r.part = :part", part=1)
+        .group_by("r.year")
+    """
+
+    sql: SqlConnection = field(repr=False)
+    source: str
+    columns: list[str] = field(default_factory=list)
+    ctes: dict[str, Query] = field(default_factory=dict)
+    joins: list[str] = field(default_factory=list)
+    conditions: list[str] = field(default_factory=list)
+    groups: list[str] = field(default_factory=list)
+    havings: list[str] = field(default_factory=list)
+    windows: dict[str, str] = field(default_factory=dict)
+    unions: list[Query] = field(default_factory=list)
+    orders: list[str] = field(default_factory=list)
+    params: dict[str, Any] = field(default_factory=dict)
+
+    def select(self, *columns: str) -> Self:
+        self.columns.extend(columns)
+        return self
+
+    def with_query(self, name: str, query: Query) -> Self:
+        self.ctes[name] = query
+        return self
+
+    def join(self, source: str, on: str, *, left: bool = False) -> Self:
+        self.joins.append(f"{'LEFT JOIN' if left else 'JOIN'} {source} ON {on}")
+        return self
+
+    def where(self, condition: str, **params: Any) -> Self:
+        self.conditions.append(f"({condition})")
+        self.params |= params
+        return self
+
+    def bind(self, **params: Any) -> Self:
+        self.params |= params
+        return self
+
+    def group_by(self, *columns: str) -> Self:
+        self.groups.extend(columns)
+        return self
+
+    def having(self, condition: str, **params: Any) -> Self:
+        self.havings.append(f"({condition})")
+        self.params |= params
+        return self
+
+    def window(self, name: str, definition: str) -> Self:
+        self.windows[name] = definition
+        return self
+
+    def union_all(self, query: Query) -> Self:
+        """Appends the rows of `query`, which must have no common table expressions or ordering"""
+        self.unions.append(query)
+        return self
+
+    def order_by(self, *columns: str) -> Self:
+        self.orders.extend(columns)
+        return self
+
+    def build(self) -> tuple[str, dict[str, Any]]:
+        params: dict[str, Any] = {}
+        query = ""
+        if self.ctes:
+            ctes = []
+            for name, cte in self.ctes.items():
+                cte_query, cte_params = cte.build()
+                ctes.append(f"{name} AS ({cte_query})")
+                params |= cte_params
+            query += f"WITH {', '.join(ctes)} "
+        query += f"SELECT {', '.join(self.columns) or '*'} FROM {self.source}"  # noqa: S608
+        if self.joins:
+            query += f" {' '.join(self.joins)}"
+        if self.conditions:
+            query += f" WHERE {' AND '.join(self.conditions)}"
+        if self.groups:
+            query += f" GROUP BY {', '.join(self.groups)}"
+        if self.havings:
+            query += f" HAVING {' AND '.join(self.havings)}"
+        if self.windows:
+            query += f" WINDOW {', '.join(f'{name} AS ({window})' for name, window in self.windows.items())}"
+        for union in self.unions:
+            union_query, union_params = union.build()
+            query += f" UNION ALL {union_query}"
+            params |= union_params
+        if self.orders:
+            query += f" ORDER BY {', '.join(self.orders)}"
+        return query, params | self.params
+
+    def __iter__(self) -> Iterator[sqlite3.Row]:
+        return self.sql.stream(*self.build(), row_factory=sqlite3.Row)
+
+    def one(self) -> sqlite3.Row | None:
+        return next(iter(self), None)
+
 
-@dataclass(init=False)
 class Table:
     """
     Base Table Class
 
     This class depends on an SqlConnection as
+
+    Tables are dataclasses whose fields are the table columns, in order. Declare them with
+    `slots=True`: queries may build tens of thousands of rows.
     """
 
-    _sql: SqlConnection = field(init=False, hash=False, repr=False)
-    _bound: bool = field(init=False, hash=False, repr=False)
-    _columns: set[str] = field(init=False, hash=False, repr=False)
+    __slots__ = ()
 
-    def __post_init__(self):
-        self._columns = set(self.__annotations__.keys())
+    _sql: ClassVar[SqlConnection]
+    _bound: ClassVar[bool]
+    _columns: ClassVar[tuple[str, ...]] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Subclasses without annotations of their own are the same table under another name
+        cls._columns = tuple(inspect.get_annotations(cls)) or cls._columns
 
     def to_dict(self) -> dict[str, Any]:
         return {column: getattr(self, column, None) for column in self._columns}
@@ -90,8 +371,17 @@ class Table:
             delattr(cls, "_bound")
 
     @classmethod
-    def build_class(cls, row: tuple) -> Self:
-        return cls(**dict(zip(cls.__annotations__.keys(), row, strict=True)))
+    def row_factory(cls, _cursor: sqlite3.Cursor, row: tuple) -> Self:
+        return cls(*row)
+
+    @classmethod
+    def select(cls, where: str = "", params: Any = (), *, limit: int | None = None) -> Iterator[Self]:
+        query = f"SELECT {', '.join(cls._columns)} FROM {cls.__name__}"  # noqa: S608
+        if where:
+            query += f" WHERE {where}"
+        if limit is not None:
+            query += f" LIMIT {limit:d}"
+        return cls._sql.stream(query, params, cls.row_factory)
 
     @staticmethod
     def check_connection(fn):
@@ -122,23 +412,21 @@ class Table:
     #######################################################
     # SQL operations
     #######################################################
+    @classmethod
+    @check_connection
+    def query(cls, alias: str = "") -> Query:
+        """Query builder over this table. See `Query`"""
+        return cls._sql.query(f"{cls.__name__} {alias}".rstrip())
+
     @classmethod
     @check_connection
     def fetch_all(cls) -> Iterator[Self]:
-        query = f"SELECT * FROM {cls.__name__}"  # noqa: S608
-        cls._sql.cur.execute(query)
-        for row in cls._sql.cur.fetchall():
-            yield cls.build_class(row)
+        return cls.select()
 
     @classmethod
     @check_connection
     def fetch_one(cls) -> Self | None:
-        query = f"SELECT * FROM {cls.__name__} LIMIT 1"  # noqa: S608
-        cls._sql.cur.execute(query)
-        row = cls._sql.cur.fetchone()
-        if row is None:
-            return None
-        return cls.build_class(row)
+        return next(cls.select(limit=1), None)
 
     @classmethod
     @check_connection
@@ -153,24 +441,13 @@ class Table:
     @check_connection
     def find(cls, match: dict) -> Iterator[Self]:
         cls.non_empty_dictionary(match)
-        where_params = cls.query_named_placeholders(match, sep=" AND ")
-        query = f"SELECT * FROM {cls.__name__} WHERE {where_params}"  # noqa: S608
-        cls._sql.cur.execute(query, match)
-        for row in cls._sql.cur.fetchall():
-            yield cls.build_class(row)
+        return cls.select(cls.query_named_placeholders(match, sep=" AND "), match)
 
     @classmethod
     @check_connection
     def find_one(cls, match: dict) -> Self | None:
         cls.non_empty_dictionary(match)
-        where_params = cls.query_named_placeholders(match, sep=" AND ")
-        query = f"SELECT * FROM {cls.__name__} WHERE {where_params} LIMIT 1"  # noqa: S608
-        cls._sql.cur.execute(query, match)
-        match cls._sql.cur.fetchone():
-            case None:
-                return None
-            case row:
-                return cls.build_class(row)
+        return next(cls.select(cls.query_named_placeholders(match, sep=" AND "), match, limit=1), None)
 
     @classmethod
     @check_connection
@@ -194,10 +471,26 @@ class Table:
             if not replace
             else f"INSERT OR REPLACE INTO {self.__class__.__name__} ({ins_cols}) VALUES ({ins_plac})"  # noqa: S608
         )
-        self._sql.cur.execute(query, d)
-        self._sql.con.commit()
+        self._sql.write(query, d)
         return self
 
+    @classmethod
+    @check_connection
+    def insert_many(cls, rows: Iterable[Self], *, replace=False) -> list[Self]:
+        """Inserts all `rows` with a single statement and commit"""
+        rows = list(rows)
+        if len(rows) == 0:
+            return rows
+        ins_cols, ins_plac = cls.query_insert_placeholders(rows[0].to_dict())
+        verb = "INSERT OR REPLACE" if replace else "INSERT"
+        query = f"{verb} INTO {cls.__name__} ({ins_cols}) VALUES ({ins_plac})"
+        cls._sql.write(query, [row.to_dict() for row in rows], many=True)
+        return rows
+
+    @classmethod
+    def upsert_many(cls, rows: Iterable[Self]) -> list[Self]:
+        return cls.insert_many(rows, replace=True)
+
     @check_connection
     def update(self, key: dict, where: list[str] | None = None):
         for k, v in key.items():
@@ -220,28 +513,26 @@ class Table:
         set_params = self.query_named_placeholders(key, sep=", ")
 
         query = f"UPDATE {self.__class__.__name__} SET {set_params} WHERE {where_params}"  # noqa: S608
-        self._sql.cur.execute(query, d)
-        self._sql.con.commit()
+        self._sql.write(query, d)
 
     @check_connection
     def delete(self):
         d = self.to_dict()
         where_params = self.query_named_placeholders(d, sep=" AND ")
         query = f"DELETE FROM {self.__class__.__name__} WHERE {where_params}"  # noqa: S608
-        self._sql.cur.execute(query, d)
-        self._sql.con.commit()
+        self._sql.write(query, d)
 
 
 ###########################################################
 # Main DB Interface
 ###########################################################
-@dataclass(unsafe_hash=True)
+@dataclass(unsafe_hash=True, slots=True)
 class ECABrigadista(Table):
     brigadista_id: str
     creation_date: datetime
 
 
-@dataclass(unsafe_hash=True)
+@dataclass(unsafe_hash=True, slots=True)
 class ECAPuzzle(Table):
     year: int
     day: int
@@ -267,13 +558,13 @@ class ECAPuzzle(Table):
             (part == ESBConfig.part_2) and self.solved_pt2 is not None
         ):
             return
-        where = ["year", "day"]
-        self.update({f"solved_pt{part}": now, f"answer_pt{part}": str(answer)}, where)
+        values = {f"solved_pt{part}": now, f"answer_pt{part}": str(answer)}
         if self.day == ESBConfig.last_day:  # Day 25 has only one star
-            self.update({"solved_pt2": now}, where)
+            values["solved_pt2"] = now
+        self.update(values, ["year", "day"])
 
 
-@dataclass(unsafe_hash=True)
+@dataclass(unsafe_hash=True, slots=True)
 class ECALanguage(Table):
     year: int
     day: int
@@ -287,13 +578,13 @@ class ECALanguage(Table):
         ):
             return
 
-        where = ["year", "day", "language"]
-        self.update({f"solved_pt{part}": now}, where)
+        values = {f"solved_pt{part}": now}
         if self.day == ESBConfig.last_day:  # Day 25 has only one star
-            self.update({"solved_pt2": now}, where)
+            values["solved_pt2"] = now
+        self.update(values, ["year", "day", "language"])
 
 
-@dataclass(unsafe_hash=True)
+@dataclass(unsafe_hash=True, slots=True)
 class ECAArgCache(Table):
     id: int
     year: int | None
@@ -302,22 +593,204 @@ class ECAArgCache(Table):
     language: str | None
 
 
-@dataclass(unsafe_hash=True)
+@dataclass(unsafe_hash=True, slots=True)
+class ECALanguageName(Table):
+    """Lookup table for language names, so runs store a small integer instead of the name"""
+
+    id: int | None
+    name: str
+
+    @classmethod
+    @Table.check_connection
+    def id_of(cls, name: str) -> int:
+        """Id of language `name`. Registers the language when it is new"""
+        cls._sql.write(f"INSERT OR IGNORE INTO {cls.__name__} (name) VALUES (?)", (name,))  # noqa: S608
+        (language_id,) = cls._sql.cur.execute(f"SELECT id FROM {cls.__name__} WHERE name = ?", (name,)).fetchone()  # noqa: S608
+        return language_id
+
+    @classmethod
+    def names(cls) -> dict[int, str]:
+        return {language.id: language.name for language in cls.fetch_all() if language.id is not None}
+
+
+@dataclass(unsafe_hash=True, slots=True)
 class ECARun(Table):
+    """
+    A single solution run. `timestamp` is seconds since the epoch and `time_ns` the running time
+    in nanoseconds, so timings can be aggregated directly in SQL.
+    """
+
     id: int | None
-    datetime: datetime
+    timestamp: int
     year: int
     day: int
-    language: str
+    language_id: int
     part: FPPart
     answer: str | None = None
-    time: int | None = None
-    unit: MetricPrefix | None = None
+    time_ns: int | None = None
 
-    def __post_init__(self):
-        super().__post_init__()
-        if isinstance(self.unit, int):
-            self.unit = MetricPrefix(self.unit)
+
+@dataclass(unsafe_hash=True, slots=True)
+class ECAStats(Table):
+    """
+    Running time statistics of the runs with the same answer, in nanoseconds. Updated along with
+    each ECARun, so dashboards read one row per answer instead of every run. `mean` and `m2` are
+    kept with Welford's algorithm and `sketch` is a serialized `LogSketch` for quantiles.
+    Statistics of correct runs are the rows whose answer matches the puzzle's.
+    """
+
+    year: int
+    day: int
+    part: FPPart
+    language_id: int
+    answer: str
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    min_ns: int | None = None
+    max_ns: int | None = None
+    sketch: bytes = b""
+
+    @property
+    def stdev(self) -> float | None:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else None
+
+    def add(self, times_ns: Iterable[int]) -> Self:
+        times_ns = list(times_ns)
+        if not times_ns:
+            return self
+        self.merge_moments(*stats_backend(len(times_ns)).moments(times_ns))
+        sketch = LogSketch.from_bytes(self.sketch) if self.sketch else LogSketch()
+        self.sketch = sketch.add_many(times_ns).to_bytes()
+        return self
+
+    def merge(self, other: ECAStats) -> Self:
+        """Adds the statistics of `other`, a disjoint set of runs with the same answer"""
+        if other.count == 0:
+            return self
+        self.merge_moments(other.count, other.mean, other.m2, other.min_ns, other.max_ns)  # type: ignore[arg-type]
+        sketch = LogSketch.from_bytes(self.sketch) if self.sketch else LogSketch()
+        self.sketch = sketch.merge(LogSketch.from_bytes(other.sketch)).to_bytes()
+        return self
+
+    def merge_moments(self, count: int, mean: float, m2: float, min_ns: int, max_ns: int):
+        # Chan et al. parallel variance
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+        self.min_ns = min_ns if self.min_ns is None else min(self.min_ns, min_ns)
+        self.max_ns = max_ns if self.max_ns is None else max(self.max_ns, max_ns)
+
+    @classmethod
+    def record(cls, run: ECARun):
+        """Adds `run` to its statistics. Call in the same transaction that inserts the run"""
+        if run.answer is None or run.time_ns is None:
+            return
+        key = {"year": run.year, "day": run.day, "part": run.part, "language_id": run.language_id, "answer": run.answer}
+        stats = cls.find_one(key) or cls(
+            year=run.year, day=run.day, part=run.part, language_id=run.language_id, answer=run.answer
+        )
+        stats.add([run.time_ns]).insert(replace=True)
+
+
+@dataclass(unsafe_hash=True, slots=True)
+class ECARunRollup(ECAStats):
+    """
+    Statistics of the runs removed by the retention policy. Same columns as ECAStats, which
+    always accounts for them: ECAStats is the rollup plus the runs still in ECARun
+    """
+
+
+def rebuild_stats(cur: sqlite3.Cursor):
+    """Recomputes ECAStats from the runs rolled up and the raw runs"""
+    columns = ", ".join(ECAStats._columns)  # noqa: SLF001
+    rollups = {tuple(row[:5]): ECAStats(*row) for row in cur.execute(f"SELECT {columns} FROM ECARunRollup")}  # noqa: S608
+    runs = cur.connection.execute(
+        "SELECT year, day, part, language_id, answer, time_ns FROM ECARun "
+        "WHERE answer IS NOT NULL AND time_ns IS NOT NULL ORDER BY year, day, part, language_id, answer, id"
+    )
+
+    def merged() -> Iterator[ECAStats]:
+        for key, group in groupby(runs, key=itemgetter(slice(5))):
+            yield (rollups.pop(key, None) or ECAStats(*key)).add(time_ns for *_, time_ns in group)
+        yield from rollups.values()
+
+    cur.execute("DELETE FROM ECAStats")
+    cur.executemany(
+        f"INSERT INTO ECAStats VALUES ({', '.join('?' * len(ECAStats._columns))})",  # noqa: S608, SLF001
+        (tuple(stats.to_dict().values()) for stats in merged()),
+    )
+
+
+@dataclass(unsafe_hash=True, slots=True)
+class ECADashDirty(Table):
+    """Years whose dashboard sections changed since the last build. Filled by triggers"""
+
+    year: int
+
+
+@dataclass(unsafe_hash=True, slots=True)
+class ECADashSection(Table):
+    """Rendered dashboard sections by document and year. Reused while the year is not dirty"""
+
+    document: str
+    year: int
+    content: str
+
+
+@dataclass(unsafe_hash=True, slots=True)
+class ECAChangeCounter(Table):
+    """Number of changes to each table, counted by triggers. Cache keys of rendered output"""
+
+    table_name: str
+    changes: int
+
+
+@dataclass(unsafe_hash=True, slots=True)
+class ECARenderCache(Table):
+    """Rendered output by key, a hash of what it was rendered from. See `BaseDash.cached`"""
+
+    key: str
+    content: str
+
+
+@dataclass(unsafe_hash=True, slots=True)
+class ECASubmission(Table):
+    id: int | None
+    datetime: datetime
+    year: int
+    day: int
+    part: FPPart
+    answer: str
+    status: str
+    hint: str | None = None
+    wait: int | None = None
+
+
+def compact_runs(cur: sqlite3.Cursor):
+    """Copies runs from the legacy ECARun layout into ECARun_compact"""
+    legacy = cur.connection.execute(
+        "SELECT r.id, r.datetime, r.year, r.day, l.id, r.part, r.answer, r.time, r.unit "
+        "FROM ECARun r JOIN ECALanguageName l ON l.name = r.language"
+    )
+    cur.executemany(
+        "INSERT INTO ECARun_compact VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (
+                run_id,
+                int(datetime.fromisoformat(when).timestamp()),
+                year,
+                day,
+                language_id,
+                part,
+                answer,
+                None if time is None or unit is None else MetricPrefix(unit).to_nanos(time),
+            )
+            for run_id, when, year, day, language_id, part, answer, time, unit in legacy
+        ),
+    )
 
 
 class ElvenCrisisArchive:
@@ -348,17 +821,60 @@ class ElvenCrisisArchive:
                                 solved_pt2 TIMESTAMP,
                                 PRIMARY KEY (year, day, language)
                             )""",
+        ECALanguageName: """CREATE TABLE {table_name} (
+                                id INTEGER PRIMARY KEY NOT NULL,
+                                name TEXT NOT NULL UNIQUE
+                            )""",
         ECARun: """CREATE TABLE {table_name} (
                                 id INTEGER PRIMARY KEY NOT NULL,
-                                datetime TIMESTAMP NOT NULL,
+                                timestamp INTEGER NOT NULL,
                                 year INTEGER NOT NULL,
                                 day INTEGER NOT NULL,
-                                language TEXT NOT NULL,
+                                language_id INTEGER NOT NULL REFERENCES ECALanguageName (id),
                                 part INTEGER NOT NULL,
                                 answer TEXT,
-                                time INTEGER,
-                                unit INTEGER
+                                time_ns INTEGER
+                            )""",
+        ECAStats: """CREATE TABLE {table_name} (
+                                year INTEGER NOT NULL,
+                                day INTEGER NOT NULL,
+                                part INTEGER NOT NULL,
+                                language_id INTEGER NOT NULL REFERENCES ECALanguageName (id),
+                                answer TEXT NOT NULL,
+                                count INTEGER NOT NULL,
+                                mean REAL NOT NULL,
+                                m2 REAL NOT NULL,
+                                min_ns INTEGER,
+                                max_ns INTEGER,
+                                sketch BLOB NOT NULL,
+                                PRIMARY KEY (year, day, part, language_id, answer)
+                            )""",
+        ECARunRollup: """CREATE TABLE {table_name} (
+                                year INTEGER NOT NULL,
+                                day INTEGER NOT NULL,
+                                part INTEGER NOT NULL,
+                                language_id INTEGER NOT NULL REFERENCES ECALanguageName (id),
+                                answer TEXT NOT NULL,
+                                count INTEGER NOT NULL,
+                                mean REAL NOT NULL,
+                                m2 REAL NOT NULL,
+                                min_ns INTEGER,
+                                max_ns INTEGER,
+                                sketch BLOB NOT NULL,
+                                PRIMARY KEY (year, day, part, language_id, answer)
+                            )""",
+        ECADashDirty: """CREATE TABLE {table_name} (year INTEGER PRIMARY KEY NOT NULL)""",
+        ECADashSection: """CREATE TABLE {table_name} (
+                                document TEXT NOT NULL,
+                                year INTEGER NOT NULL,
+                                content TEXT NOT NULL,
+                                PRIMARY KEY (document, year)
+                            )""",
+        ECAChangeCounter: """CREATE TABLE {table_name} (
+                                table_name TEXT PRIMARY KEY NOT NULL,
+                                changes INTEGER NOT NULL
                             )""",
+        ECARenderCache: """CREATE TABLE {table_name} (key TEXT PRIMARY KEY NOT NULL, content TEXT NOT NULL)""",
         ECAArgCache: """CREATE TABLE {table_name} (
                                 id INTEGER NOT NULL,
                                 year INTEGER,
@@ -367,27 +883,224 @@ class ElvenCrisisArchive:
                                 language TEXT,
                                 PRIMARY KEY (id)
                             )""",
+        ECASubmission: """CREATE TABLE {table_name} (
+                                id INTEGER PRIMARY KEY NOT NULL,
+                                datetime TIMESTAMP NOT NULL,
+                                year INTEGER NOT NULL,
+                                day INTEGER NOT NULL,
+                                part INTEGER NOT NULL,
+                                answer TEXT NOT NULL,
+                                status TEXT NOT NULL,
+                                hint TEXT,
+                                wait INTEGER
+                            )""",
     }
     ECABrigadista = ECABrigadista
     ECAPuzzle = ECAPuzzle
     ECALanguage = ECALanguage
+    ECALanguageName = ECALanguageName
     ECARun = ECARun
+    ECAStats = ECAStats
+    ECARunRollup = ECARunRollup
+    ECADashDirty = ECADashDirty
+    ECADashSection = ECADashSection
+    ECAChangeCounter = ECAChangeCounter
+    ECARenderCache = ECARenderCache
     ECAArgCache = ECAArgCache
+    ECASubmission = ECASubmission
+    connections: ClassVar[dict[Path, SqlConnection]] = {}
+
+    # Indexes of the current schema
+    indexes: ClassVar[tuple[str, ...]] = (
+        "CREATE INDEX IF NOT EXISTS ECARun_year_day_language_part ON ECARun (year, day, language_id, part)",
+        "CREATE INDEX IF NOT EXISTS ECALanguage_language_year_day ON ECALanguage (language, year, day)",
+    )
+
+    # Any change to the tables the dashboards read marks the year dirty, whichever process made it
+    dirty_triggers: ClassVar[tuple[str, ...]] = tuple(
+        f"CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_dirty AFTER {event} ON {table} "  # noqa: S608
+        f"BEGIN INSERT OR IGNORE INTO ECADashDirty (year) VALUES ({row}.year); END"
+        for table in ("ECAPuzzle", "ECALanguage", "ECAStats")
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+    )
+
+    # ...and counts as a change of the table
+    change_triggers: ClassVar[tuple[str, ...]] = tuple(
+        f"CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_count AFTER {event} ON {table} "  # noqa: S608
+        f"BEGIN INSERT INTO ECAChangeCounter VALUES ('{table}', 1) "
+        "ON CONFLICT (table_name) DO UPDATE SET changes = changes + 1; END"
+        for table in ("ECAPuzzle", "ECALanguage", "ECAStats", "ECAArgCache")
+        for event in ("INSERT", "UPDATE", "DELETE")
+    )
+
+    # Schema changes for existing repos. The schema version is stored in `PRAGMA user_version` and
+    # is the number of migrations applied. New repos are created with the current schema and skip
+    # them. Never edit a released migration, append a new one.
+    migrations: ClassVar[list[Migration]] = [
+        (  # 1: Indexes for lookups by puzzle and language
+            "CREATE INDEX IF NOT EXISTS ECARun_year_day_language_part ON ECARun (year, day, language, part)",
+            "CREATE INDEX IF NOT EXISTS ECALanguage_language_year_day ON ECALanguage (language, year, day)",
+        ),
+        (  # 2: Compact runs. Integer nanoseconds, epoch timestamps and language ids
+            "CREATE TABLE IF NOT EXISTS ECALanguageName (id INTEGER PRIMARY KEY NOT NULL, name TEXT NOT NULL UNIQUE)",
+            "INSERT OR IGNORE INTO ECALanguageName (name) SELECT DISTINCT language FROM ECARun ORDER BY language",
+            """CREATE TABLE ECARun_compact (
+                    id INTEGER PRIMARY KEY NOT NULL,
+                    timestamp INTEGER NOT NULL,
+                    year INTEGER NOT NULL,
+                    day INTEGER NOT NULL,
+                    language_id INTEGER NOT NULL REFERENCES ECALanguageName (id),
+                    part INTEGER NOT NULL,
+                    answer TEXT,
+                    time_ns INTEGER
+                )""",
+            compact_runs,
+            "DROP TABLE ECARun",
+            "ALTER TABLE ECARun_compact RENAME TO ECARun",
+            "CREATE INDEX ECARun_year_day_language_part ON ECARun (year, day, language_id, part)",
+        ),
+        (  # 3: Running time statistics. ECAStats is created with the missing tables
+            rebuild_stats,
+        ),
+        (  # 4: Dashboard dirty tracking. Every year is dirty once
+            *dirty_triggers,
+            "INSERT OR IGNORE INTO ECADashDirty (year) SELECT DISTINCT year FROM ECAPuzzle",
+        ),
+        (  # 5: Change counters for the render cache. ECARenderCache is created with the missing tables
+            *change_triggers,
+        ),
+    ]
 
     def __init__(self, repo_root: Path):
-        sqlite3.register_adapter(MetricPrefix, lambda mp: mp.value)
         self.repo_root = repo_root
         self.db_path = repo_root / ESBConfig.db_path
         if not self.db_path.parent.is_dir():
             self.db_path.parent.mkdir(parents=True, exist_ok=True)
             self.db_path.touch()
-        self.sql = SqlConnection(self.db_path)
+        self.sql = self.connect(self.db_path)
         for table in self.tables:
             table.bind_connection(self.sql)
+        if len(self.sql.list_all_tables()) > 0:
+            # Repos created by older versions may lack newer tables
+            self.create_tables()
+            self.migrate()
+
+    @classmethod
+    def connect(cls, db_path: Path) -> SqlConnection:
+        """
+        One connection per database per process. Tables are bound to a single connection, so
+        every archive opened by the same process must share it for transactions to work.
+        """
+        key = db_path.resolve()
+        sql = cls.connections.get(key)
+        if sql is None or not hasattr(sql, "db_path"):
+            sql = cls.connections[key] = SqlConnection(db_path)
+        return sql
 
     def create_tables(self):
+        existing = set(self.sql.list_all_tables())
         for table, create_table_query in self.tables.items():
-            self.sql.cur.execute(create_table_query.format(table_name=table.__name__))
+            if table.__name__ not in existing:
+                self.sql.cur.execute(create_table_query.format(table_name=table.__name__))
+
+    @property
+    def schema_version(self) -> int:
+        return self.sql.schema_version()
+
+    def migrate(self):
+        """Applies pending migrations in order, each one in its own transaction"""
+        for version, statements in enumerate(self.migrations, start=1):
+            if self.schema_version >= version:
+                continue
+
+            def apply(version: int = version, statements: Migration = statements):
+                # Another process may have migrated while we waited for the lock
+                if self.schema_version >= version:
+                    return
+                for statement in statements:
+                    if callable(statement):
+                        statement(self.sql.cur)
+                    else:
+                        self.sql.cur.execute(statement)
+                self.sql.cur.execute(f"PRAGMA user_version = {version}")
+
+            self.sql.atomic(apply)
+
+    def rebuild_stats(self):
+        self.sql.atomic(lambda: rebuild_stats(self.sql.cur))
+
+    def claim_dirty_years(self) -> set[int]:
+        """Years changed since the last claim. Changes made meanwhile are left for the next one"""
+
+        def claim() -> set[int]:
+            years = {row.year for row in self.ECADashDirty.fetch_all()}
+            self.sql.cur.execute("DELETE FROM ECADashDirty")
+            return years
+
+        return self.sql.atomic(claim)
+
+    def mark_dirty(self, years: Iterable[int]):
+        self.ECADashDirty.upsert_many(self.ECADashDirty(year) for year in years)
+
+    def changes(self, *tables: str) -> tuple[int, ...]:
+        """Change counters of `tables`. Zero for tables never changed since they are counted"""
+        counters = dict(self.ECAChangeCounter.query().select("table_name", "changes"))
+        return tuple(counters.get(table, 0) for table in tables)
+
+    def prune_runs(
+        self,
+        keep_days: int = ESBConfig.run_retention_days,
+        keep_runs: int = ESBConfig.run_retention_runs,
+        **key: int,
+    ) -> int:
+        """
+        Retention policy. Runs older than `keep_days` are rolled up into ECARunRollup and deleted,
+        except for the last `keep_runs` of each puzzle part and language. `key` restricts pruning
+        to some columns' values, e.g. the puzzle part just run. Returns the number of runs deleted
+        """
+        where = " AND ".join(f"{column} = :{column}" for column in key) or "1"
+        cutoff = int(time.time()) - keep_days * 86_400
+
+        def prune() -> int:
+            stale = self.sql.cur.execute(
+                "SELECT id, year, day, part, language_id, answer, time_ns FROM ("  # noqa: S608
+                "SELECT *, ROW_NUMBER() OVER ("
+                "PARTITION BY year, day, language_id, part ORDER BY timestamp DESC, id DESC"
+                f") AS recent FROM ECARun WHERE {where}"
+                ") WHERE recent > :keep_runs AND timestamp < :cutoff ORDER BY year, day, part, language_id, answer, id",
+                {**key, "keep_runs": keep_runs, "cutoff": cutoff},
+            ).fetchall()
+            for (year, day, part, language_id, answer), group in groupby(stale, key=itemgetter(slice(1, 6))):
+                times_ns = [time_ns for *_, time_ns in group if time_ns is not None]
+                if answer is None or not times_ns:
+                    continue
+                rollup_key = {"year": year, "day": day, "part": part, "language_id": language_id, "answer": answer}
+                rollup = self.ECARunRollup.find_one(rollup_key) or self.ECARunRollup(**rollup_key)
+                rollup.add(times_ns).insert(replace=True)
+            self.sql.write("DELETE FROM ECARun WHERE id = ?", [(run_id,) for run_id, *_ in stale], many=True)
+            return len(stale)
+
+        return self.sql.atomic(prune)
+
+    def attach(self, repo_root: Path) -> str:
+        """
+        Attaches the archive of another repo, read only by convention, and returns its schema name.
+        It must be at the current schema version: running any `esb` command there migrates it
+        """
+        db_path = repo_root / ESBConfig.db_path
+        if not db_path.is_file():
+            message = f"No archive found in {repo_root}"
+            raise FileNotFoundError(message)
+        schema = f"repo_{len(self.sql.cur.execute('PRAGMA database_list').fetchall())}"
+        self.sql.attach(db_path, schema)
+        if (version := self.sql.schema_version(schema)) != len(self.migrations):
+            self.sql.cur.execute("DETACH DATABASE ?", (schema,))
+            message = (
+                f"Archive in {repo_root} is at schema version {version}, expected {len(self.migrations)}. "
+                "Run any esb command in that repo to migrate it"
+            )
+            raise ValueError(message)
+        return schema
 
     def new_brigadista(self):
         self.ECABrigadista(brigadista_id=str(uuid.uuid4()), creation_date=datetime.now().astimezone()).insert()
@@ -395,7 +1108,18 @@ class ElvenCrisisArchive:
     def new_arg_cache(self):
         self.ECAArgCache(id=1, year=None, day=None, part=None, language=None).insert()
 
+    def create_schema(self):
+        """Current schema for a new repo. Already up to date, so no migration is pending"""
+
+        def create():
+            self.create_tables()
+            for statement in (*self.indexes, *self.dirty_triggers, *self.change_triggers):
+                self.sql.cur.execute(statement)
+            self.sql.cur.execute(f"PRAGMA user_version = {len(self.migrations)}")
+
+        self.sql.atomic(create)
+
     def new_repo(self):
-        self.create_tables()
+        self.create_schema()
         self.new_brigadista()
         self.new_arg_cache()
@@ -11,26 +11,32 @@ Script your way to rescue Christmas as part of the ElfScript Brigade team.
 
 from __future__ import annotations
 
+import hashlib
 import http.client
+import json
 import re
+import shutil
+import time
+from dataclasses import dataclass
 from enum import Enum, auto
+from html.parser import HTMLParser
 from os import environ
 from textwrap import wrap
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, ClassVar, TypeVar
 from urllib.parse import urlencode
 
-from bs4 import BeautifulSoup  # type: ignore
-
 from esb import __version__
 from esb.lib.paths import pad_day
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
     from pathlib import Path
 
-    from bs4 import Tag
-
+    from esb.lib.lock import TokenBucket
     from esb.protocol.fireplace import FPPart
 
+T = TypeVar("T")
+
 
 class RudolphSubmitStatus(Enum):
     SUCCESS = auto()
@@ -40,9 +46,208 @@ class RudolphSubmitStatus(Enum):
     ERROR = auto()
 
 
+class RudolphHint(Enum):
+    HIGH = "high"
+    LOW = "low"
+
+
+class RudolphPage(HTMLParser):
+    """
+    Extracts everything we need from an AoC page in a single streaming pass: the text of the
+    `<article>` elements, the "Your puzzle answer was" values and the messages of the `<p>`
+    elements directly inside an article, which are used to find the submit status.
+    """
+
+    void_elements = frozenset({
+        "area",
+        "base",
+        "br",
+        "col",
+        "embed",
+        "hr",
+        "img",
+        "input",
+        "link",
+        "meta",
+        "source",
+        "track",
+        "wbr",
+    })
+    answer_marker = "Your puzzle answer was"
+    submit_messages: ClassVar[dict[RudolphSubmitStatus, str]] = {
+        RudolphSubmitStatus.SUCCESS: "That's the right answer!",
+        RudolphSubmitStatus.FAIL: "That's not the right answer",
+        RudolphSubmitStatus.TIMEOUT: "You gave an answer too recently",
+        RudolphSubmitStatus.ALREADY_COMPLETE: "Did you already complete it?",
+    }
+    wait_units: ClassVar[dict[str, int]] = {"h": 3600, "m": 60, "s": 1}
+    wait_words: ClassVar[dict[str, int]] = {
+        word: number
+        for number, word in enumerate(
+            ["one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten"], start=1
+        )
+    }
+
+    articles: list[list[str]]
+    answers: list[str]
+    messages: list[str]
+
+    def __init__(self, body: str):
+        super().__init__(convert_charrefs=True)
+        self.stack: list[str] = []
+        self.articles = []
+        self.answers = []
+        self.messages = []
+        # Depth of the element being captured, if any
+        self.article_depth: int | None = None
+        self.message_depth: int | None = None
+        self.answer_depth: int | None = None
+        self.message: list[str] = []
+        self.answer: list[str] = []
+        self.answer_next = False
+        self.feed(body)
+        self.close()
+
+    def handle_starttag(self, tag: str, _attrs: list[tuple[str, str | None]]):
+        depth = len(self.stack)
+        if self.answer_next:
+            self.answer_next = False
+            self.answer_depth, self.answer = depth, []
+        if self.article_depth is None and tag == "article":
+            self.article_depth = depth
+            self.articles.append([])
+        elif self.article_depth is not None and tag in {"p", "pre"}:
+            self.articles[-1].append("\n\n")
+        if tag == "p" and self.article_depth == depth - 1 and self.message_depth is None:
+            self.message_depth, self.message = depth, []
+        if tag not in self.void_elements:
+            self.stack.append(tag)
+
+    def handle_endtag(self, tag: str):
+        if tag not in self.stack:
+            return
+        while self.stack.pop() != tag:
+            pass
+        depth = len(self.stack)
+        if self.answer_depth is not None and depth <= self.answer_depth:
+            self.answers.append("".join(self.answer))
+            self.answer_depth = None
+        if self.message_depth is not None and depth <= self.message_depth:
+            self.messages.append("".join(self.message))
+            self.message_depth = None
+        if self.article_depth is not None and depth <= self.article_depth:
+            self.article_depth = None
+
+    def handle_data(self, data: str):
+        if self.article_depth is not None:
+            self.articles[-1].append(data)
+        if self.message_depth is not None:
+            self.message.append(data)
+        if self.answer_depth is not None:
+            self.answer.append(data)
+        if self.answer_marker in data:
+            self.answer_next = True
+
+    @property
+    def statement(self) -> str:
+        statement = "".join(f"\n{''.join(article)}" for article in self.articles)
+        statement = re.sub(r"\n{3,}", "\n\n", statement)
+        return "\n".join("\n".join(wrap(line, width=100)) for line in statement.strip().split("\n"))
+
+    @property
+    def answer_pair(self) -> tuple[str | None, str | None]:
+        match self.answers:
+            case [pt1, pt2, *_]:
+                return pt1, pt2
+            case [pt1]:
+                return pt1, None
+            case _:
+                return None, None
+
+    @property
+    def submit_status(self) -> RudolphSubmitStatus:
+        for status, substr in self.submit_messages.items():
+            if any(substr in message for message in self.messages):
+                return status
+        return RudolphSubmitStatus.ERROR
+
+    @property
+    def hint(self) -> RudolphHint | None:
+        for message in self.messages:
+            for hint in RudolphHint:
+                if f"your answer is too {hint.value}" in message:
+                    return hint
+        return None
+
+    @property
+    def wait(self) -> int | None:
+        """Seconds to wait before submitting again, eg: "You have 1m 5s left to wait" or "Please wait one minute"."""
+        for message in self.messages:
+            if (match := re.search(r"You have ((?:\d+[hms]\s*)+) left to wait", message)) is not None:
+                return sum(int(n) * self.wait_units[unit] for n, unit in re.findall(r"(\d+)([hms])", match.group(1)))
+            if (match := re.search(r"[Pp]lease wait (\w+) minutes? before", message)) is not None:
+                count = match.group(1)
+                minutes = int(count) if count.isdigit() else self.wait_words.get(count)
+                if minutes is not None:
+                    return minutes * 60
+        return None
+
+
+class RudolphTransientError(ValueError):
+    """The server is temporarily unavailable. Trying again later might work"""
+
+
+@dataclass
+class RudolphCache:
+    """
+    On disk HTTP cache. Stores response bodies with their `ETag` and `Last-Modified` validators
+    so the next request can be conditional and an unchanged page costs a `304 Not Modified`.
+    Pages depend on the logged user, so entries are keyed by session as well.
+    """
+
+    cache_dir: Path
+
+    def entry(self, cookie: str, host: str, route: str) -> Path:
+        key = hashlib.sha256(f"{cookie}\n{host}{route}".encode()).hexdigest()
+        return self.cache_dir / f"{key}.json"
+
+    def load(self, cookie: str, host: str, route: str) -> dict | None:
+        try:
+            with self.entry(cookie, host, route).open() as fp:
+                return json.load(fp)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def validators(cached: dict | None) -> dict[str, str]:
+        if cached is None:
+            return {}
+        headers = {}
+        if cached.get("etag") is not None:
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified") is not None:
+            headers["If-Modified-Since"] = cached["last_modified"]
+        return headers
+
+    def store(self, cookie: str, host: str, route: str, res: http.client.HTTPResponse, body: str):
+        etag, last_modified = res.getheader("ETag"), res.getheader("Last-Modified")
+        if etag is None and last_modified is None:
+            return
+        entry = self.entry(cookie, host, route)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp = entry.with_name(f".{entry.name}.part")
+        tmp.write_text(json.dumps({"etag": etag, "last_modified": last_modified, "body": body}))
+        tmp.replace(entry)
+
+
 class RudolphFetcher:
     repo_root: Path
     cookie: str
+    connections: dict[str, http.client.HTTPSConnection]
+    limiter: TokenBucket | None
+    cache: RudolphCache | None
+    retries: int
+    backoff: float
     sess_env = "AOC_SESSION_COOKIE"
     host = "adventofcode.com"
     st_route = "/{year}/day/{day}"
@@ -50,11 +255,36 @@ class RudolphFetcher:
     ans_route = "{st_route}/answer"  # noqa: RUF027
     test_host = "raw.githubusercontent.com"
     test_route = "/luxedo/esb/main/aoc_tests/{year}/{day}/tests_{year}_{day}.toml"
+    test_archive_host = "codeload.github.com"
+    test_archive_route = "/luxedo/esb/zip/refs/heads/main"
     http_ok = 200
+    http_not_modified = 304
+    http_too_many_requests = 429
+    http_server_error = 500
+    timeout = 30
+    chunk_size = 64 * 1024
 
-    def __init__(self, repo_root: Path):
+    def __init__(
+        self,
+        repo_root: Path,
+        limiter: TokenBucket | None = None,
+        retries: int = 0,
+        backoff: float = 1,
+        cache: RudolphCache | None = None,
+    ):
         self.repo_root = repo_root
         self.cookie = self.load_cookie(repo_root)
+        self.connections = {}
+        self.limiter = limiter
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
     @classmethod
     def load_cookie(cls, repo_root) -> str:
@@ -71,111 +301,164 @@ class RudolphFetcher:
             case str(_):
                 return env_cookie
 
-    @staticmethod
+    def connection(self, host: str) -> http.client.HTTPSConnection:
+        """Persistent connection to `host`. Reused by every request to avoid new TLS handshakes"""
+        if host not in self.connections:
+            self.connections[host] = http.client.HTTPSConnection(host, timeout=self.timeout)
+        return self.connections[host]
+
+    def disconnect(self, host: str):
+        if (conn := self.connections.pop(host, None)) is not None:
+            conn.close()
+
+    def close(self):
+        for host in list(self.connections):
+            self.disconnect(host)
+
     def request(
-        host: str, route: str, method: str, headers: dict | None = None, data: dict | None = None
+        self, host: str, route: str, method: str, headers: dict | None = None, data: dict | None = None
     ) -> http.client.HTTPResponse:
-        conn = http.client.HTTPSConnection(host)
-        conn.request(
-            method,
-            route,
-            body=None if data is None else urlencode(data).encode("utf-8"),
-            headers={} if headers is None else headers,
-        )
+        """
+        Sends a request through the persistent connection of `host`. If the server dropped
+        the connection since the last request, reconnects and tries again once. Requests that
+        are not idempotent are only retried when they could not be sent at all.
+        The response must be read to the end before sending another request to the same host.
+        """
+        body = None if data is None else urlencode(data).encode("utf-8")
+        headers = {} if headers is None else headers
+        if self.limiter is not None and host == self.host:
+            self.limiter.acquire()
+        try:
+            conn = self.connection(host)
+            conn.request(method, route, body=body, headers=headers)
+        except (http.client.HTTPException, ConnectionError):
+            self.disconnect(host)
+            conn = self.connection(host)
+            conn.request(method, route, body=body, headers=headers)
+
+        try:
+            return conn.getresponse()
+        except (http.client.HTTPException, ConnectionError):
+            self.disconnect(host)
+            if method != "GET":
+                raise
+        conn = self.connection(host)
+        conn.request(method, route, body=body, headers=headers)
         return conn.getresponse()
 
-    def aoc_get(self, host: str, route: str) -> str:
-        headers = {
+    def aoc_headers(self) -> dict[str, str]:
+        return {
             "Cookie": f"session={self.cookie}",
             "User-Agent": f"ElfScipt Brigade/{__version__}; github.com/luxedo/esb by luizamaral306@gmail.com",
         }
-        res = self.request(host, route, "GET", headers)
-        if res.status != self.http_ok:
-            message = "Could not fetch! Maybe your cookie have expired"
-            raise ValueError(message)
-        return res.read().decode("utf-8")
+
+    def check_status(self, res: http.client.HTTPResponse, message: str):
+        if res.status == self.http_ok:
+            return
+        if res.status == self.http_too_many_requests or res.status >= self.http_server_error:
+            message = f"Server unavailable (HTTP {res.status}). Please try again later"
+            raise RudolphTransientError(message)
+        raise ValueError(message)
+
+    def with_retries(self, fn: Callable[[], T]) -> T:
+        """Calls `fn` retrying transient errors with exponential backoff. Only use with idempotent requests"""
+        for attempt in range(self.retries + 1):
+            try:
+                return fn()
+            except (RudolphTransientError, http.client.HTTPException, OSError):
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2**attempt)
+        message = "Should never reach here :thinking_face:"  # pragma: no cover
+        raise RuntimeError(message)  # pragma: no cover
+
+    def aoc_get(self, host: str, route: str) -> str:
+        """GET request. With a `cache`, the request is conditional and unchanged pages are read from disk"""
+        cached = None if self.cache is None else self.cache.load(self.cookie, host, route)
+
+        def get() -> str:
+            headers = self.aoc_headers()
+            if self.cache is not None:
+                headers |= self.cache.validators(cached)
+            res = self.request(host, route, "GET", headers)
+            body = res.read()
+            if cached is not None and res.status == self.http_not_modified:
+                return cached["body"]
+            self.check_status(res, "Could not fetch! Maybe your cookie have expired")
+            text = body.decode("utf-8")
+            if self.cache is not None:
+                self.cache.store(self.cookie, host, route, res, text)
+            return text
+
+        return self.with_retries(get)
+
+    def aoc_download(self, host: str, route: str, dst: Path):
+        self.download(host, route, dst, self.aoc_headers(), "Could not fetch! Maybe your cookie have expired")
+
+    def download(self, host: str, route: str, dst: Path, headers: dict, message: str):
+        """Streams the response body straight to `dst`. The file is only replaced on success"""
+
+        def download():
+            res = self.request(host, route, "GET", headers)
+            if res.status != self.http_ok:
+                res.read()
+                self.check_status(res, message)
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            tmp = dst.with_name(f".{dst.name}.part")
+            try:
+                with tmp.open("wb") as fp:
+                    shutil.copyfileobj(res, fp, self.chunk_size)
+                tmp.replace(dst)
+            finally:
+                tmp.unlink(missing_ok=True)
+
+        self.with_retries(download)
 
     def aoc_post(self, host: str, route: str, form_data: dict) -> str:
-        headers = {
-            "Cookie": f"session={self.cookie}",
-            "User-Agent": f"ElfScipt Brigade/{__version__}; github.com/luxedo/esb by luizamaral306@gmail.com",
-            "Content-Type": "application/x-www-form-urlencoded",
-        }
+        headers = self.aoc_headers() | {"Content-Type": "application/x-www-form-urlencoded"}
         res = self.request(host, route, "POST", headers, form_data)
+        body = res.read()
         if res.status != self.http_ok:
             message = "Could not post! Maybe your cookie have expired"
             raise ValueError(message)
-        return res.read().decode("utf-8")
-
-    def get_text(self, element: Tag):
-        text = ""
-        if element.name:
-            if element.name in {"p", "pre"}:
-                text += "\n\n"
-            for child in element.children:
-                text += self.get_text(child)  # type: ignore
-        else:
-            text += element.text
-        return text
+        return body.decode("utf-8")
 
-    def fetch_statement(self, year: int, day: int) -> tuple[str, str, str | None, str | None]:
+    def fetch_page(self, year: int, day: int) -> tuple[str, RudolphPage]:
         route = self.st_route.format(year=year, day=day)
-        body = self.aoc_get(self.host, route)
-
-        soup = BeautifulSoup(body, "html.parser")
-        statement = ""
-        for article in soup.find_all("article"):
-            statement += "\n"
-            statement += self.get_text(article)
-        statement = re.sub(r"\n{3,}", "\n\n", statement)
-        statement = "\n".join("\n".join(wrap(line, width=100)) for line in statement.strip().split("\n"))
-
-        ans_re = re.compile("Your puzzle answer was")
-        pt1, pt2 = None, None
-        match [ans.next_element.get_text() for ans in soup.find_all(string=ans_re)]:
-            case [spt1, spt2]:
-                pt1, pt2 = spt1, spt2
-            case [spt1]:
-                pt1 = spt1
-            case []:
-                pass
+        return self.host + route, RudolphPage(self.aoc_get(self.host, route))
 
-        url = self.host + route
-        return url, statement, pt1, pt2
+    def fetch_statement(self, year: int, day: int) -> tuple[str, str, str | None, str | None]:
+        url, page = self.fetch_page(year, day)
+        pt1, pt2 = page.answer_pair
+        return url, page.statement, pt1, pt2
 
     def fetch_input(self, year: int, day: int) -> str:
         route = self.in_route.format(st_route=self.st_route.format(year=year, day=day))
         return self.aoc_get(self.host, route)
 
+    def download_input(self, year: int, day: int, dst: Path):
+        route = self.in_route.format(st_route=self.st_route.format(year=year, day=day))
+        self.aoc_download(self.host, route, dst)
+
     def fetch_submit(self, year: int, day: int, part: FPPart, answer: str) -> RudolphSubmitStatus:
-        ans_route = self.ans_route.format(st_route=self.st_route.format(year=year, day=day))
-        body = self.aoc_post(self.host, ans_route, form_data={"level": part, "answer": answer})
-        soup = BeautifulSoup(body, "html.parser")
-        matches = {
-            RudolphSubmitStatus.SUCCESS: "That's the right answer!",
-            RudolphSubmitStatus.FAIL: "That's not the right answer",
-            RudolphSubmitStatus.TIMEOUT: "You gave an answer too recently",
-            RudolphSubmitStatus.ALREADY_COMPLETE: "Did you already complete it?",
-        }
+        return self.fetch_submit_page(year, day, part, answer).submit_status
 
-        def match_substr(substr):
-            return lambda tag: (
-                tag is not None
-                and tag.name == "p"
-                and tag.parent is not None
-                and tag.parent.name == "article"
-                and substr in tag.getText()
-            )
-
-        for ret, substr in matches.items():
-            if soup.find(match_substr(substr)) is not None:
-                return ret
-        return RudolphSubmitStatus.ERROR
+    def fetch_submit_page(self, year: int, day: int, part: FPPart, answer: str) -> RudolphPage:
+        """Submits an answer. The page also tells hints and how long to wait before trying again"""
+        ans_route = self.ans_route.format(st_route=self.st_route.format(year=year, day=day))
+        return RudolphPage(self.aoc_post(self.host, ans_route, form_data={"level": part, "answer": answer}))
 
     def fetch_tests(self, year: int, day: int) -> str:
         route = self.test_route.format(year=year, day=pad_day(day))
-        res = self.request(self.test_host, route, "GET")
-        if res.status != self.http_ok:
-            message = "Could not fetch tests :("
-            raise ValueError(message)
-        return res.read().decode("utf-8")
+
+        def get() -> str:
+            res = self.request(self.test_host, route, "GET")
+            body = res.read()
+            self.check_status(res, "Could not fetch tests :(")
+            return body.decode("utf-8")
+
+        return self.with_retries(get)
+
+    def download_tests_archive(self, dst: Path):
+        """Archive of the whole esb repository, which contains every test in `aoc_tests`"""
+        self.download(self.test_archive_host, self.test_archive_route, dst, {}, "Could not fetch tests archive :(")
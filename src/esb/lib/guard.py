@@ -0,0 +1,101 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from esb.lib.fetch import RudolphHint, RudolphSubmitStatus
+
+if TYPE_CHECKING:
+    from esb.lib.db import ECASubmission, ElvenCrisisArchive
+    from esb.lib.fetch import RudolphPage
+    from esb.protocol.fireplace import FPPart
+
+
+@dataclass
+class NaughtyList:
+    """
+    Answers already submitted for a puzzle part. Wrong answers and their "too high" or "too low"
+    hints are used to reject attempts locally, before spending a submission and a lockout.
+    """
+
+    db: ElvenCrisisArchive
+    year: int
+    day: int
+    part: FPPart
+    submissions: list[ECASubmission]
+
+    @classmethod
+    def load(cls, db: ElvenCrisisArchive, year: int, day: int, part: FPPart) -> NaughtyList:
+        submissions = list(db.ECASubmission.find({"year": year, "day": day, "part": part}))
+        return cls(db, year, day, part, sorted(submissions, key=lambda sub: sub.id or 0))
+
+    @property
+    def wrong_answers(self) -> list[ECASubmission]:
+        return [sub for sub in self.submissions if sub.status == RudolphSubmitStatus.FAIL.name]
+
+    @staticmethod
+    def as_int(answer: str) -> int | None:
+        try:
+            return int(answer.strip())
+        except ValueError:
+            return None
+
+    def bounds(self) -> tuple[int | None, int | None]:
+        """Exclusive bounds for the answer given by the hints of wrong answers"""
+        lower, upper = None, None
+        for sub in self.wrong_answers:
+            if (value := self.as_int(sub.answer)) is None:
+                continue
+            match sub.hint:
+                case RudolphHint.LOW.value:
+                    lower = value if lower is None else max(lower, value)
+                case RudolphHint.HIGH.value:
+                    upper = value if upper is None else min(upper, value)
+        return lower, upper
+
+    def reject_reason(self, answer: str) -> str | None:
+        """Why `answer` is certainly wrong, if we can tell without submitting it"""
+        if any(sub.answer.strip() == answer.strip() for sub in self.wrong_answers):
+            return f"Answer {answer} was already submitted and it's wrong"
+        if (value := self.as_int(answer)) is None:
+            return None
+        lower, upper = self.bounds()
+        if lower is not None and value <= lower:
+            return f"Answer {answer} is too low. It must be greater than {lower}"
+        if upper is not None and value >= upper:
+            return f"Answer {answer} is too high. It must be less than {upper}"
+        return None
+
+    def remaining_wait(self, now: datetime) -> float:
+        """Seconds left of the lockout given by the last submission"""
+        if len(self.submissions) == 0 or (last := self.submissions[-1]).wait is None:
+            return 0.0
+        submitted = last.datetime if isinstance(last.datetime, datetime) else datetime.fromisoformat(last.datetime)
+        return max(0.0, last.wait - (now - submitted).total_seconds())
+
+    def record(self, answer: str, page: RudolphPage, now: datetime) -> ECASubmission:
+        submission = self.db.ECASubmission(
+            id=None,
+            datetime=now,
+            year=self.year,
+            day=self.day,
+            part=self.part,
+            answer=answer,
+            status=page.submit_status.name,
+            hint=None if page.hint is None else page.hint.value,
+            wait=page.wait,
+        ).insert()
+        self.submissions.append(submission)
+        return submission
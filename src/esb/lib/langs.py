@@ -12,15 +12,18 @@ ESB - Script your way to rescue Christmas as part of the ElfScript Brigade team.
 from __future__ import annotations
 
 import json
+import os
 import subprocess
-from dataclasses import dataclass
-from typing import TYPE_CHECKING
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, ClassVar
 
+from esb import __version__
 from esb.config import ESBConfig
 from esb.lib.paths import pad_day
 
 if TYPE_CHECKING:
     from pathlib import Path
+    from typing import Self
 
     from esb.lib.paths import LangSled
 
@@ -33,6 +36,7 @@ class LangSpec:
     symbol: str
     emoji: str
     base: bool = False
+    shared: list[str] | None = None
     build_command: list[str] | None = None
     install: list[str] | None = None
 
@@ -45,6 +49,8 @@ class LangSpec:
 @dataclass
 class LangMap:
     langs: dict[str, LangSpec]
+    # Languages loaded by this process by repo root, with the modification times of their specs
+    loaded: ClassVar[dict[Path | None, tuple[LangMap, dict[str, int | None]]]] = {}
 
     @classmethod
     def load_defaults(cls):
@@ -53,8 +59,83 @@ class LangMap:
         })
 
     @classmethod
-    def load(cls):
-        return cls.load_defaults()
+    def load(cls, repo_root: Path | None = None) -> LangMap:
+        """
+        Built in languages, plus the specs in the `boilers` directory of `repo_root`, which take
+        precedence. Kept for the rest of the process and, in a repo, loaded again when a spec
+        changes, so long running commands such as `watch` see the changes. The specs of a repo are
+        compiled into a single cache file that is used for as long as none of them changes
+        """
+        if (loaded := cls.loaded.get(repo_root)) is not None and cls.up_to_date(loaded[1]):
+            return loaded[0]
+        if repo_root is None:
+            loaded = cls.load_defaults(), {}
+        else:
+            cache_file = repo_root / ESBConfig.cache_dir / ESBConfig.lang_cache
+            if (loaded := cls.read_cache(cache_file)) is None:
+                loaded = cls.compile([ESBConfig.boiler_root, repo_root / ESBConfig.boiler_dir])
+                cls.write_cache(cache_file, *loaded)
+        cls.loaded[repo_root] = loaded
+        return loaded[0]
+
+    @classmethod
+    def compile(cls, boiler_roots: list[Path]) -> tuple[Self, dict[str, int | None]]:
+        """
+        Specs of every language in the first of `boiler_roots`, the later roots overriding them. Also
+        the modification times of the files and directories read, missing ones included
+        """
+        langs: dict[str, LangSpec] = {}
+        mtimes = {str(root): cls.mtime(root) for root in boiler_roots}
+        for i, root in enumerate(boiler_roots):
+            if mtimes[str(root)] is None:
+                continue
+            for lang in root.iterdir():
+                if i > 0 and lang.name not in langs:
+                    continue  # Templates only come from the first root, so a new language could not start
+                spec = lang / ESBConfig.spec_filename
+                mtimes[str(spec)] = cls.mtime(spec)
+                if mtimes[str(spec)] is not None:
+                    langs[lang.name] = LangSpec.from_json(spec)
+        return cls(langs), mtimes
+
+    @classmethod
+    def read_cache(cls, cache_file: Path) -> tuple[Self, dict[str, int | None]] | None:
+        """
+        The compiled specs and the modification times they were compiled at. None when missing,
+        from another esb version or out of date
+        """
+        try:
+            compiled = json.loads(cache_file.read_text(encoding="utf-8"))
+            if compiled["version"] != __version__ or not cls.up_to_date(compiled["mtimes"]):
+                return None
+            return cls({name: LangSpec(**spec) for name, spec in compiled["langs"].items()}), compiled["mtimes"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    @staticmethod
+    def write_cache(cache_file: Path, lang_map: LangMap, mtimes: dict[str, int | None]):
+        compiled = {
+            "version": __version__,
+            "mtimes": mtimes,
+            "langs": {name: asdict(spec) for name, spec in lang_map.langs.items()},
+        }
+        tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}")
+        try:
+            tmp_file.write_text(json.dumps(compiled), encoding="utf-8")
+            tmp_file.replace(cache_file)  # Atomic: other esb processes may be reading it
+        except OSError:
+            tmp_file.unlink(missing_ok=True)
+
+    @classmethod
+    def up_to_date(cls, mtimes: dict[str, int | None]) -> bool:
+        return all(cls.mtime(path) == mtime for path, mtime in mtimes.items())
+
+    @staticmethod
+    def mtime(path: str | Path) -> int | None:
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
 
     @property
     def names(self):
@@ -0,0 +1,98 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+@dataclass
+class FileLock:
+    """
+    Lock shared between processes. Works by exclusively creating `path`, so it's portable and
+    needs no extra dependencies. Locks older than `stale` seconds are considered abandoned by a
+    crashed process and are broken.
+
+    `acquire` returns whether it had to wait for another holder. Useful for collapsing work that
+    was just done by someone else.
+    """
+
+    path: Path
+    poll: float = 0.1
+    stale: float = 600
+
+    def acquire(self) -> bool:
+        waited = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                waited = True
+                self.break_stale()
+                time.sleep(self.poll)
+                continue
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            return waited
+
+    def release(self):
+        self.path.unlink(missing_ok=True)
+
+    def break_stale(self):
+        try:
+            if time.time() - self.path.stat().st_mtime > self.stale:
+                self.path.unlink(missing_ok=True)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+@dataclass
+class TokenBucket:
+    """
+    Thread safe token bucket rate limiter. Allows bursts of up to `capacity` calls and
+    `rate` calls per second on average.
+    """
+
+    rate: float
+    capacity: float
+    tokens: float = field(init=False)
+    updated: float = field(init=False)
+    lock: Lock = field(init=False, default_factory=Lock, repr=False)
+
+    def __post_init__(self):
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
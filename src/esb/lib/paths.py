@@ -124,6 +124,14 @@ class LangSled(YearSled):
     def boiler_base_subdir(self) -> Path:
         return self.boiler_subdir.parent / ESBConfig.boiler_template_base
 
+    @property
+    def boiler_shared_subdir(self) -> Path:
+        return self.boiler_subdir.parent / ESBConfig.boiler_template_shared
+
+    @property
+    def shared_dir(self) -> Path:
+        return self.subdir
+
     def boiler_source(self, filename: str) -> Path:
         return self.boiler_subdir / filename
 
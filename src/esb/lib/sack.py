@@ -0,0 +1,78 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+from __future__ import annotations
+
+import re
+import zipfile
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from esb.config import ESBConfig
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+SackKey = tuple[int, int]
+
+
+@dataclass
+class SantaSack:
+    """
+    Test corpus shipped with esb, indexed by (year, day). Sources are either zip archives or
+    directories with the same layout as `aoc_tests` in the esb repository. When a day is found
+    in more than one source, the first source wins.
+    """
+
+    sources: list[Path]
+    index: dict[SackKey, tuple[Path, str]] = field(init=False, default_factory=dict)
+    member_re = re.compile(r"(?:^|/)(\d{4})/(\d{2})/tests_\1_\2\.toml$")
+
+    def __post_init__(self):
+        for source in reversed(self.sources):
+            for member in self.members(source):
+                if (match := self.member_re.search(member)) is not None:
+                    self.index[int(match.group(1)), int(match.group(2))] = (source, member)
+
+    @classmethod
+    def load(cls, cache_dir: Path | None = None) -> SantaSack:
+        """
+        Archive refreshed into `cache_dir` by `esb fetch --refresh-tests`, then the archive bundled
+        in the wheel, then the `aoc_tests` directory when running from a checkout of the esb repo
+        """
+        sources = [
+            cache_dir / ESBConfig.tests_archive if cache_dir is not None else None,
+            ESBConfig.package_root / ESBConfig.tests_archive,
+            ESBConfig.package_root.parent.parent / ESBConfig.tests_corpus_dir,
+        ]
+        return cls([source for source in sources if source is not None and source.exists()])
+
+    @staticmethod
+    def members(source: Path) -> list[str]:
+        if source.is_dir():
+            return [path.relative_to(source).as_posix() for path in source.rglob("tests_*.toml")]
+        try:
+            with zipfile.ZipFile(source) as zf:
+                return zf.namelist()
+        except (OSError, zipfile.BadZipFile):
+            return []
+
+    def __contains__(self, key: SackKey) -> bool:
+        return key in self.index
+
+    def read(self, year: int, day: int) -> str | None:
+        if (year, day) not in self.index:
+            return None
+        source, member = self.index[year, day]
+        if source.is_dir():
+            return (source / member).read_text()
+        with zipfile.ZipFile(source) as zf:
+            return zf.read(member).decode("utf-8")
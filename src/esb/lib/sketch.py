@@ -0,0 +1,184 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from esb.config import ESBConfig
+from esb.lib.stats import stats_backend
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+
+@dataclass
+class LogSketch:
+    """
+    Quantile sketch with logarithmic buckets. Any quantile is estimated within `accuracy` relative
+    error. Serialized, it takes about two bytes per occupied bucket, whatever the number of values.
+
+    Bucket `i` counts values in (gamma^(i-1), gamma^i], with gamma = (1 + accuracy) / (1 - accuracy).
+    Values smaller than one, such as a zero running time, are counted apart.
+    """
+
+    accuracy: float = ESBConfig.sketch_accuracy
+    zeros: int = 0
+    buckets: dict[int, int] = field(default_factory=dict)
+
+    @property
+    def gamma(self) -> float:
+        return (1 + self.accuracy) / (1 - self.accuracy)
+
+    @property
+    def count(self) -> int:
+        return self.zeros + sum(self.buckets.values())
+
+    def index(self, value: float) -> int:
+        return math.ceil(math.log(value) / math.log(self.gamma))
+
+    def value(self, index: int) -> float:
+        """Estimate for the values in bucket `index`. At most `accuracy` away from any of them"""
+        return 2 * self.gamma**index / (self.gamma + 1)
+
+    def add(self, value: float, count: int = 1):
+        if value < 1:
+            self.zeros += count
+            return
+        index = self.index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def add_many(self, values: Sequence[int]) -> LogSketch:
+        zeros, buckets = stats_backend(len(values)).log_buckets(values, self.gamma)
+        self.zeros += zeros
+        for index, count in buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        return self
+
+    def merge(self, other: LogSketch) -> LogSketch:
+        if not math.isclose(self.accuracy, other.accuracy):
+            message = f"Cannot merge sketches with different accuracies: {self.accuracy} and {other.accuracy}"
+            raise ValueError(message)
+        self.zeros += other.zeros
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        return self
+
+    def quantile(self, q: float) -> float | None:
+        """Estimate of the `q` quantile, 0 <= q <= 1, interpolating between ranks. None when empty"""
+        if (count := self.count) == 0:
+            return None
+        rank = q * (count - 1)
+        low, high = self.rank_value(math.floor(rank)), self.rank_value(math.ceil(rank))
+        return low + (high - low) * (rank - math.floor(rank))
+
+    def rank_value(self, rank: int) -> float:
+        """Estimate of the `rank`-th smallest value"""
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return self.value(index)
+        return self.value(max(self.buckets))
+
+    def log_histogram(self, bins: int, scale: float = 1) -> tuple[list[int], list[float]]:
+        """
+        Histogram of log10(value * scale) in `bins` bins of equal width, from the smallest to the
+        largest value. Counts and bin edges. Zeros have no logarithm and are left out
+        """
+        counts = [0] * bins
+        if not self.buckets:
+            return counts, [0.0] * (bins + 1)
+        logs = {index: math.log10(self.value(index) * scale) for index in self.buckets}
+        low, high = min(logs.values()), max(logs.values())
+        width = (high - low) / bins
+        for index, x in logs.items():
+            counts[min(int((x - low) / width), bins - 1) if width > 0 else 0] += self.buckets[index]
+        return counts, [low + width * i for i in range(bins + 1)]
+
+    #######################################################
+    # Serialization
+    #######################################################
+    def to_bytes(self) -> bytes:
+        """Varints: accuracy in basis points, zeros, number of buckets, then (index delta, count) pairs"""
+        out = bytearray()
+        self.write_varint(out, round(self.accuracy * 10_000))
+        self.write_varint(out, self.zeros)
+        self.write_varint(out, len(self.buckets))
+        previous = 0
+        for index in sorted(self.buckets):
+            self.write_varint(out, self.zigzag(index - previous))
+            self.write_varint(out, self.buckets[index])
+            previous = index
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> LogSketch:
+        pos = 0
+        basis_points, pos = cls.read_varint(data, pos)
+        zeros, pos = cls.read_varint(data, pos)
+        size, pos = cls.read_varint(data, pos)
+        buckets = {}
+        index = 0
+        for _ in range(size):
+            delta, pos = cls.read_varint(data, pos)
+            count, pos = cls.read_varint(data, pos)
+            index += cls.unzigzag(delta)
+            buckets[index] = count
+        return cls(basis_points / 10_000, zeros, buckets)
+
+    @staticmethod
+    def zigzag(value: int) -> int:
+        return value * 2 if value >= 0 else -value * 2 - 1
+
+    @staticmethod
+    def unzigzag(value: int) -> int:
+        return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+    @staticmethod
+    def write_varint(out: bytearray, value: int):
+        while value >= 0x80:  # noqa: PLR2004
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+
+    @staticmethod
+    def read_varint(data: bytes, pos: int) -> tuple[int, int]:
+        value = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:  # noqa: PLR2004
+                return value, pos
+            shift += 7
+
+
+class SketchMerge:
+    """SQLite aggregate merging serialized sketches: `SELECT sketch_merge(sketch) ... GROUP BY ...`"""
+
+    sketch: LogSketch | None
+
+    def __init__(self):
+        self.sketch = None
+
+    def step(self, data: bytes | None):
+        if data is None:
+            return
+        sketch = LogSketch.from_bytes(data)
+        self.sketch = sketch if self.sketch is None else self.sketch.merge(sketch)
+
+    def finalize(self) -> bytes | None:
+        return None if self.sketch is None else self.sketch.to_bytes()
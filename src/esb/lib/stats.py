@@ -0,0 +1,103 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+from __future__ import annotations
+
+import math
+from functools import cache
+from typing import TYPE_CHECKING, Protocol
+
+from esb.config import ESBConfig
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+# count, mean, sum of squared deviations (m2), min and max
+Moments = tuple[int, float, float, int, int]
+
+
+class StatsBackend(Protocol):
+    """Aggregates of running times in nanoseconds. Used by `ECAStats` and `LogSketch`"""
+
+    def moments(self, values: Sequence[int]) -> Moments: ...
+
+    def log_buckets(self, values: Sequence[int], gamma: float) -> tuple[int, dict[int, int]]:
+        """Number of values smaller than one and counts of the others by `LogSketch` bucket"""
+        ...
+
+
+class PythonStats:
+    @staticmethod
+    def moments(values: Sequence[int]) -> Moments:
+        # Welford's algorithm
+        count, mean, m2 = 0, 0.0, 0.0
+        for value in values:
+            count += 1
+            delta = value - mean
+            mean += delta / count
+            m2 += delta * (value - mean)
+        return count, mean, m2, min(values), max(values)
+
+    @staticmethod
+    def log_buckets(values: Sequence[int], gamma: float) -> tuple[int, dict[int, int]]:
+        zeros = 0
+        buckets: dict[int, int] = {}
+        log_gamma = math.log(gamma)
+        for value in values:
+            if value < 1:
+                zeros += 1
+                continue
+            index = math.ceil(math.log(value) / log_gamma)
+            buckets[index] = buckets.get(index, 0) + 1
+        return zeros, buckets
+
+
+class NumpyStats:
+    """Vectorized aggregates. Raises ImportError when NumPy is not installed: `pip install esb[numpy]`"""
+
+    def __init__(self):
+        import numpy as np  # noqa: PLC0415
+
+        self.np = np
+
+    def moments(self, values: Sequence[int]) -> Moments:
+        times = self.np.asarray(values, dtype=self.np.int64)
+        mean = float(times.mean())
+        m2 = float(self.np.square(times - mean).sum())
+        return len(times), mean, m2, int(times.min()), int(times.max())
+
+    def log_buckets(self, values: Sequence[int], gamma: float) -> tuple[int, dict[int, int]]:
+        times = self.np.asarray(values, dtype=self.np.float64)
+        positive = times[times >= 1]
+        indexes = self.np.ceil(self.np.log(positive) / math.log(gamma)).astype(self.np.int64)
+        unique, counts = self.np.unique(indexes, return_counts=True)
+        return len(times) - len(positive), dict(zip(unique.tolist(), counts.tolist(), strict=True))
+
+
+PYTHON_STATS = PythonStats()
+
+
+@cache
+def numpy_stats() -> NumpyStats | None:
+    try:
+        return NumpyStats()
+    except ImportError:
+        return None
+
+
+def stats_backend(size: int) -> StatsBackend:
+    """
+    NumPy for at least `ESBConfig.stats_numpy_min` values, if installed. Importing it costs more
+    than looping over a few hundred values in Python, so smaller inputs stay in Python
+    """
+    if size >= ESBConfig.stats_numpy_min and (backend := numpy_stats()) is not None:
+        return backend
+    return PYTHON_STATS
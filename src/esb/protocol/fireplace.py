@@ -12,7 +12,6 @@ Script your way to rescue Christmas as part of the ElfScript Brigade team.
 from __future__ import annotations
 
 import argparse
-import asyncio
 import sys
 from collections.abc import Callable
 from dataclasses import dataclass
@@ -83,6 +82,7 @@ class FPResult:
     answer: str | None = None
     running_time: int | None = None
     unit: MetricPrefix | None = None
+    stderr: str = ""
 
 
 # @TODO: type this
@@ -97,7 +97,11 @@ async def _read_output(stream, print_stream=None) -> str:
     return ret
 
 
-async def _exec_protocol_command(cmd: list[str], cwd: Path, day_input_text: str) -> tuple[int, str]:
+async def _exec_protocol_command(
+    cmd: list[str], cwd: Path, day_input_text: str, *, echo: bool = True
+) -> tuple[int, str, str]:
+    import asyncio  # noqa: PLC0415
+
     proc = await asyncio.create_subprocess_exec(
         *cmd,
         cwd=cwd,
@@ -110,16 +114,24 @@ async def _exec_protocol_command(cmd: list[str], cwd: Path, day_input_text: str)
         message = "Could not open stdin"
         raise RuntimeError(message)
 
-    proc.stdin.write(day_input_text.encode())
-    await proc.stdin.drain()
-    proc.stdin.close()
-
-    stdout_task = _read_output(proc.stdout, print_stream=sys.stdout)
-    stderr_task = _read_output(proc.stderr)
-    returncode, stdout, stderr = await asyncio.gather(proc.wait(), stdout_task, stderr_task)
-    sys.stderr.write(stderr)
-    sys.stderr.flush()
-    return returncode, stdout
+    try:
+        proc.stdin.write(day_input_text.encode())
+        await proc.stdin.drain()
+        proc.stdin.close()
+
+        stdout_task = _read_output(proc.stdout, print_stream=sys.stdout if echo else None)
+        stderr_task = _read_output(proc.stderr)
+        returncode, stdout, stderr = await asyncio.gather(proc.wait(), stdout_task, stderr_task)
+    except asyncio.CancelledError:
+        # A newer run superseded this one. Don't leave the solution running in the background
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if echo:
+        sys.stderr.write(stderr)
+        sys.stderr.flush()
+    return returncode, stdout, stderr
 
 
 def parse_running_time(running_time_line: str) -> tuple[int, MetricPrefix]:
@@ -151,15 +163,29 @@ def exec_protocol(
     args: list[str] | None,
     cwd: Path,
     day_input_text: str,
+) -> FPResult:
+    import asyncio  # noqa: PLC0415  # Only the runner needs it, not the solutions importing this module
+
+    return asyncio.run(exec_protocol_async(command, part, args, cwd, day_input_text))
+
+
+async def exec_protocol_async(
+    command: list[str],
+    part: FPPart,
+    args: list[str] | None,
+    cwd: Path,
+    day_input_text: str,
+    *,
+    echo: bool = True,
 ) -> FPResult:
     cmd = [*command, "--part", f"{part}"]
     if args is not None:
         cmd.extend(["--args", *args])
-    exitcode, stdout = asyncio.run(_exec_protocol_command(cmd, cwd, day_input_text))
+    exitcode, stdout, stderr = await _exec_protocol_command(cmd, cwd, day_input_text, echo=echo)
 
     success_exit = 0
     if exitcode != success_exit or not stdout.endswith("\n"):
-        return FPResult(status=FPStatus.ProtocolError)
+        return FPResult(status=FPStatus.ProtocolError, stderr=stderr)
 
     running_time = None
     unit = None
@@ -170,6 +196,6 @@ def exec_protocol(
         try:
             running_time, unit = parse_running_time(lines[-1])
         except ValueError:
-            return FPResult(status=FPStatus.ProtocolError)
+            return FPResult(status=FPStatus.ProtocolError, stderr=stderr)
 
-    return FPResult(status=FPStatus.Ok, answer=answer, running_time=running_time, unit=unit)
+    return FPResult(status=FPStatus.Ok, answer=answer, running_time=running_time, unit=unit, stderr=stderr)
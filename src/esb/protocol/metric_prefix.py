@@ -96,6 +96,13 @@ class MetricPrefix(Enum):
     def to_float(self, mantissa: float = 1) -> float:
         return mantissa * 10**self.value
 
+    def to_nanos(self, mantissa: float = 1) -> int:
+        """Exact for integer mantissas down to nanoseconds. Smaller prefixes are rounded"""
+        shift = self.value - MetricPrefix.nano.value
+        if shift >= 0:
+            return round(mantissa * 10**shift)
+        return round(mantissa / 10**-shift)
+
     @classmethod
     def from_float(cls, value: float, exponent: int = 0) -> tuple[float, MetricPrefix]:
         value *= 10**exponent
@@ -55,12 +55,17 @@ class HttpMock:
         self.http_response = http_response
         self.next_response = cycle(self.http_response)
 
+    def download(self, _host: str, _route: str, dst: Path):
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        dst.write_text(next(self.next_response), encoding="utf-8")
+
     def __enter__(self):
         self.stderr = io.StringIO()
         self.stdout = io.StringIO()
         self.patchers = [
             patch("esb.lib.fetch.RudolphFetcher.aoc_get", side_effect=self.next_response),
             patch("esb.lib.fetch.RudolphFetcher.aoc_post", side_effect=self.next_response),
+            patch("esb.lib.fetch.RudolphFetcher.aoc_download", side_effect=self.download),
             patch.dict(os.environ, {RudolphFetcher.sess_env: "mocka moccha"}),
         ]
 
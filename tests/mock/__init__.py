@@ -17,6 +17,7 @@ SOLUTION_PYTHON = MOCK_ROOT / "solution.py"
 
 SOLUTION_2016_01_PYTHON = MOCK_ROOT / "test_day" / "aoc_2016_01.py"
 STATEMENT_2016_01 = MOCK_ROOT / "test_day" / "statement.html"
+STATEMENT_TEXT_2016_01 = MOCK_ROOT / "test_day" / "statement.txt"
 INPUT_2016_01 = MOCK_ROOT / "test_day" / "input.txt"
 TEST_2016_01 = MOCK_ROOT / "test_day" / "test.toml"
 
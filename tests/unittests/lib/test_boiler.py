@@ -60,3 +60,21 @@ class TestBoiler(TestWithInitializedEsbRepo):
         assert not test_file.exists()
 
         self.assert_files(lang_sled)
+
+    def test_code_furnace_shared_dir(self):
+        lang_name = "elixir"
+        lang_sled, lang_spec = self.load_lang_sled(lang_name)
+        cf = CodeFurnace(lang_spec, lang_sled)
+        cf.start(self.year, self.day, self.title, self.url)
+        assert (lang_sled.shared_dir / ".gitignore").is_file()
+        assert not cf.shared_warm()
+
+        for path in lang_spec.shared:
+            (lang_sled.shared_dir / path).touch()
+        assert cf.shared_warm()
+
+        # Shared files must survive a new start
+        cf.start(self.year, self.day + 1, self.title, self.url)
+        assert cf.shared_warm()
+        mix_exs = lang_sled.day_dir(self.year, self.day + 1) / "mix.exs"
+        assert f"app: :aoc_{self.year}_{self.day + 1:02}" in mix_exs.read_text()
@@ -0,0 +1,100 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+ESB - Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+import unittest
+from unittest.mock import patch
+
+from esb.config import ESBConfig
+from esb.lib.charts import BAR, POINT, VLINE, PlotextCharts, TextCharts, charts
+
+
+class TestTextCharts(unittest.TestCase):
+    width = 60
+    height = 12
+
+    def setUp(self):
+        self.charts = TextCharts()
+
+    def test_bars(self):
+        text = self.charts.bars(["2015", "2016"], [10, 5], title="AoC Solves", width=self.width)
+        title, first, second = text.split("\n")
+        assert title.strip() == "AoC Solves"
+        assert first.startswith("2015 ")
+        assert first.endswith(" 10")
+        assert abs(first.count(BAR) - 2 * second.count(BAR)) <= 1
+        assert max(map(len, text.split("\n"))) <= self.width
+
+    def test_histogram(self):
+        text = self.charts.histogram(
+            [1, 4, 2],
+            [0, 1, 2, 3],
+            title="Times",
+            width=self.width,
+            height=self.height,
+            xlim=(0, 4),
+            xticks=[0, 2, 4],
+            xlabels=["0 s", "2 s", "4 s"],
+            vlines=[3.5],
+        )
+        lines = text.split("\n")
+        assert len(lines) == self.height
+        assert max(map(len, lines)) <= self.width
+        assert lines[1].startswith("4┤")
+        assert VLINE in lines[1]
+        assert [label.strip() for label in lines[-1].split("  ") if label] == ["0 s", "2 s", "4 s"]
+        assert self.charts.histogram([1], [0, 1], **self.axes(title="Same")) == self.charts.histogram(
+            [1], [0, 1], **self.axes(title="Same")
+        )
+
+    def test_scatter(self):
+        text = self.charts.scatter(
+            [1, 2, 3],
+            [1, 2, 3],
+            title="",
+            width=self.width,
+            height=self.height,
+            xlim=(0, 4),
+            ylim=(0, 4),
+            xticks=[1, 2, 3],
+            yticks=[0, 4],
+            ylabels=["low", "high"],
+        )
+        lines = text.split("\n")
+        assert len(lines) == self.height
+        assert text.count(POINT) == 3
+        assert lines[0].startswith("high┤")
+
+    def axes(self, title: str) -> dict:
+        return {
+            "title": title,
+            "width": self.width,
+            "height": self.height,
+            "xlim": (0, 1),
+            "xticks": [0, 1],
+            "xlabels": ["0", "1"],
+        }
+
+
+class TestCharts(unittest.TestCase):
+    def tearDown(self):
+        charts.cache_clear()
+
+    def test_builtin_by_default(self):
+        charts.cache_clear()
+        assert isinstance(charts(), TextCharts)
+
+    def test_falls_back_without_plotext(self):
+        charts.cache_clear()
+        with (
+            patch.object(ESBConfig, "charts", "plotext"),
+            patch.object(PlotextCharts, "__init__", side_effect=ImportError),
+        ):
+            assert isinstance(charts(), TextCharts)
@@ -0,0 +1,182 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+ESB - Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+import os
+import shutil
+import sqlite3
+import unittest
+from contextlib import closing
+from dataclasses import replace
+from io import StringIO
+from statistics import mean, median, stdev
+from unittest.mock import patch
+
+import pytest
+
+from esb.config import ESBConfig
+from esb.lib.dash import CliDash, HTMLTable, MdDash, row_template
+from esb.lib.db import ElvenCrisisArchive
+from esb.lib.langs import LangMap
+from tests.fixtures import TestWithInitializedEsbRepo
+
+RUN_TIMES_NS = {
+    (2016, 1): [1_000, 2_000, 4_000, 8_000],
+    (2016, 2): [3_000_000, 5_000_000, 7_000_000],
+    (2017, 1): [500, 900],
+}
+
+
+class TestWithRuns(TestWithInitializedEsbRepo):
+    def setUp(self):
+        super().setUp()
+        self.db = ElvenCrisisArchive(self.repo_root)
+        python_id = self.db.ECALanguageName.id_of("python")
+        for year, day in RUN_TIMES_NS:
+            self.db.ECAPuzzle(year, day, "Title", "url", "42", "43", "2024-12-01", None).insert()
+            self.db.ECALanguage(year, day, "python", "2024-12-01", None).insert()
+        runs = [
+            self.db.ECARun(None, 0, year, day, python_id, 1, "42", time_ns)
+            for (year, day), times in RUN_TIMES_NS.items()
+            for time_ns in times
+        ]
+        wrong_answer = self.db.ECARun(None, 0, 2016, 1, python_id, 1, "0", 1)
+        not_timed = self.db.ECARun(None, 0, 2016, 1, python_id, 2, "43", None)
+        self.db.ECARun.insert_many([*runs, wrong_answer, not_timed])
+        self.db.rebuild_stats()
+
+
+class TestBaseDash(TestWithRuns):
+    def setUp(self):
+        super().setUp()
+        self.dash = CliDash(self.db, LangMap.load(), full=True)
+
+    def test_correct_stats(self):
+        stats = list(self.dash.correct_stats())
+        assert sum(row["count"] for row in stats) == sum(len(times) for times in RUN_TIMES_NS.values())
+        assert {row["language"] for row in stats} == {"python"}
+
+    def test_time_stats(self):
+        stats = {(row["year"], row["day"]): row for row in self.dash.time_stats("year", "day")}
+        assert list(stats) == [(2017, 1), (2016, 2), (2016, 1)]
+        for key, times_ns in RUN_TIMES_NS.items():
+            times = [t / 1e9 for t in times_ns]
+            assert stats[key]["n"] == len(times)
+            assert stats[key]["mean"] == pytest.approx(mean(times))
+            assert stats[key]["stdev"] == pytest.approx(stdev(times))
+            assert stats[key]["min"] == pytest.approx(min(times))
+            assert stats[key]["max"] == pytest.approx(max(times))
+            (p50,) = self.dash.quantiles(stats[key]["sketch"], 0.5)
+            assert p50 == pytest.approx(median(times), rel=0.02)
+
+    def test_time_stats_of_everything(self):
+        (overall,) = self.dash.time_stats()
+        times = [t / 1e9 for times_ns in RUN_TIMES_NS.values() for t in times_ns]
+        assert overall["n"] == len(times)
+        assert overall["stdev"] == pytest.approx(stdev(times))
+
+    def test_time_stats_merge_archives(self):
+        other_root = self.repo_root / "other"
+        other_root.mkdir()
+        (other_root / ESBConfig.db_path).parent.mkdir(parents=True)
+        with closing(sqlite3.connect(other_root / ESBConfig.db_path)) as other:
+            self.db.sql.con.backup(other)
+        schema = self.db.attach(other_root)
+        (year,) = self.dash.time_stats("year", "language", schemas=["main", schema]).where("year = 2017")
+        assert year["language"] == "python"
+        assert year["n"] == 2 * len(RUN_TIMES_NS[2017, 1])
+        assert year["mean"] == pytest.approx(mean(RUN_TIMES_NS[2017, 1]) / 1e9)
+
+    def test_attach_requires_an_archive(self):
+        with pytest.raises(FileNotFoundError, match="No archive found"):
+            self.db.attach(self.repo_root / "nowhere")
+
+    def test_stars(self):
+        assert self.dash.fetch_year_stars() == {2016: {1: 2, 2: 2}, 2017: {1: 2}}
+        assert self.dash.fetch_lang_stars() == {"python": {2016: {1: 1, 2: 1}, 2017: {1: 1}}}
+
+    def test_status_is_cached(self):
+        status = self.dash.build_dash()
+        with patch.object(self.dash, "plots", wraps=self.dash.plots) as plots:
+            assert self.dash.build_dash() == status
+            plots.assert_not_called()
+            python_id = self.db.ECALanguageName.id_of("python")
+            self.db.ECAStats.record(self.db.ECARun(None, 0, 2017, 1, python_id, 1, "42", 700).insert())
+            assert self.dash.build_dash() != status
+            plots.assert_called_once()
+        with patch("shutil.get_terminal_size", return_value=os.terminal_size((33, 10))):
+            assert len(list(self.db.ECARenderCache.fetch_all())) == 3  # Stars did not change
+            self.dash.build_dash()
+            assert len(list(self.db.ECARenderCache.fetch_all())) == 5
+
+    def test_status_sees_language_changes(self):
+        status = self.dash.build_dash()
+        python = self.dash.lmap.get("python")
+        self.dash.lmap = LangMap({**self.dash.lmap.langs, "python": replace(python, symbol="Py")})
+        assert self.dash.build_dash() != status
+        assert "Py" in self.dash.build_dash()
+
+    def test_plots(self):
+        plots = self.dash.plots(times_tables=True)
+        assert "Year 2016 - mean:" in plots
+        assert "Not enough data" in plots
+
+
+class TestMdDash(TestWithRuns):
+    def setUp(self):
+        super().setUp()
+        shutil.copy(ESBConfig.blank_dash, self.repo_root / "README.md")
+        shutil.copy(ESBConfig.blank_report, self.repo_root / "REPORT.md")
+        self.md_dash = MdDash(self.db, LangMap.load(), self.repo_root)
+
+    def test_build_skips_unchanged_files(self):
+        assert self.md_dash.build() == [self.md_dash.readme, self.md_dash.report]
+        assert "### 2017" in self.md_dash.readme.read_text()
+        assert self.md_dash.build() == []
+
+    def test_build_renders_only_dirty_years(self):
+        self.md_dash.build()
+        full_report = self.md_dash.report.read_text()
+        self.db.ECAPuzzle.find_single({"year": 2017, "day": 1}).update({"title": "Other title"}, where=["year", "day"])
+        with patch.object(self.md_dash, "timing_plots", wraps=self.md_dash.timing_plots) as timing_plots:
+            assert self.md_dash.build() == []
+        timing_plots.assert_called_once_with({2017})
+        assert self.md_dash.report.read_text() == full_report
+
+        self.db.ECAPuzzle.find_single({"year": 2017, "day": 1}).update({"answer_pt1": None}, where=["year", "day"])
+        assert self.md_dash.build() == [self.md_dash.readme, self.md_dash.report]
+        assert self.md_dash.build_report(reset=False) == self.md_dash.report.read_text()  # Same as a full render
+        assert self.md_dash.build(reset=True) == []
+
+    def test_years_summary(self):
+        summary = self.md_dash.years_summary({2016})
+        assert list(summary) == [2016]
+        assert summary[2016].startswith("\n### 2016 (2/25)\n\n<table>\n  <tr>\n    <td>🐍 ☐</td>\n")
+        assert summary[2016].count("<tr>") == summary[2016].count("</tr>")
+        assert '<th colspan="6" align="center">25</th>' in summary[2016]
+
+
+class TestHTMLTable(unittest.TestCase):
+    def test_rows(self):
+        out = StringIO()
+        with HTMLTable(out) as table:
+            table.row("th", ["day", "01"])
+            table.row("td", ["{}", "--"], {"align": "center"})
+            table.row("td", [""], {"colspan": 2})
+        assert out.getvalue() == (
+            "<table>\n"
+            "  <tr>\n    <th>day</th>\n    <th>01</th>\n  </tr>\n"
+            '  <tr>\n    <td align="center">{}</td>\n    <td align="center">--</td>\n  </tr>\n'
+            '  <tr>\n    <td colspan="2" />\n  </tr>\n'
+            "</table>"
+        )
+
+    def test_row_templates_are_reused(self):
+        assert row_template("td", 6, "") is row_template("td", 6, "")
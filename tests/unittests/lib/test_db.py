@@ -9,8 +9,13 @@ ESB - Script your way to rescue Christmas as part of the ElfScript Brigade team.
 (Thank you [Eric 😉!](https://twitter.com/ericwastl)).
 """
 
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, replace
 from pathlib import Path
+from statistics import mean, stdev
+from unittest.mock import MagicMock, patch
 
 import pytest
 
@@ -18,9 +23,43 @@ from esb.lib import db
 from tests.fixtures import TestWithTemporaryDirectory
 
 
+def insert_values(db_path: Path, start: int, count: int):
+    with db.SqlConnection(db_path) as sql:
+        for value in range(start, start + count):
+            sql.write("INSERT INTO concurrent (value) VALUES (?)", (value,))
+
+
 class TestSqlConnection(TestWithTemporaryDirectory):
     db_path = Path("my_test.sqlite")
 
+    def test_wal_mode(self):
+        with db.SqlConnection(self.db_path) as sql:
+            assert sql.cur.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+
+    def test_concurrent_writers(self):
+        with db.SqlConnection(self.db_path) as sql:
+            sql.write("CREATE TABLE concurrent (value INTEGER)")
+        workers, count = 4, 50
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(insert_values, self.db_path, i * count, count) for i in range(workers)]
+            for future in futures:
+                future.result()
+        with db.SqlConnection(self.db_path) as sql:
+            assert sql.cur.execute("SELECT COUNT(DISTINCT value) FROM concurrent").fetchone() == (workers * count,)
+
+    def test_retrying_busy_database(self):
+        fn = MagicMock(side_effect=[sqlite3.OperationalError("database is locked"), "done"])
+        with db.SqlConnection(self.db_path) as sql, patch("time.sleep") as sleep:
+            assert sql.retrying(fn) == "done"
+        assert fn.call_count == 2
+        sleep.assert_called_once()
+
+    def test_retrying_does_not_retry_other_errors(self):
+        fn = MagicMock(side_effect=sqlite3.OperationalError("no such table: santa"))
+        with db.SqlConnection(self.db_path) as sql, pytest.raises(sqlite3.OperationalError):
+            sql.retrying(fn)
+        assert fn.call_count == 1
+
     def test_context_manager(self):
         with db.SqlConnection(self.db_path) as sql:
             sql.cur.execute("CREATE TABLE ctx_man (value)")
@@ -102,6 +141,55 @@ class TestTable(TestWithTemporaryDirectory):
             self.row2,
         }
 
+    def test_fetch_all_streams_in_batches(self):
+        rows = [self.SantaTable(idx=i, value=i, text=str(i)) for i in range(10)]
+        self.SantaTable.insert_many(rows)
+        with patch.object(db.ESBConfig, "db_fetch_size", 3):
+            stream = self.SantaTable.fetch_all()
+            first = next(stream)
+            # Other queries may run while a stream is open
+            assert self.SantaTable.find_one({"idx": 9}) == rows[9]
+            assert [first, *stream] == rows
+
+    def test_slotted_rows(self):
+        @dataclass(unsafe_hash=True, slots=True)
+        class SlottedTable(db.Table):
+            idx: int
+            value: int
+            text: str
+
+        SlottedTable.bind_connection(self.sql)
+        self.sql.cur.execute("CREATE TABLE SlottedTable (idx INTEGER NOT NULL PRIMARY KEY, value, text)")
+        SlottedTable(idx=1, value=2, text="abc").insert()
+        row = SlottedTable.fetch_single()
+        assert list(row.to_dict()) == ["idx", "value", "text"]
+        assert not hasattr(row, "__dict__")
+        row.update({"value": 3})
+        assert SlottedTable.fetch_single() == SlottedTable(idx=1, value=3, text="abc")
+
+    def test_query(self):
+        self.SantaTable.insert_many([self.row0, self.row1, self.row2, self.SantaTable(idx=4, value=1, text="abc")])
+        query = (
+            self.SantaTable
+            .query("s")
+            .select("text", "COUNT(*) AS n", "SUM(value) AS total")
+            .where("value > :low", low=100)
+            .group_by("text")
+            .having("COUNT(*) >= :n", n=1)
+            .order_by("total DESC")
+        )
+        assert [tuple(row) for row in query] == [("ghi", 1, 789), ("def", 1, 456), ("abc", 1, 123)]
+        ranked = (
+            self.SantaTable
+            .query()
+            .select("idx", "RANK() OVER w AS rank")
+            .window("w", "PARTITION BY text ORDER BY value DESC")
+            .order_by("idx")
+        )
+        assert [row["rank"] for row in ranked] == [1, 1, 1, 2]
+        both = self.SantaTable.query().select("idx").where("idx < 2").union_all(self.SantaTable.query().select("idx"))
+        assert sorted(row["idx"] for row in both) == [1, 1, 2, 3, 4]
+
     def test_fetch_one(self):
         assert self.SantaTable.fetch_one() is None
         self.row0.insert()
@@ -207,10 +295,209 @@ class TestTable(TestWithTemporaryDirectory):
         rows = list(self.SantaTable.fetch_all())
         assert len(rows) == 0
 
+    def committed_rows(self) -> int:
+        with db.SqlConnection(self.db_path) as other:
+            return other.cur.execute("SELECT COUNT(*) FROM SantaTable").fetchone()[0]
+
+    def test_insert_many(self):
+        self.SantaTable.insert_many([self.row0, self.row1, self.row2])
+        assert set(self.SantaTable.fetch_all()) == {self.row0, self.row1, self.row2}
+        assert self.committed_rows() == 3
+
+    def test_upsert_many(self):
+        self.row0.insert()
+        row0_copy = replace(self.row0, value=321)
+        self.SantaTable.upsert_many([row0_copy, self.row1])
+        assert set(self.SantaTable.fetch_all()) == {row0_copy, self.row1}
+
+    def test_transaction_commits_once_at_the_end(self):
+        with self.sql.transaction():
+            self.row0.insert()
+            self.row1.insert()
+            self.row0.update(key={"value": 321})
+            assert self.committed_rows() == 0
+        assert self.committed_rows() == 2
+
+    def insert_and_fail(self, row: db.Table):
+        with self.sql.transaction():
+            row.insert()
+            raise RuntimeError
+
+    def test_transaction_rolls_back_on_error(self):
+        with pytest.raises(RuntimeError):
+            self.insert_and_fail(self.row0)
+        assert len(list(self.SantaTable.fetch_all())) == 0
+
+    def test_nested_transaction_rolls_back_only_itself(self):
+        with self.sql.transaction():
+            self.row0.insert()
+            with pytest.raises(RuntimeError):
+                self.insert_and_fail(self.row1)
+            self.row2.insert()
+        assert set(self.SantaTable.fetch_all()) == {self.row0, self.row2}
+        assert self.committed_rows() == 2
+
 
 class TestElvenCrisisArchive(TestWithTemporaryDirectory):
+    def test_archives_share_connection(self):
+        repo_root = Path.cwd()
+        assert db.ElvenCrisisArchive(repo_root).sql is db.ElvenCrisisArchive(repo_root).sql
+
     def test_create_tables(self):
         repo_root = Path.cwd()
         archive = db.ElvenCrisisArchive(repo_root)
         archive.create_tables()
         assert len(archive.sql.list_all_tables()) > 0
+
+    def test_new_repo_is_migrated(self):
+        archive = db.ElvenCrisisArchive(Path.cwd())
+        archive.new_repo()
+        assert archive.schema_version == len(archive.migrations)
+        indexes = {name for (name,) in archive.sql.cur.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        assert "ECARun_year_day_language_part" in indexes
+
+    def create_legacy_repo(self, repo_root: Path):
+        """Repo as created before schema versioning, with runs stored as mantissa and prefix"""
+        archive = db.ElvenCrisisArchive(repo_root)
+        archive.create_tables()
+        archive.sql.cur.execute("DROP TABLE ECARun")
+        archive.sql.cur.execute("DROP TABLE ECALanguageName")
+        archive.sql.cur.execute(
+            "CREATE TABLE ECARun (id INTEGER PRIMARY KEY NOT NULL, datetime TIMESTAMP NOT NULL, year INTEGER NOT NULL, "
+            "day INTEGER NOT NULL, language TEXT NOT NULL, part INTEGER NOT NULL, answer TEXT, time INTEGER, unit INTEGER)"
+        )
+        archive.sql.cur.executemany(
+            "INSERT INTO ECARun VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (1, "2024-12-01 00:00:10-05:00", 2016, 1, "python", 1, "42", 1234, -6),
+                (2, "2024-12-01 00:00:20-05:00", 2016, 1, "rust", 1, "42", 56, -9),
+                (3, "2024-12-01 00:00:30-05:00", 2016, 1, "python", 2, None, None, None),
+            ],
+        )
+        archive.sql.con.commit()
+        return archive
+
+    def test_migrates_old_repo_on_open(self):
+        repo_root = Path.cwd()
+        archive = self.create_legacy_repo(repo_root)
+        assert archive.schema_version == 0
+        db.ElvenCrisisArchive(repo_root)
+        assert archive.schema_version == len(archive.migrations)
+        plan = archive.sql.cur.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM ECARun WHERE year = 2016 AND day = 1 AND language_id = 1"
+        ).fetchall()
+        assert any("ECARun_year_day_language_part" in row[-1] for row in plan)
+        triggers = archive.sql.cur.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger'").fetchone()
+        assert triggers == (len(archive.dirty_triggers) + len(archive.change_triggers),)
+
+    def test_migrates_runs_to_compact_storage(self):
+        repo_root = Path.cwd()
+        self.create_legacy_repo(repo_root)
+        archive = db.ElvenCrisisArchive(repo_root)
+        names = archive.ECALanguageName.names()
+        runs = sorted(archive.ECARun.fetch_all(), key=lambda run: run.id)
+        assert [names[run.language_id] for run in runs] == ["python", "rust", "python"]
+        assert [run.time_ns for run in runs] == [1_234_000, 56, None]
+        assert [run.timestamp for run in runs] == [1733029210, 1733029220, 1733029230]
+        (total,) = archive.sql.cur.execute("SELECT SUM(time_ns) FROM ECARun").fetchone()
+        assert total == 1_234_056
+        stats = {names[s.language_id]: s for s in archive.ECAStats.fetch_all()}
+        assert stats["python"].count == 1
+        assert stats["rust"].min_ns == 56
+
+    def test_language_id_is_stable(self):
+        archive = db.ElvenCrisisArchive(Path.cwd())
+        archive.new_repo()
+        python_id = archive.ECALanguageName.id_of("python")
+        assert archive.ECALanguageName.id_of("rust") != python_id
+        assert archive.ECALanguageName.id_of("python") == python_id
+        assert archive.ECALanguageName.names() == {python_id: "python", python_id + 1: "rust"}
+
+    def test_stats_are_recorded_with_runs(self):
+        archive = db.ElvenCrisisArchive(Path.cwd())
+        archive.new_repo()
+        python_id = archive.ECALanguageName.id_of("python")
+        times = [5_000, 1_000, 3_000, 2_000]
+        for time_ns in times:
+            archive.ECAStats.record(archive.ECARun(None, 0, 2016, 1, python_id, 1, "42", time_ns).insert())
+        archive.ECAStats.record(archive.ECARun(None, 0, 2016, 1, python_id, 1, "0", None).insert())
+        recorded = archive.ECAStats.fetch_single()
+        assert recorded.count == len(times)
+        assert recorded.mean == pytest.approx(mean(times))
+        assert recorded.stdev == pytest.approx(stdev(times))
+        assert (recorded.min_ns, recorded.max_ns) == (1_000, 5_000)
+        archive.rebuild_stats()
+        assert archive.ECAStats.fetch_single() == recorded
+
+    def test_changes_mark_years_dirty(self):
+        archive = db.ElvenCrisisArchive(Path.cwd())
+        archive.new_repo()
+        assert archive.claim_dirty_years() == set()
+        archive.ECAPuzzle(2016, 1, "Title", "url", None, None, "2024-12-01", None).insert()
+        language = archive.ECALanguage(2017, 1, "python", "2024-12-01", None).insert()
+        assert archive.claim_dirty_years() == {2016, 2017}
+        assert archive.claim_dirty_years() == set()
+        language.update({"solved_pt1": "2024-12-02"}, where=["year", "day", "language"])
+        assert archive.claim_dirty_years() == {2017}
+        archive.mark_dirty([2015])
+        assert archive.claim_dirty_years() == {2015}
+
+    def test_changes_are_counted(self):
+        archive = db.ElvenCrisisArchive(Path.cwd())
+        archive.new_repo()
+        assert archive.changes("ECAPuzzle", "ECAStats") == (0, 0)
+        puzzle = archive.ECAPuzzle(2016, 1, "Title", "url", None, None, "2024-12-01", None).insert()
+        puzzle.update({"title": "Other"}, where=["year", "day"])
+        assert archive.changes("ECAPuzzle", "ECAStats") == (2, 0)
+
+    def test_prune_runs_rolls_up_old_runs(self):
+        archive = db.ElvenCrisisArchive(Path.cwd())
+        archive.new_repo()
+        python_id = archive.ECALanguageName.id_of("python")
+        now = int(time.time())
+        old = [
+            archive.ECARun(None, now - 100 * 86_400 + i, 2016, 1, python_id, 1, "42", 1_000 * i) for i in range(1, 6)
+        ]
+        recent = archive.ECARun(None, now, 2016, 1, python_id, 1, "42", 9_000)
+        untimed = archive.ECARun(None, now - 100 * 86_400, 2016, 1, python_id, 1, None, None)
+        other_part = archive.ECARun(None, now - 100 * 86_400, 2016, 1, python_id, 2, "43", 1_000)
+        archive.ECARun.insert_many([*old, recent, untimed, other_part])
+        archive.rebuild_stats()
+        stats = archive.ECAStats.find_one({"part": 1})
+
+        pruned = [*old[:-1], untimed]  # The last two runs, old[-1] and recent, are kept
+        assert archive.prune_runs(keep_days=30, keep_runs=2, part=1) == len(pruned)
+        remaining = [run.time_ns for run in archive.ECARun.fetch_all()]
+        assert sorted(remaining) == [1_000, 5_000, 9_000]
+        rollup = archive.ECARunRollup.fetch_single()
+        assert (rollup.count, rollup.min_ns, rollup.max_ns) == (4, 1_000, 4_000)
+
+        archive.rebuild_stats()
+        rebuilt = archive.ECAStats.find_one({"part": 1})
+        assert (rebuilt.count, rebuilt.min_ns, rebuilt.max_ns) == (stats.count, stats.min_ns, stats.max_ns)
+        assert rebuilt.mean == pytest.approx(stats.mean)
+        assert rebuilt.m2 == pytest.approx(stats.m2)
+        assert archive.prune_runs(keep_days=30, keep_runs=2) == 0
+
+    def test_vacuum_reclaims_space(self):
+        archive = db.ElvenCrisisArchive(Path.cwd())
+        archive.new_repo()
+        python_id = archive.ECALanguageName.id_of("python")
+        archive.ECARun.insert_many([archive.ECARun(None, 0, 2016, 1, python_id, 1, "42", i) for i in range(5_000)])
+        size = archive.sql.size()
+        archive.prune_runs(keep_days=0, keep_runs=0)
+        archive.sql.vacuum()
+        assert archive.sql.size() < size
+        assert archive.sql.cur.execute("PRAGMA auto_vacuum").fetchone() == (2,)
+
+    def test_new_repo_vacuums_incrementally(self):
+        archive = db.ElvenCrisisArchive(Path.cwd())
+        archive.new_repo()
+        assert archive.sql.cur.execute("PRAGMA auto_vacuum").fetchone() == (2,)
+        assert archive.sql.cur.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        python_id = archive.ECALanguageName.id_of("python")
+        archive.ECARun.insert_many([archive.ECARun(None, 0, 2016, 1, python_id, 1, "42", i) for i in range(5_000)])
+        size = archive.sql.size()
+        archive.prune_runs(keep_days=0, keep_runs=0)
+        archive.sql.incremental_vacuum()
+        assert archive.sql.size() < size
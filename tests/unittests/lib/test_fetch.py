@@ -9,9 +9,24 @@ ESB - Script your way to rescue Christmas as part of the ElfScript Brigade team.
 (Thank you [Eric 😉!](https://twitter.com/ericwastl)).
 """
 
-from esb.lib.fetch import RudolphFetcher, RudolphSubmitStatus
+import http.client
+import io
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from esb.lib.fetch import RudolphCache, RudolphFetcher, RudolphHint, RudolphPage, RudolphSubmitStatus
 from tests.fixtures import HttpMock, TestWithInitializedEsbRepo
-from tests.mock import SUBMIT_ALREADY_COMPLETE, SUBMIT_FAIL, SUBMIT_SUCCESS, SUBMIT_TIMEOUT
+from tests.mock import (
+    STATEMENT_2016_01,
+    STATEMENT_TEXT_2016_01,
+    SUBMIT_ALREADY_COMPLETE,
+    SUBMIT_FAIL,
+    SUBMIT_SUCCESS,
+    SUBMIT_TIMEOUT,
+)
 
 
 class TestRudolphFetcher(TestWithInitializedEsbRepo):
@@ -41,3 +56,116 @@ class TestRudolphFetcher(TestWithInitializedEsbRepo):
             rf = RudolphFetcher(self.repo_root)
             submit_status = rf.fetch_submit(self.TEST_YEAR, self.TEST_DAY, 1, "Any")
         assert submit_status == RudolphSubmitStatus.ALREADY_COMPLETE
+
+
+class TestRudolphPage(unittest.TestCase):
+    def test_statement(self):
+        page = RudolphPage(STATEMENT_2016_01.read_text())
+        assert page.statement == STATEMENT_TEXT_2016_01.read_text().rstrip("\n")
+
+    def test_answers(self):
+        page = RudolphPage(STATEMENT_2016_01.read_text())
+        assert page.answer_pair == ("300", "159")
+
+    def test_answers_missing(self):
+        page = RudolphPage("<main><article><p>No answers here</p></article></main>")
+        assert page.answer_pair == (None, None)
+        assert page.submit_status == RudolphSubmitStatus.ERROR
+
+    def test_hint_and_wait(self):
+        page = RudolphPage(SUBMIT_FAIL.read_text())
+        assert page.hint == RudolphHint.LOW
+        assert page.wait == 60
+        page = RudolphPage(SUBMIT_TIMEOUT.read_text())
+        assert page.hint is None
+        assert page.wait == 22
+
+    def test_wait_formats(self):
+        for message, wait in [
+            ("You have 1m 5s left to wait.", 65),
+            ("You have 2h 0m 3s left to wait.", 7203),
+            ("Please wait 5 minutes before trying again.", 300),
+            ("Please wait ten minutes before trying again.", 600),
+            ("That's the right answer!", None),
+        ]:
+            with self.subTest(message=message):
+                assert RudolphPage(f"<article><p>{message}</p></article>").wait == wait
+
+    def test_unclosed_void_elements(self):
+        page = RudolphPage("<article><p>one<br>two &lt;3</p><p>three</p></article>")
+        assert page.statement == "onetwo <3\n\nthree"
+        assert page.messages == ["onetwo <3", "three"]
+
+
+class TestRudolphFetcherConnections(TestWithInitializedEsbRepo):
+    @staticmethod
+    def cookie():
+        return patch.dict(os.environ, {RudolphFetcher.sess_env: "mocka moccha"})
+
+    @staticmethod
+    def response(body: bytes = b"body", status: int = 200) -> MagicMock:
+        res = MagicMock(status=status)
+        res.read.side_effect = io.BytesIO(body).read
+        return res
+
+    def test_connection_is_reused(self):
+        with self.cookie(), patch("http.client.HTTPSConnection") as https:
+            https.return_value.getresponse.side_effect = self.response
+            with RudolphFetcher(self.repo_root) as rf:
+                rf.request(rf.host, "/first", "GET").read()
+                rf.request(rf.host, "/second", "GET").read()
+            assert https.call_count == 1
+            https.return_value.close.assert_called_once()
+
+    def test_reconnects_when_server_drops_connection(self):
+        responses = [http.client.RemoteDisconnected("closed"), self.response()]
+        with self.cookie(), patch("http.client.HTTPSConnection") as https:
+            https.return_value.getresponse.side_effect = responses
+            rf = RudolphFetcher(self.repo_root)
+            assert rf.request(rf.host, "/route", "GET").read() == b"body"
+            assert https.call_count == 2
+
+    def test_does_not_resend_posts_after_they_were_sent(self):
+        with self.cookie(), patch("http.client.HTTPSConnection") as https:
+            https.return_value.getresponse.side_effect = http.client.RemoteDisconnected("closed")
+            rf = RudolphFetcher(self.repo_root)
+            with pytest.raises(http.client.RemoteDisconnected):
+                rf.request(rf.host, "/route", "POST", data={"answer": 1})
+            assert https.return_value.request.call_count == 1
+
+    def test_download_streams_to_file(self):
+        dst = self.repo_root / "input.txt"
+        with self.cookie(), patch("http.client.HTTPSConnection") as https:
+            https.return_value.getresponse.return_value = self.response(b"1\n2\n3\n")
+            RudolphFetcher(self.repo_root).download_input(2016, 1, dst)
+        assert dst.read_text() == "1\n2\n3\n"
+
+
+class TestRudolphCache(TestWithInitializedEsbRepo):
+    @staticmethod
+    def response(body: bytes, status: int, headers: dict[str, str]) -> MagicMock:
+        res = MagicMock(status=status)
+        res.read.return_value = body
+        res.getheader.side_effect = headers.get
+        return res
+
+    def test_conditional_get(self):
+        cache = RudolphCache(self.repo_root / "http")
+        responses = [
+            self.response(b"page", 200, {"ETag": '"v1"'}),
+            self.response(b"", 304, {"ETag": '"v1"'}),
+        ]
+        with (
+            patch.dict(os.environ, {RudolphFetcher.sess_env: "mocka moccha"}),
+            patch("http.client.HTTPSConnection") as https,
+        ):
+            https.return_value.getresponse.side_effect = responses
+            rf = RudolphFetcher(self.repo_root, cache=cache)
+            assert rf.aoc_get(rf.host, "/2016/day/1") == "page"
+            assert rf.aoc_get(rf.host, "/2016/day/1") == "page"
+            _, kwargs = https.return_value.request.call_args
+            assert kwargs["headers"]["If-None-Match"] == '"v1"'
+
+    def test_entries_are_keyed_by_session(self):
+        cache = RudolphCache(self.repo_root / "http")
+        assert cache.entry("cookie1", "host", "/route") != cache.entry("cookie2", "host", "/route")
@@ -0,0 +1,73 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+ESB - Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+from datetime import datetime, timedelta
+
+from esb.lib.db import ElvenCrisisArchive
+from esb.lib.fetch import RudolphPage
+from esb.lib.guard import NaughtyList
+from tests.fixtures import TestWithInitializedEsbRepo
+from tests.mock import SUBMIT_FAIL, SUBMIT_SUCCESS, SUBMIT_TIMEOUT
+
+
+def submit_page(message: str) -> RudolphPage:
+    return RudolphPage(f"<main><article><p>{message}</p></article></main>")
+
+
+class TestNaughtyList(TestWithInitializedEsbRepo):
+    TEST_YEAR = 2019
+    TEST_DAY = 1
+
+    def setUp(self):
+        super().setUp()
+        self.db = ElvenCrisisArchive(self.repo_root)
+        self.now = datetime.now().astimezone()
+
+    def naughty_list(self) -> NaughtyList:
+        return NaughtyList.load(self.db, self.TEST_YEAR, self.TEST_DAY, 1)
+
+    def test_rejects_duplicates(self):
+        self.naughty_list().record("42", RudolphPage(SUBMIT_FAIL.read_text()), self.now)
+        naughty = self.naughty_list()
+        assert naughty.reject_reason("42") is not None
+        assert naughty.reject_reason("43") is None
+
+    def test_rejects_out_of_bounds(self):
+        naughty = self.naughty_list()
+        naughty.record("10", submit_page("That's not the right answer; your answer is too low."), self.now)
+        naughty.record("20", submit_page("That's not the right answer; your answer is too high."), self.now)
+        naughty = self.naughty_list()
+        assert naughty.bounds() == (10, 20)
+        assert "too low" in naughty.reject_reason("9")
+        assert "too high" in naughty.reject_reason("25")
+        assert naughty.reject_reason("15") is None
+        assert naughty.reject_reason("not a number") is None
+
+    def test_other_parts_are_ignored(self):
+        self.naughty_list().record("42", RudolphPage(SUBMIT_FAIL.read_text()), self.now)
+        assert NaughtyList.load(self.db, self.TEST_YEAR, self.TEST_DAY, 2).reject_reason("42") is None
+
+    def test_timeouts_are_not_wrong_answers(self):
+        self.naughty_list().record("42", RudolphPage(SUBMIT_TIMEOUT.read_text()), self.now)
+        assert self.naughty_list().reject_reason("42") is None
+
+    def test_remaining_wait(self):
+        naughty = self.naughty_list()
+        assert naughty.remaining_wait(self.now) == 0
+        naughty.record("42", RudolphPage(SUBMIT_FAIL.read_text()), self.now)
+        assert self.naughty_list().remaining_wait(self.now + timedelta(seconds=15)) == 45
+        assert self.naughty_list().remaining_wait(self.now + timedelta(minutes=5)) == 0
+
+    def test_remaining_wait_after_success(self):
+        naughty = self.naughty_list()
+        naughty.record("42", RudolphPage(SUBMIT_FAIL.read_text()), self.now)
+        naughty.record("43", RudolphPage(SUBMIT_SUCCESS.read_text()), self.now)
+        assert naughty.remaining_wait(self.now) == 0
@@ -9,10 +9,14 @@ ESB - Script your way to rescue Christmas as part of the ElfScript Brigade team.
 (Thank you [Eric 😉!](https://twitter.com/ericwastl)).
 """
 
+import json
+import os
 import unittest
+from unittest.mock import patch
 
 from esb.config import ESBConfig
 from esb.lib.langs import LangMap, LangSpec
+from tests.fixtures import TestWithInitializedEsbRepo
 
 
 class TestLangSpec(unittest.TestCase):
@@ -26,3 +30,68 @@ class TestLangMap(unittest.TestCase):
         lang_name = "python"
         lang_map = LangMap.load_defaults()
         assert lang_name in lang_map.names
+
+
+class TestLangMapCache(TestWithInitializedEsbRepo):
+    def setUp(self):
+        super().setUp()
+        self.cache_file = self.repo_root / ESBConfig.cache_dir / ESBConfig.lang_cache
+        self.spec = self.repo_root / ESBConfig.boiler_dir / "python" / ESBConfig.spec_filename
+
+    def tearDown(self):
+        LangMap.loaded.clear()
+        super().tearDown()
+
+    def load(self) -> LangMap:
+        """Loads as a new process would"""
+        LangMap.loaded.clear()
+        return LangMap.load(self.repo_root)
+
+    def test_loaded_once_per_process(self):
+        assert LangMap.load(self.repo_root) is LangMap.load(self.repo_root)
+
+    def test_compiled_cache(self):
+        defaults = LangMap.load_defaults()
+        assert self.load() == defaults
+        assert self.cache_file.is_file()
+        with patch.object(LangSpec, "from_json", side_effect=AssertionError("Specs should not be read")):
+            assert self.load() == defaults
+
+    def test_repo_specs_are_merged(self):
+        self.load()
+        python = json.loads((ESBConfig.boiler_root / "python" / ESBConfig.spec_filename).read_text())
+        self.spec.parent.mkdir(parents=True)
+        self.spec.write_text(json.dumps({**python, "run_command": ["pypy3", "{filenames[main.py]}"]}))
+        lang_map = self.load()
+        assert lang_map.get("python").run_command == ["pypy3", "{filenames[main.py]}"]
+        assert set(lang_map.names) == set(LangMap.load_defaults().names)
+
+        self.spec.write_text(json.dumps({**python, "run_command": ["python3", "{filenames[main.py]}"]}))
+        os.utime(self.spec, ns=(0, 0))  # Same size, other modification time
+        assert self.load().get("python").run_command == ["python3", "{filenames[main.py]}"]
+
+    def test_repo_only_languages_are_ignored(self):
+        python = json.loads((ESBConfig.boiler_root / "python" / ESBConfig.spec_filename).read_text())
+        spec = self.repo_root / ESBConfig.boiler_dir / "zig" / ESBConfig.spec_filename
+        spec.parent.mkdir(parents=True)
+        spec.write_text(json.dumps({**python, "name": "zig"}))
+        assert "zig" not in self.load().names
+
+    def test_spec_changes_are_seen_by_the_same_process(self):
+        lang_map = LangMap.load(self.repo_root)
+        python = json.loads((ESBConfig.boiler_root / "python" / ESBConfig.spec_filename).read_text())
+        self.spec.parent.mkdir(parents=True)
+        self.spec.write_text(json.dumps({**python, "run_command": ["pypy3", "{filenames[main.py]}"]}))
+        reloaded = LangMap.load(self.repo_root)
+        assert reloaded is not lang_map
+        assert reloaded.get("python").run_command == ["pypy3", "{filenames[main.py]}"]
+        assert LangMap.load(self.repo_root) is reloaded
+
+    def test_stale_cache_is_ignored(self):
+        self.cache_file.write_text("{not json", encoding="utf-8")
+        assert self.load() == LangMap.load_defaults()
+        compiled = json.loads(self.cache_file.read_text(encoding="utf-8"))
+        self.cache_file.write_text(json.dumps({**compiled, "version": "0.0.0"}), encoding="utf-8")
+        with patch.object(LangSpec, "from_json", wraps=LangSpec.from_json) as from_json:
+            self.load()
+        assert from_json.call_count == len(LangMap.load_defaults().names)
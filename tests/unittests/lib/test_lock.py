@@ -0,0 +1,58 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+ESB - Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+import os
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from esb.lib.lock import FileLock, TokenBucket
+from tests.fixtures import TestWithTemporaryDirectory
+
+
+class TestFileLock(TestWithTemporaryDirectory):
+    def test_acquire_and_release(self):
+        lock = FileLock(Path("day") / ".lock")
+        with lock as waited:
+            assert not waited
+            assert lock.path.is_file()
+        assert not lock.path.exists()
+
+    def test_waits_for_holder(self):
+        lock_path = Path(".lock")
+        holder = FileLock(lock_path)
+        holder.acquire()
+        timer = threading.Timer(0.2, holder.release)
+        timer.start()
+        with FileLock(lock_path, poll=0.01) as waited:
+            assert waited
+        timer.join()
+
+    def test_breaks_stale_lock(self):
+        lock_path = Path(".lock")
+        lock_path.touch()
+        old = time.time() - 3600
+        os.utime(lock_path, (old, old))
+        with FileLock(lock_path, poll=0.01, stale=60) as waited:
+            assert waited
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=50, capacity=3)
+        t0 = time.monotonic()
+        for _ in range(3):
+            bucket.acquire()
+        assert time.monotonic() - t0 < 0.01
+        for _ in range(5):
+            bucket.acquire()
+        assert time.monotonic() - t0 >= 5 / 50 * 0.9
@@ -0,0 +1,62 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+ESB - Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+import zipfile
+from pathlib import Path
+
+from esb.config import ESBConfig
+from esb.lib.sack import SantaSack
+from tests.fixtures import TestWithTemporaryDirectory
+
+CORPUS_DIR = ESBConfig.package_root.parent.parent / ESBConfig.tests_corpus_dir
+CORPUS_2016_01 = CORPUS_DIR / "2016" / "01" / "tests_2016_01.toml"
+
+
+class TestSantaSack(TestWithTemporaryDirectory):
+    def zip_corpus(self, dst: Path, prefix: str = "") -> Path:
+        with zipfile.ZipFile(dst, "w", zipfile.ZIP_DEFLATED) as zf:
+            for path in CORPUS_DIR.rglob("tests_*.toml"):
+                zf.write(path, f"{prefix}{path.relative_to(CORPUS_DIR).as_posix()}")
+        return dst
+
+    def test_directory_source(self):
+        sack = SantaSack([CORPUS_DIR])
+        assert (2016, 1) in sack
+        assert sack.read(2016, 1) == CORPUS_2016_01.read_text()
+
+    def test_zip_source(self):
+        sack = SantaSack([self.zip_corpus(Path("aoc_tests.zip"))])
+        assert sack.read(2016, 1) == CORPUS_2016_01.read_text()
+
+    def test_repository_archive_layout(self):
+        sack = SantaSack([self.zip_corpus(Path("esb-main.zip"), prefix="esb-main/aoc_tests/")])
+        assert sack.read(2016, 1) == CORPUS_2016_01.read_text()
+
+    def test_first_source_wins(self):
+        with zipfile.ZipFile("newer.zip", "w") as zf:
+            zf.writestr("2016/01/tests_2016_01.toml", "newer")
+        sack = SantaSack([Path("newer.zip"), CORPUS_DIR])
+        assert sack.read(2016, 1) == "newer"
+        assert sack.read(2016, 2) == (CORPUS_DIR / "2016" / "02" / "tests_2016_02.toml").read_text()
+
+    def test_missing_day(self):
+        sack = SantaSack([CORPUS_DIR, Path("broken.zip")])
+        assert (2015, 1) not in sack
+        assert sack.read(2015, 1) is None
+
+    def test_load_refreshed_archive(self):
+        cache_dir = Path(".cache")
+        cache_dir.mkdir()
+        with zipfile.ZipFile(cache_dir / ESBConfig.tests_archive, "w") as zf:
+            zf.writestr("2015/01/tests_2015_01.toml", "refreshed")
+        sack = SantaSack.load(cache_dir)
+        assert sack.read(2015, 1) == "refreshed"
+        assert (2016, 1) in sack
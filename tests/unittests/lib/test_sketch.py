@@ -0,0 +1,79 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+ESB - Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+import math
+import random
+import sqlite3
+import unittest
+from statistics import quantiles
+
+import pytest
+
+from esb.lib.sketch import LogSketch, SketchMerge
+
+
+class TestLogSketch(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(25)
+        self.values = sorted(int(rng.lognormvariate(13, 2)) for _ in range(5_000))
+        self.sketch = LogSketch()
+        for value in self.values:
+            self.sketch.add(value)
+
+    def test_quantiles_within_accuracy(self):
+        percentiles = quantiles(self.values, n=100, method="inclusive")
+        for percentile in (10, 50, 90, 99):
+            with self.subTest(percentile=percentile):
+                expected = percentiles[percentile - 1]
+                assert self.sketch.quantile(percentile / 100) == pytest.approx(expected, rel=self.sketch.accuracy)
+
+    def test_zeros(self):
+        sketch = LogSketch()
+        for value in [0, 0, 0, 10]:
+            sketch.add(value)
+        assert sketch.quantile(0.5) == 0
+        assert sketch.quantile(1) == pytest.approx(10, rel=sketch.accuracy)
+        assert LogSketch().quantile(0.5) is None
+
+    def test_serialization(self):
+        data = self.sketch.to_bytes()
+        assert LogSketch.from_bytes(data) == self.sketch
+        assert len(data) < 2_000
+
+    def test_merge(self):
+        left, right = LogSketch(), LogSketch()
+        for i, value in enumerate(self.values):
+            (left if i % 2 else right).add(value)
+        assert left.merge(right) == self.sketch
+
+    def test_merge_requires_same_accuracy(self):
+        with pytest.raises(ValueError, match="different accuracies"):
+            LogSketch(0.01).merge(LogSketch(0.02))
+
+    def test_log_histogram(self):
+        counts, edges = self.sketch.log_histogram(4, scale=1e-3)
+        assert sum(counts) == self.sketch.count - self.sketch.zeros
+        assert len(edges) == len(counts) + 1
+        assert edges[0] == pytest.approx(
+            math.log10(min(v for v in self.values if v >= 1) * 1e-3), abs=2 * self.sketch.accuracy
+        )
+        assert LogSketch().log_histogram(3) == ([0, 0, 0], [0.0] * 4)
+
+    def test_sketch_merge_aggregate(self):
+        con = sqlite3.connect(":memory:")
+        con.create_aggregate("sketch_merge", 1, SketchMerge)
+        con.execute("CREATE TABLE sketches (sketch BLOB)")
+        halves = [LogSketch(), LogSketch()]
+        for i, value in enumerate(self.values):
+            halves[i % 2].add(value)
+        con.executemany("INSERT INTO sketches VALUES (?)", [(half.to_bytes(),) for half in halves])
+        (merged,) = con.execute("SELECT sketch_merge(sketch) FROM sketches").fetchone()
+        assert LogSketch.from_bytes(merged) == self.sketch
@@ -0,0 +1,58 @@
+"""
+SPDX-FileCopyrightText: 2024-present Luiz Eduardo Amaral <luizamaral306@gmail.com>
+SPDX-License-Identifier: GPL-3.0-or-later
+
+ESB - Script your way to rescue Christmas as part of the ElfScript Brigade team.
+
+`esb` is a CLI tool to help us _elves_ to save christmas for the
+[Advent Of Code](https://adventofcode.com/) yearly events
+(Thank you [Eric 😉!](https://twitter.com/ericwastl)).
+"""
+
+import random
+import unittest
+from statistics import mean, variance
+from unittest.mock import patch
+
+import pytest
+
+from esb.config import ESBConfig
+from esb.lib.sketch import LogSketch
+from esb.lib.stats import PYTHON_STATS, NumpyStats, numpy_stats, stats_backend
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(25)
+        self.values = [0, *(int(rng.lognormvariate(13, 2)) for _ in range(3_000))]
+        self.sketch = LogSketch()
+        for value in self.values:
+            self.sketch.add(value)
+
+    def test_python_moments(self):
+        count, mu, m2, low, high = PYTHON_STATS.moments(self.values)
+        assert count == len(self.values)
+        assert mu == pytest.approx(mean(self.values))
+        assert m2 / (count - 1) == pytest.approx(variance(self.values))
+        assert (low, high) == (min(self.values), max(self.values))
+
+    def test_python_log_buckets_match_sketch(self):
+        assert PYTHON_STATS.log_buckets(self.values, self.sketch.gamma) == (self.sketch.zeros, self.sketch.buckets)
+
+    def test_numpy_matches_python(self):
+        pytest.importorskip("numpy")
+        backend = NumpyStats()
+        count, mu, m2, low, high = backend.moments(self.values)
+        py_count, py_mu, py_m2, py_low, py_high = PYTHON_STATS.moments(self.values)
+        assert (count, low, high) == (py_count, py_low, py_high)
+        assert (mu, m2) == pytest.approx((py_mu, py_m2))
+        assert backend.log_buckets(self.values, self.sketch.gamma) == (self.sketch.zeros, self.sketch.buckets)
+
+    def test_backend_selection(self):
+        assert stats_backend(ESBConfig.stats_numpy_min - 1) is PYTHON_STATS
+        with patch("esb.lib.stats.numpy_stats", return_value=None):
+            assert stats_backend(ESBConfig.stats_numpy_min) is PYTHON_STATS
+        assert stats_backend(ESBConfig.stats_numpy_min) is (numpy_stats() or PYTHON_STATS)
+
+    def test_add_many(self):
+        assert LogSketch().add_many(self.values) == self.sketch
@@ -11,19 +11,64 @@ ESB - Script your way to rescue Christmas as part of the ElfScript Brigade team.
 
 import os
 import shutil
+import subprocess
+import sys
 import unittest
 from argparse import ArgumentTypeError, Namespace
 from datetime import datetime
 from pathlib import Path
+from unittest.mock import patch
 from zoneinfo import ZoneInfo
 
 import pytest
 
 from esb.cli import aoc_day, aoc_part, aoc_year, esb_parser, main
+from esb.commands.fetch import Fetch, FetchedDay, FetchStatus
+from esb.config import ESBConfig
+from esb.lib.db import ElvenCrisisArchive
 from esb.lib.langs import LangMap
 from esb.lib.paths import CacheInputSled, CacheTestSled, LangSled
 from tests.fixtures import CliMock, TestWithInitializedEsbRepo, TestWithTemporaryDirectory
-from tests.mock import INPUT_2016_01, SOLUTION_2016_01_PYTHON, STATEMENT_2016_01, TEST_2016_01
+from tests.mock import INPUT_2016_01, SOLUTION_2016_01_PYTHON, STATEMENT_2016_01, SUBMIT_FAIL, TEST_2016_01
+
+# Modules `esb` must not import before a command needs them
+HEAVY_MODULES = {"asyncio", "http.client", "rich", "sqlite3", "tomllib"}
+# Cumulative import time of `esb.cli` in microseconds. Wall clock times depend on the machine,
+# so the budget is only checked when set, eg: ESB_IMPORT_BUDGET=150000
+CLI_IMPORT_BUDGET_US = int(os.environ.get("ESB_IMPORT_BUDGET", "0"))
+
+
+class TestImportTime(unittest.TestCase):
+    @staticmethod
+    def run_imports(code: str) -> tuple[set[str], dict[str, int]]:
+        """
+        Modules loaded after running `code` and cumulative import time of the ones imported by an
+        import statement, in microseconds
+        """
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"{code}; import sys; print(*sys.modules)"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        times = {}
+        for line in result.stderr.splitlines():
+            match line.removeprefix("import time:").split("|"):
+                case [_, cumulative, module] if cumulative.strip().isdigit():
+                    times[module.strip()] = int(cumulative)
+        return set(result.stdout.split()), times
+
+    def test_parser_defers_heavy_imports(self):
+        modules, times = self.run_imports("from esb.cli import esb_parser; esb_parser().parse_args(['status'])")
+        assert HEAVY_MODULES.isdisjoint(modules)
+        if CLI_IMPORT_BUDGET_US:
+            assert times["esb.cli"] < CLI_IMPORT_BUDGET_US
+
+    def test_commands_are_imported_on_demand(self):
+        modules, _ = self.run_imports("from esb.commands import Status, Test")
+        assert {"esb.commands.status", "esb.commands.test"} <= modules
+        assert {"esb.commands.fetch", "esb.commands.run", "esb.commands.watch"}.isdisjoint(modules)
+        assert {"asyncio", "http.client", "rich"}.isdisjoint(modules)
 
 
 class TestParserTypes(unittest.TestCase):
@@ -89,6 +134,10 @@ class TestEsbParser(TestWithInitializedEsbRepo):
             "esb run --year 2016 --day 9 --lang python -p 1 --submit",
             "esb run -y 2016 -d 9 -l python -s --part 2",
             "esb dashboard",
+            "esb watch --year 2016 --day 9 --lang python --part 1 2",
+            "esb archive rebuild",
+            "esb archive percentiles --merge ../other_repo",
+            "esb archive compact --keep-days 7 --keep-runs 10",
         ]
         self.parser = esb_parser()
         for command in commands:
@@ -135,6 +184,9 @@ class TestCli(TestWithTemporaryDirectory):
     cmd_show = f"esb show --year {TEST_YEAR} --day {TEST_DAY}".split()
     cmd_status = "esb status".split()
     cmd_dashboard = "esb dashboard".split()
+    cmd_archive_rebuild = "esb archive rebuild".split()
+    cmd_archive_percentiles = "esb archive percentiles".split()
+    cmd_archive_compact = "esb archive compact --keep-days 0 --keep-runs 0".split()
     cmd_run = f"esb run --year {TEST_YEAR} --day {TEST_DAY} --lang {language_name} --part {TEST_PART}".split()
     cmd_run_cached = "esb run --part 1".split()
     cmd_test = f"esb test --year {TEST_YEAR} --day {TEST_DAY} --lang {language_name} --part {TEST_PART}".split()
@@ -181,6 +233,71 @@ class TestCli(TestWithTemporaryDirectory):
         assert "Fetched year" in text
         assert statement_file.is_file()
         assert input_file.is_file()
+        assert CacheTestSled(repo_root).path("tests", self.TEST_YEAR, self.TEST_DAY).is_file()
+
+    def test_fetch_refreshes_answers(self):
+        self.esb_new()
+        with CliMock(self.cmd_fetch, [STATEMENT_2016_01.read_text()]):
+            main()
+
+        archive = ElvenCrisisArchive(Path.cwd())
+        dp = archive.ECAPuzzle.find_single({"year": self.TEST_YEAR, "day": self.TEST_DAY})
+        dp.update({"answer_pt2": None}, ["year", "day"])
+        statement_file = CacheInputSled(Path.cwd()).path("statement", self.TEST_YEAR, self.TEST_DAY)
+        mtime = statement_file.stat().st_mtime_ns
+
+        with CliMock(self.cmd_fetch, [STATEMENT_2016_01.read_text()]) as clim:
+            main()
+        assert "Refreshed answers" in clim.stderr.getvalue()
+        assert statement_file.stat().st_mtime_ns == mtime
+        dp = archive.ECAPuzzle.find_single({"year": self.TEST_YEAR, "day": self.TEST_DAY})
+        assert dp.answer_pt2 == "159"
+
+    def test_fetch_day_retries_and_validates(self):
+        self.esb_new()
+        with CliMock(self.cmd_fetch, [STATEMENT_2016_01.read_text()]) as clim:
+            fetch = Fetch([self.TEST_YEAR], [self.TEST_DAY])
+            assert fetch.rudolph.retries == ESBConfig.fetch_retries
+            untitled = FetchedDay(self.TEST_YEAR, self.TEST_DAY, FetchStatus.FETCHED, url="url", title="")
+            assert fetch.report_day(untitled) is None
+        assert "Could not parse the title" in clim.stderr.getvalue()
+
+    def test_fetch_at_unlock(self):
+        self.esb_new()
+        command = [*self.cmd_fetch, "--at-unlock", "--lang", self.language_name]
+        before_unlock = datetime(self.TEST_YEAR, 11, 30, 23, 59, 55, tzinfo=ZoneInfo("EST"))
+        with (
+            CliMock(command, [STATEMENT_2016_01.read_text()]) as clim,
+            patch("esb.commands.unlock.Unlock.now", return_value=before_unlock),
+            patch("esb.commands.unlock.Unlock.sleep_until") as sleep_until,
+            patch("esb.lib.fetch.RudolphFetcher.connection") as connection,
+            patch("esb.commands.unlock.Watch.execute", autospec=True) as watch,
+        ):
+            main()
+        assert "unlocks at" in clim.stderr.getvalue()
+        sleep_until.assert_called_with(datetime(self.TEST_YEAR, 12, 1, tzinfo=ZoneInfo("EST")))
+        connection.return_value.connect.assert_called_once()
+        watch.assert_called_once()
+        [watch_cmd] = watch.call_args.args
+        assert watch_cmd.parts == list(ESBConfig.parts)
+
+        lang_sled = LangSled.from_spec(Path.cwd(), LangMap.load_defaults().get(self.language_name))
+        main_file = lang_sled.path("main.py", self.TEST_YEAR, self.TEST_DAY)
+        assert "No Time for a Taxicab" in main_file.read_text()
+        assert "unlocks at midnight" not in main_file.read_text()
+
+    def test_fetch_many_days(self):
+        self.esb_new()
+
+        command = f"esb fetch --year {self.TEST_YEAR} --day 1 2 3".split()
+        http_response = [STATEMENT_2016_01.read_text()]
+        with CliMock(command, http_response) as clim, patch.object(ESBConfig, "fetch_backoff", 0):
+            main()
+        text = clim.stderr.getvalue()
+        assert "[3/3]" in text
+        cs = CacheInputSled(Path.cwd())
+        for day in [1, 2, 3]:
+            assert cs.path("input", self.TEST_YEAR, day).is_file()
 
     def test_start(self):
         self.esb_new()
@@ -266,6 +383,47 @@ class TestCli(TestWithTemporaryDirectory):
         text = clim.stderr.getvalue()
         assert "✔ Answer pt1:" in text
 
+        with CliMock(self.cmd_archive_rebuild) as clim:
+            main()
+        assert "statistics for 1 answers" in clim.stdout.getvalue()
+
+        with CliMock(self.cmd_archive_percentiles) as clim:
+            main()
+        output = clim.stdout.getvalue()
+        assert "p99" in output
+        assert "2016 python" in output
+        assert "all all" in output
+
+        with CliMock([*self.cmd_archive_percentiles, "--merge", "nowhere"]) as clim, pytest.raises(SystemExit):
+            main()
+        assert "No archive found" in clim.stderr.getvalue()
+
+        with CliMock(self.cmd_archive_compact) as clim:
+            main()
+        assert "Rolled up" in clim.stdout.getvalue()
+        assert "reclaimed" in clim.stdout.getvalue()
+
+        with CliMock(self.cmd_archive_percentiles) as clim:
+            main()
+        assert "2016 python" in clim.stdout.getvalue()
+
+    def test_run_submit_guard(self):
+        self.esb_new()
+        with CliMock(self.cmd_start, [STATEMENT_2016_01.read_text(), INPUT_2016_01.read_text()]):
+            main()
+        lang = LangMap.load_defaults().get(self.language_name)
+        lang_sled = LangSled.from_spec(repo_root=Path.cwd(), spec=lang)
+        shutil.copy(SOLUTION_2016_01_PYTHON, lang_sled.day_dir(self.TEST_YEAR, self.TEST_DAY))
+
+        command = [*self.cmd_run, "--submit"]
+        with CliMock(command, [SUBMIT_FAIL.read_text()]) as clim:
+            main()
+        assert "(too low)" in clim.stderr.getvalue()
+
+        with CliMock(command, [SUBMIT_FAIL.read_text()]) as clim:
+            main()
+        assert "Not submitting" in clim.stderr.getvalue()
+
     def test_test(self):
         self.esb_new()
 
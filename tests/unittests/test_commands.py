@@ -9,17 +9,29 @@ ESB - Script your way to rescue Christmas as part of the ElfScript Brigade team.
 (Thank you [Eric 😉!](https://twitter.com/ericwastl)).
 """
 
+import asyncio
 import io
 import shutil
 import unittest
+from datetime import datetime
 from unittest.mock import patch
+from zoneinfo import ZoneInfo
 
-from esb.commands import Status
+from esb.commands import Status, Unlock, Watch
 from esb.commands.base import Command
-from esb.lib.paths import CacheTestSled
+from esb.commands.watch import WatchBoard, WatchStatus
+from esb.lib.boiler import CodeFurnace
+from esb.lib.langs import LangMap, LangRunner
+from esb.lib.paths import CacheTestSled, LangSled
 from esb.protocol.fireplace import FPPart
 from tests.fixtures import TestWithInitializedEsbRepo
-from tests.mock import TESTS_ERROR_TOML, TESTS_MISSING_TOML, TESTS_SUCCESS_TOML
+from tests.mock import (
+    SOLUTION_2016_01_PYTHON,
+    TEST_2016_01,
+    TESTS_ERROR_TOML,
+    TESTS_MISSING_TOML,
+    TESTS_SUCCESS_TOML,
+)
 
 esb_load_tests = Command.load_tests
 
@@ -76,3 +88,61 @@ class TestCommandsBaseFindTests(TestWithInitializedEsbRepo):
 
         text = stderr.getvalue()
         assert "Could not find tests for year" in text
+
+
+class TestCommandsWatch(TestWithInitializedEsbRepo):
+    year = 2016
+    day = 1
+
+    def setUp(self):
+        super().setUp()
+        self.lang = LangMap.load_defaults().get("python")
+        self.lang_sled = LangSled.from_spec(self.repo_root, self.lang)
+        CodeFurnace(self.lang, self.lang_sled).start(self.year, self.day, "title", "url")
+        shutil.copy(SOLUTION_2016_01_PYTHON, self.lang_sled.day_dir(self.year, self.day))
+        self.test_dir = CacheTestSled(self.repo_root).day_dir(self.year, self.day)
+        shutil.copy(TEST_2016_01, self.test_dir)
+        self.cmd = Watch(self.lang, [self.year], [self.day], [1, 2])
+
+    def test_snapshot_ignores_build_artifacts(self):
+        day_dir = self.lang_sled.day_dir(self.year, self.day)
+        before = self.cmd.snapshot(day_dir, self.test_dir)
+        (day_dir / "__pycache__").mkdir(exist_ok=True)
+        (day_dir / "__pycache__" / "cached.pyc").touch()
+        assert self.cmd.snapshot(day_dir, self.test_dir) == before
+        (day_dir / "new_module.py").touch()
+        assert self.cmd.snapshot(day_dir, self.test_dir) != before
+
+    def test_affected_tests(self):
+        tests = self.cmd.load_watch_tests(self.year, self.day)
+        assert len(tests) == 4
+        changed = {key: dict(test) for key, test in tests.items()}
+        [key, *_] = changed
+        changed[key]["answer"] = 42
+        assert list(self.cmd.affected_tests(tests, changed, source_changed=False)) == [key]
+        assert self.cmd.affected_tests(tests, changed, source_changed=True) == changed
+
+    def test_cycle(self):
+        tests = self.cmd.load_watch_tests(self.year, self.day)
+        board = WatchBoard("test")
+        board.queue(tests, tests)
+        runner = LangRunner(self.lang, self.lang_sled)
+        asyncio.run(self.cmd.cycle(board, runner, self.year, self.day, tests, build=True))
+        assert all(row.status == WatchStatus.OK for row in board.rows.values())
+
+
+class TestCommandsUnlock(unittest.TestCase):
+    def test_next_unlock(self):
+        est = ZoneInfo("EST")
+        for now, expected in [
+            (datetime(2024, 11, 30, 23, 59, 59, tzinfo=est), (2024, 1)),
+            (datetime(2024, 12, 5, 0, 0, 1, tzinfo=est), (2024, 5)),
+            (datetime(2024, 12, 5, 12, 0, 0, tzinfo=est), (2024, 6)),
+            (datetime(2024, 12, 26, 0, 0, 0, tzinfo=est), (2025, 1)),
+        ]:
+            with self.subTest(now=now):
+                assert Unlock.next_unlock(now) == expected
+
+    def test_unlock_time_is_midnight_est(self):
+        unlock = Unlock.unlock_time(2024, 3)
+        assert unlock == datetime(2024, 12, 3, 5, 0, 0, tzinfo=ZoneInfo("UTC"))
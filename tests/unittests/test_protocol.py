@@ -242,6 +242,18 @@ class TestMetricPrefix:
     def test_to_float(self, test_value, sample_value, answer):
         assert test_value.to_float(sample_value) == pytest.approx(answer)
 
+    @pytest.mark.parametrize(
+        ("test_value", "sample_value", "answer"),
+        [
+            (MetricPrefix._, 3, 3_000_000_000),
+            (MetricPrefix.milli, 1234, 1_234_000_000),
+            (MetricPrefix.nano, 42, 42),
+            (MetricPrefix.pico, 1500, 2),
+        ],
+    )
+    def test_to_nanos(self, test_value, sample_value, answer):
+        assert test_value.to_nanos(sample_value) == answer
+
     @pytest.mark.parametrize(
         ("test_value", "answer_mantissa", "answer_exponent"),
         [